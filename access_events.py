@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from models import db, AccessEvent
+from database import UPSERT_DIALECTS
+from rollups import add_to_rollups, count_hourly
+
+# --- Access event ingestion ---
+# POST /api/access-events takes a batch of events as NDJSON. Parsed rows are queued for a single
+# background writer thread per process, which drains the queue once ACCESS_EVENT_FLUSH_SIZE rows
+# are waiting or ACCESS_EVENT_FLUSH_INTERVAL_MS after the first one arrived, and stores everything
+# it took with one batched INSERT in one transaction, together with the matching rollup increments
+# (rollups.py). Concurrent requests thus share commits.
+#
+# Delivery is at-least-once: a request is acknowledged only after its rows are committed, so the
+# sender retries anything it got no acknowledgement for. Retried events carry the same event_id
+# and are skipped on insert (ON CONFLICT DO NOTHING). At most ACCESS_EVENT_MAX_PENDING rows may be
+# queued; beyond that IngestionBusy is raised and the request is refused with 503.
+
+REQUIRED_FIELDS = ('user_id', 'data_item', 'purpose')
+
+# Longest accepted string values, matching the AccessEvent columns
+FIELD_LENGTHS = {'event_id': 64, 'data_item': 128, 'purpose': 128}
+
+# Largest user id AccessEvent.user_id holds on every backend (a 32-bit INTEGER on PostgreSQL)
+MAX_USER_ID = 2**31 - 1
+
+class IngestionBusy(Exception):
+    """Raised when the write queue cannot take another batch."""
+
+def parse_timestamp(value):
+    """Parses an ISO 8601 timestamp into a naive UTC datetime; None stays None."""
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_user_id(value):
+    """
+    Parses a user id given as a JSON number or numeric string; raises ValueError unless it is a
+    whole number the column can hold, so one bad line cannot fail the shared write of a batch.
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError('user_id must be an integer')
+    try:
+        user_id = int(value)
+    except OverflowError: # Infinity
+        raise ValueError('user_id must be an integer') from None
+    if not 1 <= user_id <= MAX_USER_ID:
+        raise ValueError(f'user_id must be between 1 and {MAX_USER_ID}')
+    return user_id
+
+def parse_event(event, received_at):
+    """Turns one decoded event into an AccessEvent row dict; raises ValueError if it is invalid."""
+    if not isinstance(event, dict):
+        raise ValueError('expected a JSON object')
+    missing = [field for field in REQUIRED_FIELDS if event.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f'missing {", ".join(missing)}')
+    row = {
+        'event_id': str(event.get('event_id') or uuid.uuid4().hex),
+        'user_id': parse_user_id(event['user_id']),
+        'data_item': str(event['data_item']),
+        'purpose': str(event['purpose']),
+        'occurred_at': parse_timestamp(event.get('occurred_at')) or received_at,
+        'received_at': received_at,
+    }
+    for field, length in FIELD_LENGTHS.items():
+        if len(row[field]) > length:
+            raise ValueError(f'{field} is longer than {length} characters')
+    return row
+
+def parse_events(lines, received_at):
+    """
+    Parses NDJSON lines into AccessEvent row dicts. Returns (rows, errors) where errors lists
+    {'line': number, 'error': message} for each line that was rejected. Blank lines are ignored.
+    """
+    rows, errors = [], []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            rows.append(parse_event(json.loads(line), received_at))
+        except (ValueError, TypeError, OverflowError) as e: # json.JSONDecodeError is a ValueError
+            errors.append({'line': number, 'error': str(e)})
+    return rows, errors
+
+def insert_events(rows):
+    """
+    Stores the rows with one batched INSERT in its own transaction, skipping known event_ids,
+    and adds the newly stored ones to the access rollups in the same transaction.
+    """
+    unique_rows = {row['event_id']: row for row in rows}
+    engine = db.engine
+    insert = UPSERT_DIALECTS.get(engine.dialect.name)
+    with engine.begin() as connection:
+        if insert is not None:
+            # RETURNING reports only the rows that were not skipped as duplicates
+            stored_ids = set(connection.execute(
+                insert(AccessEvent).on_conflict_do_nothing(index_elements=['event_id']).returning(AccessEvent.event_id),
+                list(unique_rows.values())
+            ).scalars())
+            stored = [row for event_id, row in unique_rows.items() if event_id in stored_ids]
+        else:
+            known = connection.execute(
+                db.select(AccessEvent.event_id).where(AccessEvent.event_id.in_(list(unique_rows)))
+            ).scalars()
+            for event_id in known:
+                del unique_rows[event_id]
+            stored = list(unique_rows.values())
+            if stored:
+                connection.execute(db.insert(AccessEvent), stored)
+        add_to_rollups(count_hourly(stored), connection)
+
+class AccessEventWriter:
+    """The bounded queue of parsed events and the background thread that writes them."""
+
+    def __init__(self):
+        self.app = None
+        self.flush_size = 5000
+        self.flush_interval = 0.05
+        self.max_pending = 100000
+        self.ack_timeout = 10
+        self._reset()
+
+    def _reset(self):
+        self._batches = deque() # (rows, Future) per submitted request
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def configure(self, app):
+        """Applies the ACCESS_EVENT_* settings from the app config; rows are written with this app's database."""
+        self.app = app
+        self.flush_size = app.config.get('ACCESS_EVENT_FLUSH_SIZE', 5000)
+        self.flush_interval = app.config.get('ACCESS_EVENT_FLUSH_INTERVAL_MS', 50) / 1000
+        self.max_pending = app.config.get('ACCESS_EVENT_MAX_PENDING', 100000)
+        self.ack_timeout = app.config.get('ACCESS_EVENT_ACK_TIMEOUT', 10)
+
+    def submit(self, rows):
+        """Queues the rows; returns a Future resolved once they are committed."""
+        future = Future()
+        with self._condition:
+            if self._pending + len(rows) > self.max_pending:
+                raise IngestionBusy('Too many access events are already waiting to be written.')
+            self._batches.append((rows, future))
+            self._pending += len(rows)
+            if self._thread is None:
+                # Started lazily, so each forked web worker runs its own writer
+                self._thread = threading.Thread(target=self._run, name='access-event-writer', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    def write(self, rows):
+        """
+        Queues the rows and waits until they are committed. Raises IngestionBusy or
+        concurrent.futures.TimeoutError when the writer is overloaded (the sender should retry),
+        or the writer's own exception if storing the rows failed.
+        """
+        return self.submit(rows).result(timeout=self.ack_timeout)
+
+    def _take_batches(self):
+        """Waits for a flush threshold, then removes and returns the batches to write."""
+        with self._condition:
+            while not self._batches:
+                self._condition.wait()
+            deadline = time.monotonic() + self.flush_interval
+            while self._pending < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batches, taken = [], 0
+            while self._batches and (not batches or taken < self.flush_size):
+                rows, future = self._batches.popleft()
+                batches.append((rows, future))
+                taken += len(rows)
+            self._pending -= taken
+            return batches
+
+    def _run(self):
+        while True:
+            batches = self._take_batches()
+            try:
+                with self.app.app_context():
+                    insert_events([row for rows, _ in batches for row in rows])
+            except Exception as e:
+                self.app.logger.exception('Writing %d access event batches failed', len(batches))
+                for _, future in batches:
+                    future.set_exception(e)
+            else:
+                for rows, future in batches:
+                    future.set_result(len(rows))
+
+access_event_writer = AccessEventWriter()
+# Rows queued in the parent belong to the parent; a forked child starts with an empty queue
+os.register_at_fork(after_in_child=access_event_writer._reset)
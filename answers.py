@@ -0,0 +1,265 @@
+import hashlib
+import zlib
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Progress, Answer, AnswerBody
+from database import UPSERT_DIALECTS
+from summaries import touch_trainee_summaries
+
+# --- Answer persistence for complete_assessment ---
+# Assignment status changes are compare-and-swap updates on Assignment.version: of two requests
+# that read the same version (a double-click, two tabs, an autosave racing the submit) only the
+# first to write succeeds, and the other gets AssignmentChanged. A submission also carries the
+# version its page was rendered from, so a tab left open while the assessment was submitted or
+# changed elsewhere is refused too, not just a request racing it. The status update is flushed
+# before any answer is written, so the loser fails fast and the winner's write lock is held only
+# for its few statements. Answers and Progress rows are upserts on unique keys, so they can never
+# be duplicated. A submission carries an idempotency key, stored on the assignment, so a retried
+# submission can be recognised and answered without writing anything.
+#
+# Answer texts live in AnswerBody rows, one per distinct text (keyed by its SHA-256 digest), so
+# pasted boilerplate is stored once however many answers repeat it. On SQLite, bodies of at least
+# ANSWER_COMPRESS_MIN_BYTES are zlib-compressed; the search index and exports read them through
+# the inflate_text() SQL function (database.py). PostgreSQL already compresses large values itself
+# (TOAST) and indexes the plain text for search, so bodies are stored uncompressed there.
+# Bodies no answer uses any more are deleted as answers are overwritten or removed. On PostgreSQL
+# that races other transactions reusing the same bodies, so the pruner locks the bodies before it
+# checks for answers, and store_answer_bodies() holds a key-share lock on the bodies it hands out
+# until its answers are committed (SQLite runs one writer at a time and needs neither).
+
+class AssignmentChanged(Exception):
+    """The assignment was changed by another request since it was read; nothing was written."""
+
+def upsert_statement(model):
+    """Returns a dialect-specific INSERT for `model` that supports on_conflict_do_update, or None."""
+    insert = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    return insert(model) if insert else None
+
+# Dialects where answer bodies are stored compressed, see above
+COMPRESSING_DIALECTS = ('sqlite',)
+
+def answer_body_row(text, compress_min_bytes=0):
+    """The AnswerBody column values for `text`, compressed if at least `compress_min_bytes` long (0: never)."""
+    raw = text.encode('utf-8')
+    row = {'digest': hashlib.sha256(raw).hexdigest(), 'size': len(raw), 'text': text, 'compressed': None}
+    if compress_min_bytes and len(raw) >= compress_min_bytes:
+        compressed = zlib.compress(raw)
+        if len(compressed) < len(raw):
+            row['text'], row['compressed'] = None, compressed
+    return row
+
+def compress_min_bytes():
+    """ANSWER_COMPRESS_MIN_BYTES on databases where bodies are compressed, otherwise 0."""
+    if db.session.get_bind().dialect.name not in COMPRESSING_DIALECTS:
+        return 0
+    return current_app.config['ANSWER_COMPRESS_MIN_BYTES']
+
+def answer_text_column():
+    """SQL expression for an answer's text, for queries joining AnswerBody."""
+    if db.session.get_bind().dialect.name in COMPRESSING_DIALECTS:
+        return db.func.coalesce(AnswerBody.text, db.func.inflate_text(AnswerBody.compressed))
+    return AnswerBody.text
+
+def store_answer_bodies(texts):
+    """
+    Returns {text: AnswerBody id} for the given texts, inserting the bodies that do not exist yet,
+    and keeps them from being pruned until the transaction ends. Two statements however many
+    texts. Does not commit.
+    """
+    threshold = compress_min_bytes()
+    rows = {}
+    digests = {}
+    for text in texts:
+        if text not in digests:
+            row = answer_body_row(text, threshold)
+            rows[row['digest']] = row
+            digests[text] = row['digest']
+    if not rows:
+        return {}
+
+    def body_ids(digests):
+        # FOR KEY SHARE (not rendered on SQLite): prune_answer_bodies() waits for this transaction
+        return dict(db.session.execute(
+            db.select(AnswerBody.digest, AnswerBody.id).where(AnswerBody.digest.in_(digests))
+            .order_by(AnswerBody.id).with_for_update(read=True, key_share=True)).all())
+
+    stmt = upsert_statement(AnswerBody)
+    if stmt is not None:
+        ids, missing = {}, list(rows.values())
+    else:
+        ids = body_ids(list(rows))
+        missing = [row for digest, row in rows.items() if digest not in ids]
+    while missing:
+        # A body pruned between the insert and the lock is gone once the lock is granted: insert it again
+        if stmt is not None:
+            db.session.execute(stmt.on_conflict_do_nothing(index_elements=['digest']), missing)
+        else:
+            db.session.execute(db.insert(AnswerBody), missing)
+        ids.update(body_ids([row['digest'] for row in missing]))
+        missing = [row for digest, row in rows.items() if digest not in ids]
+    return {text: ids[digest] for text, digest in digests.items()}
+
+def prune_answer_bodies(body_ids):
+    """Deletes those of the given AnswerBody rows that no answer uses any more. Does not commit."""
+    body_ids = [body_id for body_id in body_ids if body_id is not None]
+    if not body_ids:
+        return
+    if db.session.get_bind().dialect.name != 'sqlite':
+        # Lock the bodies first: once a transaction that took one in store_answer_bodies() ends, the
+        # DELETE below, a statement of its own, sees the answers it committed
+        body_ids = db.session.execute(
+            db.select(AnswerBody.id).where(AnswerBody.id.in_(body_ids))
+            .order_by(AnswerBody.id).with_for_update()).scalars().all()
+        if not body_ids:
+            return
+    still_used = db.select(Answer.id).where(Answer.body_id == AnswerBody.id).exists()
+    db.session.execute(db.delete(AnswerBody).where(AnswerBody.id.in_(body_ids), ~still_used)
+                       .execution_options(synchronize_session=False))
+
+def load_answers(assignment_id, user_id):
+    """Returns the existing answers for an assignment as {question_id: Answer}, in a single query."""
+    answers = Answer.query.filter_by(assignment_id=assignment_id, user_id=user_id).all()
+    return {answer.question_id: answer for answer in answers}
+
+def upsert_answers(assignment_id, user_id, answer_texts):
+    """
+    Inserts or updates one answer per question from {question_id: answer_text}.
+    Uses a single batched INSERT ... ON CONFLICT DO UPDATE on the Answer unique index where the
+    database supports it, otherwise falls back to updating the rows found by load_answers().
+    The texts are stored as shared bodies, and bodies the answers no longer use are deleted.
+    Does not commit.
+    """
+    if not answer_texts:
+        return
+    now = datetime.utcnow()
+    body_ids = store_answer_bodies(answer_texts.values())
+    replaced_body_ids = set(db.session.execute(
+        db.select(Answer.body_id).where(Answer.assignment_id == assignment_id, Answer.user_id == user_id,
+                                        Answer.question_id.in_(list(answer_texts)))
+    ).scalars()) - set(body_ids.values())
+    rows = [{
+        'question_id': question_id,
+        'user_id': user_id,
+        'assignment_id': assignment_id,
+        'body_id': body_ids[answer_text],
+        'submitted_date': now
+    } for question_id, answer_text in answer_texts.items()]
+
+    stmt = upsert_statement(Answer)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['assignment_id', 'question_id', 'user_id'],
+            set_={'body_id': stmt.excluded.body_id, 'submitted_date': stmt.excluded.submitted_date}
+        )
+        db.session.execute(stmt, rows)
+    else:
+        existing_answers = load_answers(assignment_id, user_id)
+        for row in rows:
+            existing_answer = existing_answers.get(row['question_id'])
+            if existing_answer:
+                existing_answer.body_id = row['body_id']
+                existing_answer.submitted_date = now
+            else:
+                db.session.add(Answer(**row))
+    prune_answer_bodies(replaced_body_ids)
+
+def upsert_progress(assignment_id, status, completion_date=None):
+    """Inserts or updates the single Progress row for an assignment. Does not commit."""
+    stmt = upsert_statement(Progress)
+    if stmt is not None:
+        stmt = stmt.values(assignment_id=assignment_id, status=status,
+                           completion_date=completion_date, last_updated=datetime.utcnow())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['assignment_id'],
+            set_={'status': stmt.excluded.status,
+                  'completion_date': stmt.excluded.completion_date,
+                  'last_updated': stmt.excluded.last_updated}
+        )
+        db.session.execute(stmt)
+        return
+
+    progress = Progress.query.filter_by(assignment_id=assignment_id).first()
+    if progress:
+        progress.status = status
+        progress.completion_date = completion_date
+    else:
+        db.session.add(Progress(assignment_id=assignment_id, status=status, completion_date=completion_date))
+
+def save_answer(assignment, question_id, answer_text):
+    """
+    Autosaves one answer of an assessment in progress and commits: upserts it on the
+    (assignment, question, user) key, or deletes it when `answer_text` is blank, and marks a
+    not-started assignment in progress. A constant number of statements, however long the
+    assessment. Returns (the answer's submitted_date, or None when it was cleared; the
+    assignment's version after the save).
+    """
+    try:
+        if assignment.status == 'not_started':
+            # The status change is flushed as an ORM write (a compare-and-swap on the version),
+            # which also refreshes the trainee's summary
+            assignment.status = 'in_progress'
+            db.session.flush()
+            upsert_progress(assignment.id, 'in_progress')
+        else:
+            touch_trainee_summaries([assignment.user_id])
+        if answer_text and answer_text.strip():
+            upsert_answers(assignment.id, assignment.user_id, {question_id: answer_text})
+            saved_at = datetime.utcnow()
+        else:
+            answer_key = (Answer.assignment_id == assignment.id, Answer.question_id == question_id,
+                          Answer.user_id == assignment.user_id)
+            body_id = db.session.execute(db.select(Answer.body_id).where(*answer_key)).scalar()
+            db.session.execute(db.delete(Answer).where(*answer_key))
+            prune_answer_bodies([body_id])
+            saved_at = None
+        version = assignment.version # Read before the commit expires it
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        raise AssignmentChanged()
+    except Exception:
+        db.session.rollback()
+        raise
+    return saved_at, version
+
+def submit_assessment(assignment, answer_texts, submission_key=None, expected_version=None):
+    """
+    Saves the answers sent with a submission (none when they were all autosaved), marks the
+    assignment completed and records its Progress, all in one transaction.
+    Raises AssignmentChanged, having written nothing, if the assignment is no longer at
+    `expected_version` (the version the submitted page showed, when known) or if another request
+    changed it since it was read. The due date scheduler marking it overdue meanwhile does not
+    count: the submission goes ahead.
+    """
+    read_version = assignment.version
+    if (expected_version is not None and read_version != expected_version
+            and not marked_overdue_since(assignment, expected_version)):
+        raise AssignmentChanged()
+    while True:
+        try:
+            assignment.status = 'completed'
+            assignment.submission_key = submission_key
+            db.session.flush() # The compare-and-swap on the version, before anything else is written
+            upsert_answers(assignment.id, assignment.user_id, answer_texts)
+            upsert_progress(assignment.id, 'completed', completion_date=datetime.utcnow())
+            db.session.commit()
+            return
+        except StaleDataError:
+            db.session.rollback() # Expires the assignment, so it is read again below
+            if not marked_overdue_since(assignment, read_version):
+                raise AssignmentChanged()
+            read_version = assignment.version # Overdue is final for the scheduler: this retries once
+        except Exception:
+            db.session.rollback()
+            raise
+
+def marked_overdue_since(assignment, version):
+    """True if the only change to `assignment` since `version` was the due date scheduler marking it overdue."""
+    return assignment.status == 'overdue' and assignment.version == version + 1
+
+def is_retry(assignment, submission_key):
+    """True if `submission_key` is the key of the submission that completed the assignment."""
+    return (submission_key is not None and assignment.status == 'completed'
+            and assignment.submission_key == submission_key)
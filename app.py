@@ -1,29 +1,40 @@
-from flask import Flask, render_template, redirect, url_for, flash, request
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
-from datetime import datetime
+from flask import Flask, Blueprint, current_app, render_template, redirect, url_for, flash, request, jsonify, abort, Response, stream_with_context
+from flask_login import login_user, logout_user, login_required, current_user
+from functools import partial, wraps
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+import hmac
+import uuid
+from datetime import datetime, timedelta
 from sqlalchemy import or_
 
 # Import configurations and models/forms
 from config import Config
-from models import db, User, Course, Assessment, Question, Assignment, Progress, Answer, load_user
-from forms import RegistrationForm, LoginForm, CourseForm, AssessmentForm, QuestionForm, AssignItemsForm, AnswerForm, SearchQuestionsForm
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Initialize extensions
-db.init_app(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login' # Redirect to login page if not authenticated
-login_manager.init_app(app)
-
-# Create database tables if they don't exist
-with app.app_context():
-    db.create_all()
+from extensions import db, login_manager, register_engines
+from models import User, Course, Assessment, Question, Assignment, Progress, Answer, load_user
+from forms import RegistrationForm, LoginForm, CourseForm, AssessmentForm, QuestionForm, AssignItemsForm, AnswerForm, SubmitAssessmentForm, AutosaveAnswerForm, SearchQuestionsForm, SearchAnswersForm, ProgressFilterForm, ExportFilterForm, LookupForm, AccessReportForm
+from queries import load_trainee_progress, summarize_assignment, assignment_items_loaded, load_questions_and_answers
+from schema import init_db_command, upgrade_db_command
+from answers import load_answers, save_answer, submit_assessment, is_retry, AssignmentChanged
+from assignments import count_candidates, create_assignments, start_assignment_job, get_job
+from search import search
+from lookup import LOOKUPS, lookup
+from stats import dashboard_statistics, rebuild_stats_command
+from summaries import rebuild_progress_summary_command
+from export import EXPORT_FORMATS, progress_export_query, answer_export_query
+import instrumentation
+import database
+import routing
+from routing import read_replica, sync_replica_command
+from identity import identity_cache
+from passwords import password_hashing, PasswordHashingBusy
+from cache import cache, cached_view, cache_fragment, trainee_stamp, trainee_details_stamp
+from access_events import access_event_writer, parse_events, IngestionBusy
+from rollups import access_report, rebuild_access_rollups_command
+from archive import load_archived_assignments, archive_command
+from scheduler import due_date_scheduler, run_scheduler_command
+
+# All routes live on this blueprint; create_app() registers it
+bp = Blueprint('main', __name__)
 
 # --- Role-based Access Control Decorators ---
 def role_required(role):
@@ -35,10 +46,10 @@ def role_required(role):
         def decorated_function(*args, **kwargs):
             if not current_user.is_authenticated:
                 flash('Please log in to access this page.', 'warning')
-                return redirect(url_for('login', next=request.url))
+                return redirect(url_for('main.login', next=request.url))
             if current_user.role != role:
                 flash(f'You do not have permission to access this page. Required role: {role.capitalize()}', 'danger')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -53,86 +64,99 @@ def support_or_admin_required(f):
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated:
             flash('Please log in to access this page.', 'warning')
-            return redirect(url_for('login', next=request.url))
+            return redirect(url_for('main.login', next=request.url))
         if current_user.role not in ['support', 'admin']:
             flash('You do not have permission to access this page.', 'danger')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         return f(*args, **kwargs)
     return decorated_function
 
 # --- Routes ---
 
-@app.route('/')
-@app.route('/index')
+@bp.route('/')
+@bp.route('/index')
 def index():
     """Home page."""
     return render_template('index.html', title='Welcome')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration page."""
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     form = RegistrationForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data, role=form.role.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHashingBusy:
+            flash('The server is busy, please try again in a moment.', 'warning')
+            return render_template('register.html', title='Register', form=form), 503
         db.session.add(user)
         db.session.commit()
         flash('Congratulations, you are now a registered user!', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('register.html', title='Register', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     """User login page."""
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user is None or not user.check_password(form.password.data):
-            flash('Invalid username or password', 'danger')
-            return redirect(url_for('login'))
+        try:
+            if user is None or not user.check_password(form.password.data):
+                flash('Invalid username or password', 'danger')
+                return redirect(url_for('main.login'))
+            # Transparently upgrade hashes made with older cost parameters
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db.session.commit()
+        except PasswordHashingBusy:
+            flash('The server is busy, please try again in a moment.', 'warning')
+            return render_template('login.html', title='Sign In', form=form), 503
         login_user(user)
         next_page = request.args.get('next')
-        return redirect(next_page or url_for('dashboard'))
+        return redirect(next_page or url_for('main.dashboard'))
     return render_template('login.html', title='Sign In', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     """Logs out the current user."""
     logout_user()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
     """User dashboard, redirects based on role."""
     if current_user.role == 'admin':
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     elif current_user.role == 'trainee':
-        return redirect(url_for('trainee_assignments'))
+        return redirect(url_for('main.trainee_assignments'))
     elif current_user.role == 'support':
-        return redirect(url_for('view_all_trainee_progress'))
+        return redirect(url_for('main.view_all_trainee_progress'))
     return render_template('dashboard.html', title='Dashboard') # Fallback dashboard
 
-@app.route('/admin_dashboard')
+@bp.route('/admin_dashboard')
+@read_replica
 @admin_required
 def admin_dashboard():
     """Admin dashboard with quick links for management."""
-    total_users = User.query.count()
-    total_courses = Course.query.count()
-    total_assessments = Assessment.query.count()
+    # Counters are maintained incrementally (see stats.py) instead of COUNT(*) on every load
+    stats = dashboard_statistics()
     return render_template('admin_dashboard.html',
                            title='Admin Dashboard',
-                           total_users=total_users,
-                           total_courses=total_courses,
-                           total_assessments=total_assessments)
+                           total_users=stats['users'],
+                           total_courses=stats['courses'],
+                           total_assessments=stats['assessments'],
+                           stats=stats)
 
-@app.route('/create_course', methods=['GET', 'POST'])
+@bp.route('/create_course', methods=['GET', 'POST'])
 @admin_required
 def create_course():
     """Admin route to create a new course."""
@@ -142,10 +166,10 @@ def create_course():
         db.session.add(course)
         db.session.commit()
         flash(f'Course "{course.title}" created successfully!', 'success')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     return render_template('create_course.html', title='Create Course', form=form)
 
-@app.route('/create_assessment', methods=['GET', 'POST'])
+@bp.route('/create_assessment', methods=['GET', 'POST'])
 @admin_required
 def create_assessment():
     """Admin route to create a new assessment."""
@@ -155,10 +179,10 @@ def create_assessment():
         db.session.add(assessment)
         db.session.commit()
         flash(f'Assessment "{assessment.title}" created successfully! Now add questions.', 'success')
-        return redirect(url_for('add_question_to_assessment', assessment_id=assessment.id))
+        return redirect(url_for('main.add_question_to_assessment', assessment_id=assessment.id))
     return render_template('create_assessment.html', title='Create Assessment', form=form)
 
-@app.route('/assessment/<int:assessment_id>/add_question', methods=['GET', 'POST'])
+@bp.route('/assessment/<int:assessment_id>/add_question', methods=['GET', 'POST'])
 @admin_required
 def add_question_to_assessment(assessment_id):
     """Admin route to add questions to an existing assessment."""
@@ -173,54 +197,71 @@ def add_question_to_assessment(assessment_id):
         flash('Question added successfully!', 'success')
         # Allow adding more questions or returning to dashboard
         if 'add_another' in request.form: # Check if 'Add Another' button was clicked
-            return redirect(url_for('add_question_to_assessment', assessment_id=assessment.id))
+            return redirect(url_for('main.add_question_to_assessment', assessment_id=assessment.id))
         else:
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
     
     # Display existing questions for the assessment
     questions = Question.query.filter_by(assessment_id=assessment.id).all()
     return render_template('add_question.html', title=f'Add Questions to {assessment.title}',
                            form=form, assessment=assessment, questions=questions)
 
-@app.route('/assign_items', methods=['GET', 'POST'])
+@bp.route('/assign_items', methods=['GET', 'POST'])
 @admin_required
 def assign_items():
     """Admin route to assign courses or assessments to trainees."""
+    # Trainees, courses and assessments are picked through the lookup API, not listed in the page
     form = AssignItemsForm()
-    
-    # Populate choices for trainees, courses, and assessments
-    form.trainees.choices = [(u.id, u.username) for u in User.query.filter_by(role='trainee').order_by(User.username).all()]
-    form.courses.choices = [(0, '--- Select a Course ---')] + [(c.id, c.title) for c in Course.query.order_by(Course.title).all()]
-    form.assessments.choices = [(0, '--- Select an Assessment ---')] + [(a.id, a.title) for a in Assessment.query.order_by(Assessment.title).all()]
 
     if form.validate_on_submit():
-        selected_trainee_ids = form.trainees.data
-        selected_course_id = form.courses.data if form.courses.data != 0 else None
-        selected_assessment_id = form.assessments.data if form.assessments.data != 0 else None
-
-        if not selected_trainee_ids:
-            flash('Please select at least one trainee.', 'danger')
-            return redirect(url_for('assign_items'))
-
-        assigned_count = 0
-        for trainee_id in selected_trainee_ids:
-            if selected_course_id:
-                assignment = Assignment(user_id=trainee_id, course_id=selected_course_id)
-                db.session.add(assignment)
-                assigned_count += 1
-            elif selected_assessment_id:
-                assignment = Assignment(user_id=trainee_id, assessment_id=selected_assessment_id)
-                db.session.add(assignment)
-                assigned_count += 1
-        
-        db.session.commit()
-        flash(f'{assigned_count} assignments created successfully!', 'success')
-        return redirect(url_for('admin_dashboard'))
+        selected_trainee_ids = None if form.all_trainees.data else form.trainees.data
+        item = {
+            'course_id': form.courses.data or None,
+            'group_id': form.course_group.data or None,
+            'assessment_id': form.assessments.data or None
+        }
+
+        # Large runs go to the background worker so this request returns at once
+        if count_candidates(selected_trainee_ids, **item) >= current_app.config['BULK_ASSIGN_BACKGROUND_THRESHOLD']:
+            job = start_assignment_job(current_app._get_current_object(), selected_trainee_ids, **item)
+            flash(f'Assignment job {job.id} started; poll {url_for("main.assignment_job_status", job_id=job.id)} for progress.', 'info')
+            return redirect(url_for('main.admin_dashboard'))
+
+        assigned_count = create_assignments(selected_trainee_ids, **item)
+        flash(f'{assigned_count} assignments created successfully! Existing assignments were skipped.', 'success')
+        return redirect(url_for('main.admin_dashboard'))
 
     return render_template('assign_items.html', title='Assign Courses/Assessments', form=form)
 
-@app.route('/trainee_assignments')
+@bp.route('/api/lookup/<kind>')
+@read_replica
+@admin_required
+def lookup_api(kind):
+    """
+    Admin route for the assign_items pickers: users, courses or assessments whose name starts
+    with ?q= (case-insensitive), e.g. /api/lookup/users?q=ali&role=trainee&limit=10.
+    """
+    if kind not in LOOKUPS:
+        return jsonify({'error': f"Unknown lookup; use one of {', '.join(LOOKUPS)}."}), 404
+    form = LookupForm(request.args)
+    if not form.validate():
+        return jsonify({'errors': form.errors}), 400
+    results = lookup(kind, form.q.data or '', form.limit.data or current_app.config['LOOKUP_RESULTS'],
+                     role=form.role.data or None)
+    return jsonify({'results': results})
+
+@bp.route('/assign_items/jobs/<job_id>')
+@admin_required
+def assignment_job_status(job_id):
+    """Admin route to poll the progress of a background assignment job."""
+    job = get_job(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+@bp.route('/trainee_assignments')
 @role_required('trainee')
+@cached_view(lambda: trainee_stamp(current_user.id))
 def trainee_assignments():
     """Trainee's view of their assigned courses and assessments."""
     # Fetch assignments for the current user
@@ -251,7 +292,7 @@ def trainee_assignments():
 
     return render_template('trainee_assignments.html', title='My Assignments', assigned_items=assigned_items)
 
-@app.route('/complete_assessment/<int:assignment_id>', methods=['GET', 'POST'])
+@bp.route('/complete_assessment/<int:assignment_id>', methods=['GET', 'POST'])
 @role_required('trainee')
 def complete_assessment(assignment_id):
     """Trainee route to complete an assessment."""
@@ -260,7 +301,24 @@ def complete_assessment(assignment_id):
     # Ensure this assignment belongs to the current user and is an assessment
     if assignment.user_id != current_user.id or not assignment.assessment_id:
         flash('Invalid assignment or not an assessment.', 'danger')
-        return redirect(url_for('trainee_assignments'))
+        return redirect(url_for('main.trainee_assignments'))
+
+    # The page's single CSRF token is carried by submit_form, so the answer forms skip their own.
+    # A retried submission (same idempotency key) is answered before anything else is loaded;
+    # any other submission of a completed assessment is refused.
+    submit_form = SubmitAssessmentForm()
+    submitted = submit_form.validate_on_submit()
+    submission_key = submit_form.submission_key.data or None
+    if submitted and is_retry(assignment, submission_key):
+        flash('Assessment submitted successfully!', 'success')
+        return redirect(url_for('main.trainee_assignments'))
+    if submitted and assignment.status == 'completed':
+        flash('This assessment has already been submitted.', 'warning')
+        return redirect(url_for('main.trainee_assignments'))
+    if not submission_key:
+        submit_form.submission_key.data = uuid.uuid4().hex # One key per page shown
+    if submit_form.version.data is None:
+        submit_form.version.data = assignment.version # The version this page shows
 
     assessment = Assessment.query.get_or_404(assignment.assessment_id)
     questions = Question.query.filter_by(assessment_id=assessment.id).all()
@@ -268,42 +326,31 @@ def complete_assessment(assignment_id):
     # Create a list of forms for each question
     # This approach assumes all questions are open-ended for now.
     # For different question types, you'd need more complex form handling.
+    existing_answers = load_answers(assignment.id, current_user.id) # One query for all questions
     forms = []
     for question in questions:
-        form = AnswerForm(prefix=f'q_{question.id}') # Use prefix to distinguish forms
-        # Pre-populate if an answer already exists
-        existing_answer = Answer.query.filter_by(
-            question_id=question.id,
-            user_id=current_user.id,
-            assignment_id=assignment.id
-        ).first()
-        if existing_answer:
+        form = AnswerForm(prefix=f'q_{question.id}', meta={'csrf': False}) # Use prefix to distinguish forms
+        # Pre-populate if an answer already exists (but never over the submitted text)
+        existing_answer = existing_answers.get(question.id)
+        if existing_answer and request.method == 'GET':
             form.answer_text.data = existing_answer.answer_text
         forms.append({'question': question, 'form': form})
 
-    if request.method == 'POST':
+    if submitted:
+        # Answers are normally autosaved one at a time (save_answer_api), and the page then posts
+        # only the CSRF token. Without JavaScript the answers come with the submit and are saved here.
         all_forms_valid = True
+        answer_texts = {}
         for item in forms:
             form = item['form']
             question = item['question']
-            if form.validate_on_submit():
-                # Update existing answer or create new one
-                existing_answer = Answer.query.filter_by(
-                    question_id=question.id,
-                    user_id=current_user.id,
-                    assignment_id=assignment.id
-                ).first()
-                if existing_answer:
-                    existing_answer.answer_text = form.answer_text.data
-                    existing_answer.submitted_date = datetime.utcnow()
-                else:
-                    answer = Answer(
-                        question_id=question.id,
-                        user_id=current_user.id,
-                        assignment_id=assignment.id,
-                        answer_text=form.answer_text.data
-                    )
-                    db.session.add(answer)
+            if form.answer_text.name not in request.form:
+                if question.id not in existing_answers:
+                    all_forms_valid = False
+                    flash(f'Error for question "{question.question_text}": Please answer this question.', 'danger')
+                continue
+            if form.validate():
+                answer_texts[question.id] = form.answer_text.data
             else:
                 all_forms_valid = False
                 # Flash errors for invalid forms
@@ -312,152 +359,326 @@ def complete_assessment(assignment_id):
                         flash(f'Error for question "{question.question_text}": {error}', 'danger')
 
         if all_forms_valid:
-            # Mark assignment as completed if all questions are answered
-            assignment.status = 'completed'
-            # Also update the Progress entry if it exists, or create one
-            progress = Progress.query.filter_by(assignment_id=assignment.id).first()
-            if progress:
-                progress.status = 'completed'
-                progress.completion_date = datetime.utcnow()
-            else:
-                new_progress = Progress(assignment_id=assignment.id, status='completed', completion_date=datetime.utcnow())
-                db.session.add(new_progress)
-
-            db.session.commit()
-            flash('Assessment submitted successfully!', 'success')
-            return redirect(url_for('trainee_assignments'))
+            # Save any posted answers, mark the assignment completed and update Progress in one transaction
+            try:
+                submit_assessment(assignment, answer_texts, submission_key, expected_version=submit_form.version.data)
+                changed = False
+            except AssignmentChanged:
+                # Another request got there first; if it carried this key, it was this same submission
+                assignment = db.session.get(Assignment, assignment_id)
+                changed = not is_retry(assignment, submission_key)
+                if changed and assignment.status == 'completed':
+                    flash('This assessment has already been submitted in another window.', 'warning')
+                    return redirect(url_for('main.trainee_assignments'))
+            if not changed:
+                flash('Assessment submitted successfully!', 'success')
+                return redirect(url_for('main.trainee_assignments'))
+            # Show the page again rather than redirect, so the answers posted with it are not lost;
+            # answers left out of the post (autosaved) are shown as they are saved now
+            flash('This assessment was changed in another window. Please review your answers and submit again.', 'warning')
+            existing_answers = load_answers(assignment.id, current_user.id)
+            for item in forms:
+                answer_field = item['form'].answer_text
+                if answer_field.name not in request.form and item['question'].id in existing_answers:
+                    answer_field.data = existing_answers[item['question'].id].answer_text
+            submit_form.version.data = assignment.version
+            submit_form.version.raw_data = None # Render the version now reviewed, not the one posted
         else:
-            db.session.rollback() # Rollback if any form failed validation
             flash('Please correct the errors in your answers.', 'danger')
 
     return render_template('complete_assessment.html',
                            title=f'Complete Assessment: {assessment.title}',
                            assignment=assignment,
                            assessment=assessment,
+                           submit_form=submit_form,
                            forms=forms)
 
-@app.route('/view_all_trainee_progress')
+@bp.route('/api/assignments/<int:assignment_id>/answers/<int:question_id>', methods=['PUT'])
+def save_answer_api(assignment_id, question_id):
+    """
+    Autosaves one answer of a trainee's assessment, sent as JSON by complete_assessment's page:
+    {"answer_text": ..., "csrf_token": ...}. A blank answer_text clears the saved answer.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Your session has expired; please log in again.'}), 401
+    if current_user.role != 'trainee':
+        return jsonify({'error': 'Only trainees can answer assessments.'}), 403
+
+    assignment = db.session.get(Assignment, assignment_id)
+    if assignment is None or assignment.user_id != current_user.id or not assignment.assessment_id:
+        return jsonify({'error': 'Assignment not found.'}), 404
+    question_exists = db.session.execute(
+        db.select(Question.id).where(Question.id == question_id, Question.assessment_id == assignment.assessment_id)
+    ).scalar()
+    if question_exists is None:
+        return jsonify({'error': 'Question not found.'}), 404
+    if assignment.status == 'completed':
+        return jsonify({'error': 'This assessment has already been submitted.'}), 409
+
+    form = AutosaveAnswerForm()
+    if not form.validate_on_submit():
+        return jsonify({'errors': form.errors}), 400
+    try:
+        saved_at, version = save_answer(assignment, question_id, form.answer_text.data)
+    except AssignmentChanged:
+        return jsonify({'error': 'This assessment was changed in another window; reload the page.'}), 409
+    return jsonify({'question_id': question_id, 'saved': saved_at is not None,
+                    'saved_at': saved_at.isoformat() if saved_at else None, 'version': version})
+
+@bp.route('/view_all_trainee_progress')
+@read_replica
 @support_or_admin_required
 def view_all_trainee_progress():
-    """Support/Admin route to view progress of all trainees."""
-    trainees = User.query.filter_by(role='trainee').order_by(User.username).all()
-    
-    trainee_data = []
-    for trainee in trainees:
-        assignments = Assignment.query.filter_by(user_id=trainee.id).all()
-        
-        assigned_items_summary = []
-        for assignment in assignments:
-            item_title = 'N/A'
-            item_type = ''
-            if assignment.course_id:
-                item = Course.query.get(assignment.course_id)
-                item_title = item.title if item else 'Deleted Course'
-                item_type = 'Course'
-            elif assignment.assessment_id:
-                item = Assessment.query.get(assignment.assessment_id)
-                item_title = item.title if item else 'Deleted Assessment'
-                item_type = 'Assessment'
-            
-            assigned_items_summary.append({
-                'assignment_id': assignment.id,
-                'item_type': item_type,
-                'title': item_title,
-                'status': assignment.status,
-                'assigned_date': assignment.assigned_date.strftime('%Y-%m-%d'),
-                'due_date': assignment.due_date.strftime('%Y-%m-%d') if assignment.due_date else 'N/A'
-            })
-        
-        trainee_data.append({
-            'user': trainee,
-            'assignments': assigned_items_summary
-        })
-
-    return render_template('view_progress.html', title='Trainee Progress Overview', trainee_data=trainee_data)
-
-@app.route('/view_trainee_details/<int:user_id>')
+    """Support/Admin route to view progress of all trainees, one keyset page at a time."""
+    form = ProgressFilterForm(request.args)
+    filters = {}
+    if form.validate():
+        filters = {
+            'status': form.status.data or None,
+            'item_type': form.item_type.data or None,
+            'group_id': form.group_id.data or None,
+            'overdue': form.overdue.data
+        }
+    else:
+        flash('Invalid filter; showing all trainees.', 'warning')
+
+    trainee_data, next_cursor = load_trainee_progress(after=request.args.get('after') or None,
+                                                      limit=current_app.config['TRAINEES_PER_PAGE'],
+                                                      **filters)
+    # Keep the active filters on the "next page" link
+    filter_args = {key: value for key, value in filters.items() if value}
+    return render_template('view_progress.html', title='Trainee Progress Overview', form=form,
+                           trainee_data=trainee_data, next_cursor=next_cursor, filter_args=filter_args)
+
+@bp.route('/view_trainee_details/<int:user_id>')
+@read_replica
 @support_or_admin_required
+@cached_view(lambda user_id: trainee_details_stamp(user_id))
 def view_trainee_details(user_id):
     """Support/Admin route to view detailed progress for a specific trainee."""
     trainee = User.query.get_or_404(user_id)
     if trainee.role != 'trainee':
         flash('User is not a trainee.', 'danger')
-        return redirect(url_for('view_all_trainee_progress'))
+        return redirect(url_for('main.view_all_trainee_progress'))
+
+    assignments = (Assignment.query.filter_by(user_id=trainee.id)
+                   .options(*assignment_items_loaded())
+                   .order_by(Assignment.id)
+                   .all())
 
-    assignments = Assignment.query.filter_by(user_id=trainee.id).all()
-    
     detailed_assignments = []
     for assignment in assignments:
-        item_title = 'N/A'
-        item_type = ''
-        questions_and_answers = []
-        
-        if assignment.course_id:
-            item = Course.query.get(assignment.course_id)
-            item_title = item.title if item else 'Deleted Course'
-            item_type = 'Course'
-        elif assignment.assessment_id:
-            item = Assessment.query.get(assignment.assessment_id)
-            item_title = item.title if item else 'Deleted Assessment'
-            item_type = 'Assessment'
-            
-            # Fetch answers for this assessment if it's completed
-            if assignment.status == 'completed':
-                questions = Question.query.filter_by(assessment_id=assignment.assessment_id).all()
-                for question in questions:
-                    answer = Answer.query.filter_by(
-                        question_id=question.id,
-                        user_id=trainee.id,
-                        assignment_id=assignment.id
-                    ).first()
-                    questions_and_answers.append({
-                        'question_text': question.question_text,
-                        'answer_text': answer.answer_text if answer else 'No answer submitted yet.',
-                        'submitted_date': answer.submitted_date.strftime('%Y-%m-%d %H:%M') if answer else 'N/A'
-                    })
-
-        detailed_assignments.append({
-            'assignment_id': assignment.id,
-            'item_type': item_type,
-            'title': item_title,
-            'status': assignment.status,
-            'assigned_date': assignment.assigned_date.strftime('%Y-%m-%d'),
-            'due_date': assignment.due_date.strftime('%Y-%m-%d') if assignment.due_date else 'N/A',
-            'questions_and_answers': questions_and_answers # Only relevant for assessments
-        })
+        details = summarize_assignment(assignment)
+        if assignment.assessment_id and assignment.status == 'completed':
+            # The template caches each assessment's answers as a fragment and calls this only when
+            # it is missing or stale. The key holds the trainee and assigned date as well, since
+            # SQLite may give an archived assignment's id to a new one; answers of a completed
+            # assignment change only when it is submitted again, which bumps its version
+            details['load_answers'] = partial(load_questions_and_answers, assignment)
+            details['answers_key'] = f'{assignment.user_id}:{assignment.id}:{assignment.assigned_date}'
+            assessment = assignment.assessment_assigned
+            details['answers_stamp'] = (assignment.version, assessment.questions_changed_at if assessment else None)
+        detailed_assignments.append(details)
+
+    # Assignments moved to the archive files by `flask archive` are read only on request
+    include_archived = request.args.get('archived', type=int) == 1
+    if include_archived:
+        detailed_assignments.extend(load_archived_assignments(trainee.id))
 
     return render_template('view_trainee_details.html',
                            title=f'Progress for {trainee.username}',
                            trainee=trainee,
-                           detailed_assignments=detailed_assignments)
+                           detailed_assignments=detailed_assignments,
+                           include_archived=include_archived)
 
-@app.route('/search_questions', methods=['GET', 'POST'])
+@bp.route('/search_questions')
+@read_replica
 @admin_required # Or support_or_admin_required depending on who can search
 def search_questions():
-    """Admin route to search open-ended questions."""
-    form = SearchQuestionsForm()
-    results = []
-    if form.validate_on_submit():
-        search_query = f"%{form.search_query.data}%"
+    """Admin route to search open-ended questions, best matches first."""
+    form = SearchQuestionsForm(request.args)
+    page = request.args.get('page', 1, type=int)
+    results, has_next = [], False
+    if 'search_query' in request.args and form.validate():
         # Search only open-ended questions for now
-        results = Question.query.filter(
-            Question.question_type == 'open_ended',
-            Question.question_text.ilike(search_query)
-        ).all()
+        results, has_next = search('questions', form.search_query.data, page=page,
+                                   per_page=current_app.config['SEARCH_RESULTS_PER_PAGE'],
+                                   filters=[Question.question_type == 'open_ended'])
         if not results:
             flash('No questions found matching your search.', 'info')
-    return render_template('search_questions.html', title='Search Questions', form=form, results=results)
+    return render_template('search_questions.html', title='Search Questions', form=form,
+                           results=results, page=page, has_next=has_next)
+
+@bp.route('/search_answers')
+@read_replica
+@support_or_admin_required
+def search_answers():
+    """Support/Admin route to search trainees' answers, best matches first."""
+    form = SearchAnswersForm(request.args)
+    page = request.args.get('page', 1, type=int)
+    results, has_next = [], False
+    if 'search_query' in request.args and form.validate():
+        results, has_next = search('answers', form.search_query.data, page=page,
+                                   per_page=current_app.config['SEARCH_RESULTS_PER_PAGE'])
+        if not results:
+            flash('No answers found matching your search.', 'info')
+    return render_template('search_answers.html', title='Search Answers', form=form,
+                           results=results, page=page, has_next=has_next)
+
+def export_response(build_query, name):
+    """Streams the rows of an export query in the requested format, filtered by the query string."""
+    form = ExportFilterForm(request.args)
+    if not form.validate():
+        return jsonify({'errors': form.errors}), 400
+    stmt = build_query(start_date=form.start_date.data,
+                       end_date=form.end_date.data,
+                       status=form.status.data or None,
+                       item_type=form.item_type.data or None,
+                       group_id=form.group_id.data or None,
+                       overdue=form.overdue.data)
+    encode, mimetype = EXPORT_FORMATS[form.format.data]
+    filename = f'{name}-{datetime.utcnow():%Y%m%d%H%M%S}.{form.format.data}'
+    return Response(stream_with_context(encode(stmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.route('/export/progress')
+@read_replica
+@support_or_admin_required
+def export_progress():
+    """Support/Admin route streaming one row per assignment as CSV or NDJSON."""
+    return export_response(progress_export_query, 'progress')
+
+@bp.route('/export/answers')
+@read_replica
+@support_or_admin_required
+def export_answers():
+    """Support/Admin route streaming one row per submitted answer as CSV or NDJSON."""
+    return export_response(answer_export_query, 'answers')
+
+@bp.route('/metrics')
+@admin_required
+def metrics():
+    """Admin route exposing per-endpoint request metrics in the Prometheus text format."""
+    if not current_app.config['INSTRUMENTATION_ENABLED']:
+        abort(404)
+    return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/access-events', methods=['POST'])
+def ingest_access_events():
+    """
+    Records a batch of data access events sent as NDJSON, one JSON object per line:
+    {"event_id": ..., "user_id": ..., "data_item": ..., "purpose": ..., "occurred_at": ISO 8601}.
+    Responds once the accepted events are stored; on 503 the whole batch should be retried.
+    Without ACCESS_EVENT_API_TOKEN, only support and admin sessions may record events.
+    """
+    token = current_app.config['ACCESS_EVENT_API_TOKEN']
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'error': 'Invalid or missing API token.'}), 401
+    elif not current_user.is_authenticated:
+        return jsonify({'error': 'Authentication required.'}), 401
+    elif current_user.role not in ['support', 'admin']:
+        return jsonify({'error': 'Only support and admin users can record access events.'}), 403
+
+    lines = request.get_data(as_text=True).splitlines()
+    if len(lines) > current_app.config['ACCESS_EVENT_MAX_BATCH']:
+        return jsonify({'error': f"At most {current_app.config['ACCESS_EVENT_MAX_BATCH']} events per request."}), 413
+    rows, errors = parse_events(lines, received_at=datetime.utcnow())
+    if rows:
+        try:
+            access_event_writer.write(rows)
+        except (IngestionBusy, FuturesTimeoutError):
+            # Only overload is reported as retryable; a failed write surfaces as a 500
+            return jsonify({'error': 'Event ingestion is busy; retry later.'}), 503, {'Retry-After': '1'}
+    return jsonify({'accepted': len(rows), 'rejected': errors})
+
+@bp.route('/api/reports/access')
+@read_replica
+@support_or_admin_required
+def access_report_api():
+    """
+    Support/Admin route returning access counts per day (or hour) from the rollups, e.g.
+    ?data_item=X&group_by=user_id for accesses per user per day to X over the last 90 days.
+    The date range covers start_date through end_date inclusive.
+    """
+    form = AccessReportForm(request.args)
+    if not form.validate():
+        return jsonify({'errors': form.errors}), 400
+    end_date = form.end_date.data or datetime.utcnow().date()
+    start_date = form.start_date.data or end_date - timedelta(days=current_app.config['ACCESS_REPORT_DEFAULT_DAYS'] - 1)
+    start = datetime.combine(start_date, datetime.min.time())
+    end = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)
+    group_by = form.group_by.data or ['user_id']
+    rows = access_report(form.granularity.data, start, end, group_by=group_by,
+                         user_id=form.user_id.data,
+                         data_item=form.data_item.data or None,
+                         purpose=form.purpose.data or None)
+    return jsonify({'granularity': form.granularity.data, 'start': start.isoformat(), 'end': end.isoformat(),
+                    'group_by': group_by, 'rows': rows})
 
 
 # --- Error Handlers (Optional but good practice) ---
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback() # Rollback any pending database changes
     return render_template('500.html'), 500
 
+# --- Application Factory ---
+def create_app(config_class=Config):
+    """
+    Creates and configures the Flask app. Nothing here touches the database, so the app
+    can be created (and preloaded before forking workers) cheaply; the schema is set up
+    explicitly with `flask init-db` / `flask upgrade-db`.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+
+    # Initialize extensions, with the engines tuned by DATABASE_PROFILE and the optional replica bind
+    routing.configure_replica(app)
+    database.apply_profile(app)
+    db.init_app(app)
+    login_manager.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            database.install_pragmas(engine, database.sqlite_pragmas(app.config))
+            database.install_functions(engine)
+        register_engines(db.engines.values())
+
+    # Size/TTL of the cached logged-in user identities used by load_user
+    identity_cache.configure(app)
+
+    # Hashing backend, cost parameters and the bounded pool hashes run on
+    password_hashing.configure(app)
+
+    # Response/fragment cache backend; templates use {% call cache_fragment(...) %}
+    cache.configure(app)
+    app.jinja_env.globals['cache_fragment'] = cache_fragment
+
+    # Batching and backpressure of the access event writer
+    access_event_writer.configure(app)
+
+    # Optional in-process due date scheduler (SCHEDULER_INTERVAL_SECONDS)
+    due_date_scheduler.configure(app)
+
+    # Opt-in per-request SQL/timing instrumentation (INSTRUMENTATION_ENABLED)
+    instrumentation.init_app(app)
+
+    app.register_blueprint(bp)
+
+    # `flask init-db` creates the schema; `flask upgrade-db` adds new indexes to databases created by older versions
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(rebuild_progress_summary_command)
+    app.cli.add_command(rebuild_access_rollups_command)
+    app.cli.add_command(archive_command)
+    app.cli.add_command(run_scheduler_command)
+    app.cli.add_command(sync_replica_command) # Local testing with two SQLite files
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
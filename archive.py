@@ -0,0 +1,319 @@
+import glob
+import os
+import sqlite3
+import threading
+import zlib
+import click
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+
+from models import db, Course, Assessment, Question, Assignment, Progress, Answer, AnswerBody, Reminder, AccessEvent
+from answers import prune_answer_bodies
+from stats import adjust_counters, status_counter
+from summaries import refresh_trainee_summaries
+
+# --- Archival of old assignments, answers and access events ---
+# `flask archive` moves completed assignments (with their Progress row and answers) completed more
+# than ARCHIVE_AFTER_DAYS ago, and access events that old, out of the live database into one
+# SQLite file per month under ARCHIVE_DIR. Archive files are plain SQLite (whatever the live
+# database is), with the item title and question text copied in and text columns zlib-compressed.
+# Each batch is committed to its archive files before it is deleted from the live database, and
+# archive inserts replace rows with the same id, so an interrupted run can simply be repeated.
+# Dashboard counters and trainee summaries are adjusted as rows leave. Access rollups are kept, and
+# `flask rebuild-access-rollups` counts archived events from the archive files as well as the live
+# ones (archived_access_events), so reports cover archived periods either way. view_trainee_details
+# reads archived assignments back when asked to (?archived=1), opening only the archive files that
+# hold the trainee's assignments.
+
+ARCHIVE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS archived_assignment (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    item_type TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    title TEXT,
+    status TEXT NOT NULL,
+    assigned_date TEXT,
+    due_date TEXT,
+    completion_date TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_archived_assignment_user_id ON archived_assignment (user_id);
+CREATE TABLE IF NOT EXISTS archived_answer (
+    id INTEGER PRIMARY KEY,
+    assignment_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    question_text BLOB,
+    answer_text BLOB NOT NULL,
+    submitted_date TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_archived_answer_assignment_id ON archived_answer (assignment_id);
+CREATE TABLE IF NOT EXISTS archived_access_event (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    data_item TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    occurred_at TEXT NOT NULL,
+    received_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_archived_access_event_user_id ON archived_access_event (user_id, occurred_at);
+'''
+
+def compress(text):
+    return zlib.compress(text.encode('utf-8')) if text is not None else None
+
+def decompress(blob):
+    return zlib.decompress(blob).decode('utf-8') if blob is not None else None
+
+def to_text(value):
+    return value.isoformat() if value is not None else None
+
+def to_datetime(value):
+    return datetime.fromisoformat(value) if value is not None else None
+
+def partition_path(timestamp):
+    """The archive file holding rows of `timestamp`'s month."""
+    return os.path.join(current_app.config['ARCHIVE_DIR'], f'archive-{timestamp:%Y-%m}.sqlite3')
+
+def archive_partitions():
+    """Paths of all archive files, newest month first."""
+    return sorted(glob.glob(os.path.join(current_app.config['ARCHIVE_DIR'], 'archive-*.sqlite3')), reverse=True)
+
+def partition_month(path):
+    """The first day of the month an archive file holds."""
+    return datetime.strptime(os.path.basename(path)[len('archive-'):len('archive-YYYY-MM')], '%Y-%m')
+
+def open_partition(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.executescript(ARCHIVE_SCHEMA)
+    return connection
+
+def write_partitions(rows_by_path):
+    """Writes {path: {table: [row tuple, ...]}} and commits each archive file."""
+    for path, tables in rows_by_path.items():
+        connection = open_partition(path)
+        try:
+            with connection:
+                for table, rows in tables.items():
+                    if rows:
+                        placeholders = ', '.join('?' * len(rows[0]))
+                        connection.executemany(f'INSERT OR REPLACE INTO {table} VALUES ({placeholders})', rows)
+        finally:
+            connection.close()
+
+def archive_assignment_batch(before, after_id, limit):
+    """
+    Archives up to `limit` completed assignments with ids above `after_id` completed before `before`.
+    Returns (last assignment id, assignments archived, answers archived); last id is None when done.
+    """
+    completed_on = db.func.coalesce(Progress.completion_date, Assignment.assigned_date)
+    assignments = db.session.execute(
+        db.select(Assignment.id, Assignment.user_id, Assignment.course_id, Assignment.assessment_id,
+                  db.func.coalesce(Course.title, Assessment.title), Assignment.status,
+                  Assignment.assigned_date, Assignment.due_date, completed_on)
+        .outerjoin(Progress, Progress.assignment_id == Assignment.id)
+        .outerjoin(Course, Course.id == Assignment.course_id)
+        .outerjoin(Assessment, Assessment.id == Assignment.assessment_id)
+        .where(Assignment.status == 'completed', completed_on < before, Assignment.id > after_id)
+        .order_by(Assignment.id)
+        .limit(limit)
+    ).all()
+    if not assignments:
+        return None, 0, 0
+
+    rows_by_path = defaultdict(lambda: {'archived_assignment': [], 'archived_answer': []})
+    path_by_assignment = {}
+    for (assignment_id, user_id, course_id, assessment_id, title, status,
+         assigned_date, due_date, completion_date) in assignments:
+        path = partition_path(completion_date)
+        path_by_assignment[assignment_id] = path
+        rows_by_path[path]['archived_assignment'].append((
+            assignment_id, user_id, 'Course' if course_id else 'Assessment', course_id or assessment_id,
+            title, status, to_text(assigned_date), to_text(due_date), to_text(completion_date)
+        ))
+
+    assignment_ids = list(path_by_assignment)
+    answers = db.session.execute(
+        db.select(Answer.id, Answer.assignment_id, Answer.user_id, Answer.question_id,
+                  Question.question_text, AnswerBody.text, AnswerBody.compressed, Answer.submitted_date,
+                  Answer.body_id)
+        .join(AnswerBody, AnswerBody.id == Answer.body_id)
+        .outerjoin(Question, Question.id == Answer.question_id)
+        .where(Answer.assignment_id.in_(assignment_ids))
+    ).all()
+    for (answer_id, assignment_id, user_id, question_id, question_text, answer_text, compressed,
+         submitted_date, _) in answers:
+        # Compressed bodies are already in the archive's format
+        rows_by_path[path_by_assignment[assignment_id]]['archived_answer'].append((
+            answer_id, assignment_id, user_id, question_id,
+            compress(question_text), compressed if compressed is not None else compress(answer_text),
+            to_text(submitted_date)
+        ))
+    write_partitions(rows_by_path)
+
+    # Only now that the archive files are committed, remove the rows from the live database
+    db.session.execute(db.delete(Answer).where(Answer.assignment_id.in_(assignment_ids)))
+    prune_answer_bodies({row[-1] for row in answers})
+    db.session.execute(db.delete(Progress).where(Progress.assignment_id.in_(assignment_ids)))
+    db.session.execute(db.delete(Reminder).where(Reminder.assignment_id.in_(assignment_ids)))
+    db.session.execute(db.delete(Assignment).where(Assignment.id.in_(assignment_ids)))
+    adjust_counters({'assignments': -len(assignment_ids), status_counter('completed'): -len(assignment_ids)})
+    refresh_trainee_summaries(sorted({row[1] for row in assignments}))
+    db.session.commit()
+    return assignment_ids[-1], len(assignment_ids), len(answers)
+
+def archive_event_batch(before, limit):
+    """Archives up to `limit` of the oldest access events that occurred before `before`; returns how many."""
+    events = db.session.execute(
+        db.select(AccessEvent.id, AccessEvent.event_id, AccessEvent.user_id, AccessEvent.data_item,
+                  AccessEvent.purpose, AccessEvent.occurred_at, AccessEvent.received_at)
+        .where(AccessEvent.occurred_at < before)
+        .order_by(AccessEvent.id)
+        .limit(limit)
+    ).all()
+    if not events:
+        return 0
+    rows_by_path = defaultdict(lambda: {'archived_access_event': []})
+    for event_id, public_id, user_id, data_item, purpose, occurred_at, received_at in events:
+        rows_by_path[partition_path(occurred_at)]['archived_access_event'].append((
+            event_id, public_id, user_id, data_item, purpose, to_text(occurred_at), to_text(received_at)
+        ))
+    write_partitions(rows_by_path)
+
+    db.session.execute(db.delete(AccessEvent).where(AccessEvent.id.in_([row[0] for row in events])))
+    db.session.commit()
+    return len(events)
+
+def archive_before(before, batch_size=1000):
+    """Archives everything older than `before` in batches. Returns {kind: rows archived}."""
+    archived = {'assignments': 0, 'answers': 0, 'access_events': 0}
+    after_id = 0
+    while after_id is not None:
+        after_id, assignments, answers = archive_assignment_batch(before, after_id, batch_size)
+        archived['assignments'] += assignments
+        archived['answers'] += answers
+    while True:
+        events = archive_event_batch(before, batch_size)
+        if not events:
+            break
+        archived['access_events'] += events
+    return archived
+
+def archived_access_events(start=None, end=None, batch_size=100000):
+    """
+    Yields the archived access events that occurred in [start, end) as lists of up to `batch_size`
+    (occurred_at, user_id, data_item, purpose) tuples, reading only the archive files of the months
+    in range. None means unbounded.
+    """
+    clauses, params = [], []
+    if start is not None:
+        clauses.append('occurred_at >= ?')
+        params.append(to_text(start))
+    if end is not None:
+        clauses.append('occurred_at < ?')
+        params.append(to_text(end))
+    where = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+
+    for path in archive_partitions():
+        month = partition_month(path)
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        if (end is not None and month >= end) or (start is not None and next_month <= start):
+            continue
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            cursor = connection.execute(
+                f'SELECT occurred_at, user_id, data_item, purpose FROM archived_access_event{where}', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [(to_datetime(occurred_at), user_id, data_item, purpose)
+                       for occurred_at, user_id, data_item, purpose in rows]
+        finally:
+            connection.close()
+
+# {archive file path: (modification time, ids of the trainees with assignments in it)}, so the
+# archive files are scanned once per change rather than opened on every request
+_partition_trainees = {}
+_partition_trainees_lock = threading.Lock()
+
+def partitions_with_trainee(user_id):
+    """Paths of the archive files holding assignments of the trainee, newest month first."""
+    paths = []
+    for path in archive_partitions():
+        try:
+            modified = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        with _partition_trainees_lock:
+            cached = _partition_trainees.get(path)
+        if cached is None or cached[0] != modified:
+            connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            try:
+                trainees = frozenset(user for user, in connection.execute(
+                    'SELECT DISTINCT user_id FROM archived_assignment'))
+            finally:
+                connection.close()
+            cached = (modified, trainees)
+            with _partition_trainees_lock:
+                _partition_trainees[path] = cached
+        if user_id in cached[1]:
+            paths.append(path)
+    return paths
+
+def load_archived_assignments(user_id):
+    """
+    Reads a trainee's archived assignments back from the archive files holding them, newest month
+    first, as dicts shaped like the entries view_trainee_details builds (plus 'archived': True).
+    """
+    detailed_assignments = []
+    for path in partitions_with_trainee(user_id):
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            assignments = connection.execute(
+                'SELECT id, item_type, title, status, assigned_date, due_date FROM archived_assignment '
+                'WHERE user_id = ? ORDER BY id', (user_id,)
+            ).fetchall()
+            answers_by_assignment = defaultdict(list)
+            if assignments:
+                ids = [row[0] for row in assignments]
+                for assignment_id, question_text, answer_text, submitted_date in connection.execute(
+                        'SELECT assignment_id, question_text, answer_text, submitted_date FROM archived_answer '
+                        f'WHERE assignment_id IN ({", ".join("?" * len(ids))}) ORDER BY question_id', ids):
+                    answers_by_assignment[assignment_id].append({
+                        'question_text': decompress(question_text) or 'Deleted Question',
+                        'answer_text': decompress(answer_text),
+                        'submitted_date': to_datetime(submitted_date).strftime('%Y-%m-%d %H:%M') if submitted_date else 'N/A'
+                    })
+        finally:
+            connection.close()
+
+        for assignment_id, item_type, title, status, assigned_date, due_date in assignments:
+            detailed_assignments.append({
+                'assignment_id': assignment_id,
+                'item_type': item_type,
+                'title': title or f'Deleted {item_type}',
+                'status': status,
+                'assigned_date': to_datetime(assigned_date).strftime('%Y-%m-%d') if assigned_date else 'N/A',
+                'due_date': to_datetime(due_date).strftime('%Y-%m-%d') if due_date else 'N/A',
+                'questions_and_answers': answers_by_assignment.get(assignment_id, []),
+                'archived': True
+            })
+    return detailed_assignments
+
+@click.command('archive')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Archive rows older than this day (default: ARCHIVE_AFTER_DAYS ago).')
+@with_appcontext
+def archive_command(before):
+    """Move old completed assignments, their answers and old access events into archive files."""
+    if before is None:
+        before = datetime.utcnow() - timedelta(days=current_app.config['ARCHIVE_AFTER_DAYS'])
+    archived = archive_before(before, current_app.config['ARCHIVE_BATCH_SIZE'])
+    click.echo(f"Archived {archived['assignments']} assignments, {archived['answers']} answers and "
+               f"{archived['access_events']} access events from before {before:%Y-%m-%d} "
+               f"to {current_app.config['ARCHIVE_DIR']}.")
@@ -0,0 +1,194 @@
+import itertools
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models import db, User, Course, Assessment, Assignment
+from answers import upsert_statement
+from stats import adjust_counters, status_counter
+from summaries import refresh_trainee_summaries
+
+# --- Set-based bulk assignment ---
+# Assignments are created with INSERT ... SELECT over the trainee (and course) tables, so no
+# ORM objects are built, and a NOT EXISTS guard skips trainees who already hold the item.
+# Running the same assignment twice is therefore a no-op. Two runs at the same time can both pass
+# the guard; the partial unique indexes on (user_id, course_id) and (user_id, assessment_id) then
+# make the later insert skip the pair (ON CONFLICT DO NOTHING), or fail where that is unsupported.
+
+TRAINEE_BATCH_SIZE = 500 # Trainees per INSERT ... SELECT statement
+
+def item_selection(course_id=None, assessment_id=None, group_id=None):
+    """Returns (item model, Assignment foreign key, WHERE clauses on the item) for what is being assigned."""
+    if course_id:
+        return Course, Assignment.course_id, [Course.id == course_id]
+    if group_id:
+        return Course, Assignment.course_id, [Course.group_id == group_id]
+    if assessment_id:
+        return Assessment, Assignment.assessment_id, [Assessment.id == assessment_id]
+    raise ValueError('A course, course group or assessment is required.')
+
+def trainee_clauses(trainee_ids=None):
+    """WHERE clauses selecting the target trainees; None means every trainee."""
+    clauses = [User.role == 'trainee']
+    if trainee_ids is not None:
+        clauses.append(User.id.in_(trainee_ids))
+    return clauses
+
+def insert_assignments(user_clauses, item, due_date=None):
+    """
+    Runs one INSERT ... SELECT creating an assignment for every (trainee, item) pair matching
+    the clauses that does not exist yet. Returns the number of rows inserted. Does not commit.
+    """
+    item_model, foreign_key, item_clauses = item
+    already_assigned = db.select(Assignment.id).where(
+        Assignment.user_id == User.id, foreign_key == item_model.id
+    ).exists()
+    candidates = (db.select(User.id, item_model.id,
+                            db.literal(datetime.utcnow(), db.DateTime),
+                            db.literal(due_date, db.DateTime),
+                            db.literal('not_started'))
+                  .select_from(User)
+                  .join(item_model, db.true()) # Every selected trainee x every selected item
+                  .where(*user_clauses, *item_clauses, ~already_assigned))
+    columns = ['user_id', foreign_key.key, 'assigned_date', 'due_date', 'status']
+    stmt = upsert_statement(Assignment)
+    if stmt is not None:
+        stmt = stmt.from_select(columns, candidates).on_conflict_do_nothing()
+    else:
+        stmt = db.insert(Assignment).from_select(columns, candidates)
+    created = db.session.execute(stmt).rowcount
+    # INSERT ... SELECT bypasses the ORM flush hooks, so keep the dashboard counters in step here
+    adjust_counters({'assignments': created, status_counter('not_started'): created})
+    if created:
+        refresh_trainee_summaries(db.select(User.id).where(*user_clauses))
+    return created
+
+def trainee_batches(trainee_ids=None, batch_size=TRAINEE_BATCH_SIZE):
+    """
+    Yields lists of WHERE clauses, each covering at most batch_size trainees.
+    Explicit ID lists are chunked; "all trainees" is walked by keyset on User.id,
+    so the full ID list is never loaded into memory.
+    """
+    if trainee_ids is not None:
+        ids = iter(sorted(set(trainee_ids)))
+        while True:
+            chunk = list(itertools.islice(ids, batch_size))
+            if not chunk:
+                return
+            yield trainee_clauses(chunk)
+
+    last_id = 0
+    while True:
+        upper_id = db.session.execute(
+            db.select(User.id).where(User.role == 'trainee', User.id > last_id)
+            .order_by(User.id).offset(batch_size - 1).limit(1)
+        ).scalar()
+        clauses = trainee_clauses() + [User.id > last_id]
+        if upper_id is None:
+            yield clauses
+            return
+        yield clauses + [User.id <= upper_id]
+        last_id = upper_id
+
+def count_candidates(trainee_ids=None, course_id=None, assessment_id=None, group_id=None):
+    """Upper bound on the number of rows an assignment run could insert (trainees x items)."""
+    item_model, _, item_clauses = item_selection(course_id, assessment_id, group_id)
+    if trainee_ids is not None:
+        trainees = len(set(trainee_ids))
+    else:
+        trainees = User.query.filter(*trainee_clauses()).count()
+    items = db.session.execute(db.select(db.func.count(item_model.id)).where(*item_clauses)).scalar()
+    return trainees * items
+
+def create_assignments(trainee_ids=None, course_id=None, assessment_id=None, group_id=None,
+                       due_date=None, job=None):
+    """
+    Assigns a course, every course in a group, or an assessment to the given trainees
+    (or every trainee when trainee_ids is None), skipping existing assignments.
+    Commits after each batch of trainees and reports progress on `job` if given.
+    Returns the number of assignments created.
+    """
+    item = item_selection(course_id, assessment_id, group_id)
+    created = 0
+    for clauses in trainee_batches(trainee_ids):
+        created += insert_assignments(clauses, item, due_date)
+        db.session.commit()
+        if job:
+            job.advance(created)
+    return created
+
+# --- Background execution ---
+
+class AssignmentJob:
+    """Progress of a bulk assignment running on the background worker."""
+
+    def __init__(self, total_batches):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued' # 'queued', 'running', 'completed', 'failed'
+        self.total_batches = total_batches
+        self.batches_done = 0
+        self.created = 0
+        self.error = None
+
+    @property
+    def finished(self):
+        return self.status in ('completed', 'failed')
+
+    def advance(self, created):
+        self.batches_done += 1
+        self.created = created
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.batches_done / self.total_batches if self.total_batches else 1.0,
+            'created': self.created,
+            'error': self.error
+        }
+
+MAX_TRACKED_JOBS = 100 # Oldest finished jobs are forgotten beyond this; queued and running ones are kept
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bulk-assign')
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def get_job(job_id):
+    """Returns the AssignmentJob with this id, or None if unknown or expired."""
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def start_assignment_job(app, trainee_ids=None, **item):
+    """
+    Queues create_assignments() on the local background worker and returns its AssignmentJob at once.
+    Jobs are tracked in this process only, so poll them from the same worker that started them.
+    """
+    if trainee_ids is not None:
+        trainee_count = len(set(trainee_ids))
+    else:
+        trainee_count = User.query.filter(*trainee_clauses()).count()
+    job = AssignmentJob(total_batches=max(1, -(-trainee_count // TRAINEE_BATCH_SIZE)))
+
+    with _jobs_lock:
+        _jobs[job.id] = job
+        excess = len(_jobs) - MAX_TRACKED_JOBS
+        if excess > 0:
+            for finished_id in [tracked.id for tracked in _jobs.values() if tracked.finished][:excess]:
+                del _jobs[finished_id]
+
+    def run():
+        job.status = 'running'
+        with app.app_context():
+            try:
+                create_assignments(trainee_ids, job=job, **item)
+                job.status = 'completed'
+            except Exception as exc:
+                db.session.rollback()
+                job.status = 'failed'
+                job.error = str(exc)
+                app.logger.exception('Bulk assignment job %s failed', job.id)
+
+    _executor.submit(run)
+    return job
@@ -0,0 +1,119 @@
+"""
+Measures assessment submission throughput on a SQLite file under concurrent writers,
+once per engine profile (see database.py).
+
+Several worker processes, each running several threads (like gunicorn workers with
+threads), submit every answer of distinct assessment assignments through
+answers.submit_assessment. Submissions that fail with "database is locked" are
+counted, not retried.
+
+Usage:
+    python benchmarks/bench_concurrency.py [--workers 4] [--threads 4] [--submissions 200] [--questions 20]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--submissions', type=int, default=200, help='submissions per worker')
+    parser.add_argument('--questions', type=int, default=20, help='questions per assessment')
+    return parser.parse_args()
+
+def make_app(database_uri, profile):
+    from app import create_app
+    from config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_uri
+        DATABASE_PROFILE = profile
+        WTF_CSRF_ENABLED = False
+
+    return create_app(BenchConfig)
+
+def seed(app, assignments, questions):
+    """One assessment with its questions, and one open assignment of it per trainee."""
+    import models
+    from models import db
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(models.Assessment), [{'id': 1, 'title': 'Benchmark'}])
+        db.session.execute(db.insert(models.Question),
+                           [{'id': q, 'assessment_id': 1, 'question_text': f'Question {q}'}
+                            for q in range(1, questions + 1)])
+        db.session.execute(db.insert(models.User),
+                           [{'id': u, 'username': f'trainee{u}', 'email': f'trainee{u}@example.com'}
+                            for u in range(1, assignments + 1)])
+        db.session.execute(db.insert(models.Assignment),
+                           [{'id': u, 'user_id': u, 'assessment_id': 1} for u in range(1, assignments + 1)])
+        db.session.commit()
+
+def submit_range(app, assignment_ids, questions, results):
+    from sqlalchemy.exc import OperationalError
+    from answers import submit_assessment
+    from models import db, Assignment
+
+    answer_texts = {q: f'Answer to question {q}' for q in range(1, questions + 1)}
+    with app.app_context():
+        for assignment_id in assignment_ids:
+            try:
+                submit_assessment(db.session.get(Assignment, assignment_id), answer_texts)
+                results['ok'] += 1
+            except OperationalError:
+                db.session.rollback()
+                results['locked'] += 1
+
+def run_worker(database_uri, profile, assignment_ids, threads, questions, queue):
+    app = make_app(database_uri, profile)
+    results = {'ok': 0, 'locked': 0} # Updated under the GIL from each thread's own range
+    slices = [assignment_ids[i::threads] for i in range(threads)]
+    pool = [threading.Thread(target=submit_range, args=(app, part, questions, results)) for part in slices]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    queue.put(results)
+
+def run_profile(profile, args):
+    workdir = tempfile.mkdtemp(prefix='bench_concurrency_')
+    database_uri = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    total = args.workers * args.submissions
+    seed(make_app(database_uri, profile), total, args.questions)
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    ids = list(range(1, total + 1))
+    workers = [context.Process(target=run_worker,
+                               args=(database_uri, profile, ids[w::args.workers], args.threads, args.questions, queue))
+               for w in range(args.workers)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    ok = sum(r['ok'] for r in results)
+    locked = sum(r['locked'] for r in results)
+    print(f'{profile:<12}{ok:>10}{locked:>10}{elapsed:>10.2f}{ok / elapsed:>14.1f}')
+
+def main():
+    args = parse_args()
+    print(f'{args.workers} workers x {args.threads} threads, {args.workers * args.submissions} submissions '
+          f'of {args.questions} answers')
+    print(f'{"profile":<12}{"ok":>10}{"locked":>10}{"seconds":>10}{"submits/s":>14}')
+    for profile in ('basic', 'production'):
+        run_profile(profile, args)
+
+if __name__ == '__main__':
+    main()
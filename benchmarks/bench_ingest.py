@@ -0,0 +1,85 @@
+"""
+Measures access event ingestion throughput on a scratch SQLite database.
+
+Several client threads POST NDJSON batches to /api/access-events through the test
+client; each request returns only after its events are committed by the background
+writer. A fraction of the batches is sent twice to exercise duplicate suppression.
+
+Usage:
+    python benchmarks/bench_ingest.py [--clients 8] [--batches 50] [--batch-size 1000] [--resend 0.1]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent sender threads')
+    parser.add_argument('--batches', type=int, default=50, help='batches per client')
+    parser.add_argument('--batch-size', type=int, default=1000, help='events per batch')
+    parser.add_argument('--resend', type=float, default=0.1, help='fraction of batches sent twice')
+    return parser.parse_args()
+
+def make_batch(client, batch, size):
+    start = datetime(2026, 1, 1) + timedelta(minutes=batch)
+    return '\n'.join(json.dumps({
+        'event_id': f'{client}-{batch}-{n}',
+        'user_id': n % 500 + 1,
+        'data_item': f'dataset-{n % 40}',
+        'purpose': ('audit', 'support', 'reporting')[n % 3],
+        'occurred_at': (start + timedelta(seconds=n)).isoformat() + 'Z',
+    }) for n in range(size))
+
+def send(app, client, args, failures):
+    rng = random.Random(client)
+    http = app.test_client()
+    for batch in range(args.batches):
+        body = make_batch(client, batch, args.batch_size)
+        for _ in range(2 if rng.random() < args.resend else 1):
+            response = http.post('/api/access-events', data=body, content_type='application/x-ndjson',
+                                 headers={'Authorization': 'Bearer bench'})
+            if response.status_code != 200:
+                failures.append(response.status_code)
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='bench_ingest_')
+
+    from app import create_app
+    from config import Config
+    from models import db, AccessEvent
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+        ACCESS_EVENT_API_TOKEN = 'bench'
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+
+    failures = []
+    threads = [threading.Thread(target=send, args=(app, client, args, failures)) for client in range(args.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    expected = args.clients * args.batches * args.batch_size
+    with app.app_context():
+        stored = db.session.execute(db.select(db.func.count()).select_from(AccessEvent)).scalar()
+    print(f'{args.clients} clients x {args.batches} batches x {args.batch_size} events')
+    print(f'stored {stored} of {expected} distinct events in {elapsed:.2f} s '
+          f'({expected / elapsed:,.0f} events/s), {len(failures)} failed requests')
+
+if __name__ == '__main__':
+    main()
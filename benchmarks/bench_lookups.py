@@ -0,0 +1,94 @@
+"""
+Times the hot foreign-key lookups on a scratch SQLite database, first without the
+indexes declared in models.py (as in an app.db created by an older version) and
+then after running the same upgrade as `flask upgrade-db`.
+
+Usage:
+    python benchmarks/bench_lookups.py [--trainees 2000] [--questions 50] [--lookups 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trainees', type=int, default=2000)
+    parser.add_argument('--questions', type=int, default=50, help='questions per assessment')
+    parser.add_argument('--lookups', type=int, default=2000, help='lookups timed per query')
+    return parser.parse_args()
+
+def seed(db, models, trainees, questions):
+    """Bulk-inserts one assessment, its questions, and one assignment, progress row and full set of answers per trainee."""
+    from answers import answer_body_row
+    db.session.execute(db.insert(models.Assessment), [{'id': 1, 'title': 'Benchmark'}])
+    db.session.execute(db.insert(models.Question),
+                       [{'id': q, 'assessment_id': 1, 'question_text': f'Question {q}'} for q in range(1, questions + 1)])
+    db.session.execute(db.insert(models.User),
+                       [{'id': u, 'username': f'trainee{u}', 'email': f'trainee{u}@example.com'}
+                        for u in range(1, trainees + 1)])
+    db.session.execute(db.insert(models.Assignment),
+                       [{'id': u, 'user_id': u, 'assessment_id': 1, 'status': 'completed'} for u in range(1, trainees + 1)])
+    db.session.execute(db.insert(models.Progress),
+                       [{'assignment_id': u, 'status': 'completed'} for u in range(1, trainees + 1)])
+    db.session.execute(db.insert(models.AnswerBody), [{'id': 1, **answer_body_row('x')}])
+    for u in range(1, trainees + 1):
+        db.session.execute(db.insert(models.Answer),
+                           [{'question_id': q, 'user_id': u, 'assignment_id': u, 'body_id': 1}
+                            for q in range(1, questions + 1)])
+    db.session.commit()
+
+def time_lookups(db, models, trainees, questions, lookups):
+    """Returns {label: mean microseconds per lookup} for each hot lookup."""
+    rng = random.Random(42)
+    samples = [(rng.randint(1, trainees), rng.randint(1, questions)) for _ in range(lookups)]
+    statements = {
+        'Assignment by user_id': lambda u, q: db.select(models.Assignment).where(models.Assignment.user_id == u),
+        'Question by assessment_id': lambda u, q: db.select(models.Question.id).where(models.Question.assessment_id == 1),
+        'Progress by assignment_id': lambda u, q: db.select(models.Progress).where(models.Progress.assignment_id == u),
+        'Answer by triple': lambda u, q: db.select(models.Answer).where(models.Answer.question_id == q,
+                                                                        models.Answer.user_id == u,
+                                                                        models.Answer.assignment_id == u),
+    }
+    timings = {}
+    for label, build in statements.items():
+        start = time.perf_counter()
+        for u, q in samples:
+            db.session.execute(build(u, q)).all()
+        timings[label] = (time.perf_counter() - start) / lookups * 1e6
+    return timings
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='bench_lookups_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from app import create_app
+    import models
+    from models import db
+    from schema import upgrade_database
+
+    app = create_app()
+    with app.app_context():
+        # Recreate the pre-index schema an older app.db would have
+        db.create_all()
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(db.engine, checkfirst=True)
+        seed(db, models, args.trainees, args.questions)
+
+        before = time_lookups(db, models, args.trainees, args.questions, args.lookups)
+        upgrade_database()
+        after = time_lookups(db, models, args.trainees, args.questions, args.lookups)
+
+    print(f'{args.trainees} trainees x {args.questions} questions = {args.trainees * args.questions} answers')
+    print(f'{"lookup":<28}{"before (us)":>14}{"after (us)":>14}{"speedup":>10}')
+    for label in before:
+        print(f'{label:<28}{before[label]:>14.1f}{after[label]:>14.1f}{before[label] / after[label]:>9.1f}x')
+
+if __name__ == '__main__':
+    main()
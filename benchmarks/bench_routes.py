@@ -0,0 +1,297 @@
+"""
+Drives every route of the app through the Flask test client against a freshly seeded
+database (see seed_data.py) and reports, per route, p50/p95/p99 latency and the number of
+SQL statements per request. Results can be saved as a baseline and later runs compared
+against it; a route whose statement count grows, or whose p95 exceeds the baseline by more
+than --tolerance (and by more than --min-delta milliseconds), is reported as a regression and the script exits with status 1.
+A route answering with a status outside 2xx/3xx, or with other statuses than in the baseline,
+fails the run the same way, and no baseline is saved from a failing run.
+
+Requests are made as an anonymous visitor or as a seeded admin, support or trainee user
+(logged in by session, so only the login route itself pays for password hashing). base.html
+calls a `moment` template global that the app does not provide; a stand-in returning the
+current year is installed so pages can render. Instrumentation is enabled so /metrics answers,
+and the assignment job status route polls a job started before the run.
+
+Usage:
+    python benchmarks/bench_routes.py [--rows 20000] [--requests 30]
+    python benchmarks/bench_routes.py --save-baseline    # writes benchmarks/baseline.json
+    python benchmarks/bench_routes.py --baseline benchmarks/baseline.json [--tolerance 0.5]
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Untimed requests made first on every route, so template compilation and cache fills are not measured
+WARMUP_REQUESTS = 2
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='rows seeded before the run')
+    parser.add_argument('--requests', type=int, default=30, help='timed requests per route')
+    parser.add_argument('--only', help='run only routes whose name contains this text')
+    parser.add_argument('--baseline', help='compare against this baseline file')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='PATH',
+                        help=f'save the results as a baseline (default {DEFAULT_BASELINE})')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed p95 growth over the baseline (0.5 = +50%%)')
+    parser.add_argument('--min-delta', type=float, default=5.0, help='p95 growth in ms always allowed (timer noise)')
+    return parser.parse_args()
+
+class MomentStandIn:
+    def format(self, pattern):
+        return str(datetime.utcnow().year)
+
+class Route:
+    """One benchmarked request: `path(i)` and `data(i)` build the i-th request, made as `user`."""
+
+    def __init__(self, name, path, user=None, method='GET', data=None, headers=None):
+        self.name = name
+        self.path = path if callable(path) else (lambda i, path=path: path)
+        self.user = user
+        self.method = method
+        self.data = data
+        self.headers = headers or {}
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def load_fixture(db, models):
+    """Ids of the seeded rows the routes are exercised with."""
+    def ids(stmt):
+        return list(db.session.execute(stmt).scalars())
+
+    User, Assignment = models.User, models.Assignment
+    assessments = ids(db.select(models.Assessment.id).order_by(models.Assessment.id))
+    # The last assessment gets the benchmark's new questions; the others are answered
+    open_assessments = db.session.execute(
+        db.select(Assignment.id, Assignment.user_id, Assignment.assessment_id)
+        .where(Assignment.assessment_id.isnot(None), Assignment.assessment_id != assessments[-1],
+               Assignment.status != 'completed')
+        .order_by(Assignment.id).limit(500)
+    ).all()
+    questions = {}
+    for assessment_id, question_id in db.session.execute(db.select(models.Question.assessment_id, models.Question.id)):
+        questions.setdefault(assessment_id, []).append(question_id)
+    return {
+        'admin': ids(db.select(User.id).where(User.role == 'admin').limit(1))[0],
+        'support': ids(db.select(User.id).where(User.role == 'support').limit(1))[0],
+        'trainees': ids(db.select(User.id).where(User.role == 'trainee').order_by(User.id).limit(500)),
+        'open_assessments': open_assessments,
+        'questions': questions,
+        'courses': ids(db.select(models.Course.id).order_by(models.Course.id)),
+        'question_target': assessments[-1],
+        'group': db.session.execute(db.select(models.Course.group_id).limit(1)).scalar(),
+    }
+
+def build_routes(fixture):
+    f = fixture
+    trainee = f['open_assessments'][0][1]
+
+    def pick(items, i):
+        return items[i % len(items)]
+
+    def open_assessment(i):
+        return pick(f['open_assessments'], i)
+
+    def answers(i):
+        _, _, assessment_id = open_assessment(i)
+        return {f'q_{question_id}-answer_text': f'Benchmark answer {i} about data privacy and consent'
+                for question_id in f['questions'][assessment_id]}
+
+    def access_events(i):
+        return '\n'.join(json.dumps({'event_id': f'bench-{i}-{n}', 'user_id': pick(f['trainees'], n),
+                                     'data_item': f'dataset-{n % 20}', 'purpose': 'audit'}) for n in range(100))
+
+    return [
+        Route('index', '/'),
+        Route('register GET', '/register'),
+        Route('register POST', '/register', method='POST',
+              data=lambda i: {'username': f'benchuser{i:05d}', 'email': f'benchuser{i:05d}@example.com',
+                              'password': 'password', 'password2': 'password', 'role': 'trainee'}),
+        Route('login GET', '/login'),
+        Route('login POST', '/login', method='POST', data=lambda i: {'username': 'trainee000001', 'password': 'password'}),
+        Route('logout', '/logout', user=trainee),
+        Route('dashboard', '/dashboard', user=trainee),
+        Route('admin_dashboard', '/admin_dashboard', user=f['admin']),
+        Route('create_course GET', '/create_course', user=f['admin']),
+        Route('create_course POST', '/create_course', user=f['admin'], method='POST',
+              data=lambda i: {'title': f'Benchmark course {i}', 'description': 'Created by the benchmark', 'group_id': f['group']}),
+        Route('create_assessment GET', '/create_assessment', user=f['admin']),
+        Route('create_assessment POST', '/create_assessment', user=f['admin'], method='POST',
+              data=lambda i: {'title': f'Benchmark assessment {i}', 'description': 'Created by the benchmark'}),
+        Route('add_question GET', f"/assessment/{f['question_target']}/add_question", user=f['admin']),
+        Route('add_question POST', f"/assessment/{f['question_target']}/add_question", user=f['admin'], method='POST',
+              data=lambda i: {'question_text': f'Benchmark question {i}?', 'question_type': 'open_ended'}),
+        Route('assign_items GET', '/assign_items', user=f['admin']),
+        Route('assign_items POST', '/assign_items', user=f['admin'], method='POST',
+              data=lambda i: {'trainees': [pick(f['trainees'], i)], 'courses': pick(f['courses'], i), 'assessments': 0}),
+        Route('lookup users', '/api/lookup/users?q=trainee0001&role=trainee', user=f['admin']),
+        Route('lookup courses', '/api/lookup/courses?q=course 1', user=f['admin']),
+        Route('assignment_job_status', f"/assign_items/jobs/{f['job']}", user=f['admin']),
+        Route('trainee_assignments', '/trainee_assignments', user=trainee),
+        Route('save_answer_api', lambda i: f"/api/assignments/{open_assessment(i)[0]}/answers/{f['questions'][open_assessment(i)[2]][0]}",
+              user=lambda i: open_assessment(i)[1], method='PUT',
+              data=lambda i: json.dumps({'answer_text': f'Autosaved answer {i}'}), headers={'Content-Type': 'application/json'}),
+        Route('complete_assessment GET', lambda i: f'/complete_assessment/{open_assessment(0)[0]}', user=trainee),
+        Route('complete_assessment POST', lambda i: f'/complete_assessment/{open_assessment(i)[0]}',
+              user=lambda i: open_assessment(i)[1], method='POST', data=answers),
+        Route('view_all_trainee_progress', '/view_all_trainee_progress', user=f['support']),
+        Route('view_all_trainee_progress filtered', '/view_all_trainee_progress?item_type=assessment&overdue=y',
+              user=f['support']),
+        Route('view_trainee_details', lambda i: f"/view_trainee_details/{pick(f['trainees'], i)}", user=f['support']),
+        Route('search_questions', '/search_questions?search_query=privacy', user=f['admin']),
+        Route('search_answers', '/search_answers?search_query=consent', user=f['support']),
+        Route('export_progress', f"/export/progress?group_id={f['group']}", user=f['support']),
+        Route('export_answers', f'/export/answers?start_date={datetime.utcnow():%Y-%m-%d}', user=f['support']),
+        Route('metrics', '/metrics', user=f['admin']),
+        Route('access_events POST', '/api/access-events', method='POST', data=access_events,
+              headers={'Authorization': 'Bearer bench', 'Content-Type': 'application/x-ndjson'}),
+        Route('access_report', '/api/reports/access?data_item=dataset-1', user=f['support']),
+    ]
+
+def client_for(app, user_id):
+    client = app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return client
+
+def run_route(app, route, requests, counter):
+    latencies, queries, statuses = [], [], Counter()
+    # Like timeit, keep garbage collection pauses out of the timings
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(WARMUP_REQUESTS + requests):
+            user = route.user(i) if callable(route.user) else route.user
+            client = client_for(app, user)
+            data = route.data(i) if route.data else None
+            before = counter['queries']
+            started = time.perf_counter()
+            try:
+                response = client.open(route.path(i), method=route.method, data=data, headers=route.headers)
+                response.get_data()
+                response.close()
+                status = response.status_code
+            except Exception: # Counted as a failed request, should an error escape the app's handlers
+                status = 500
+            if i < WARMUP_REQUESTS:
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counter['queries'] - before)
+            statuses[status] += 1
+    finally:
+        gc.enable()
+    return {
+        'p50': round(percentile(latencies, 0.50), 2),
+        'p95': round(percentile(latencies, 0.95), 2),
+        'p99': round(percentile(latencies, 0.99), 2),
+        'queries': round(sum(queries) / len(queries), 1),
+        'statuses': sorted(statuses),
+    }
+
+def compare(results, baseline, tolerance, min_delta):
+    """
+    Returns {route name: reason} for routes that answered with an error status, or that
+    regressed against the baseline when one is given.
+    """
+    regressions = {}
+    for name, result in results.items():
+        failed = [status for status in result['statuses'] if not 200 <= status < 400]
+        before = baseline['routes'].get(name) if baseline else None
+        if failed:
+            regressions[name] = f"HTTP {','.join(str(status) for status in failed)}"
+        elif before is None:
+            continue
+        elif result['statuses'] != before['statuses']:
+            regressions[name] = f"statuses {before['statuses']} -> {result['statuses']}"
+        elif result['queries'] > before['queries']:
+            regressions[name] = f"queries {before['queries']} -> {result['queries']}"
+        elif result['p95'] > max(before['p95'] * (1 + tolerance), before['p95'] + min_delta):
+            regressions[name] = f"p95 {before['p95']} -> {result['p95']} ms"
+    return regressions
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='bench_routes_')
+
+    from sqlalchemy import event
+    from app import create_app
+    from config import Config
+    import models
+    from models import db
+    from seed_data import seed_database
+    from assignments import start_assignment_job
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+        WTF_CSRF_ENABLED = False
+        ACCESS_EVENT_API_TOKEN = 'bench'
+        ARCHIVE_DIR = os.path.join(workdir, 'archive')
+        INSTRUMENTATION_ENABLED = True
+        REQUEST_LOG_LEVEL = 'WARNING' # Keeps the per-request log lines out of the report
+
+    app = create_app(BenchConfig)
+    app.jinja_env.globals.setdefault('moment', MomentStandIn)
+
+    counter = Counter()
+    with app.app_context():
+        db.create_all()
+        seeded = seed_database(args.rows)
+        fixture = load_fixture(db, models)
+        job = start_assignment_job(app, fixture['trainees'][:1], course_id=fixture['courses'][0])
+        while not job.finished:
+            time.sleep(0.01)
+        fixture['job'] = job.id
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', lambda *_: counter.update(['queries']))
+
+    routes = [route for route in build_routes(fixture) if not args.only or args.only in route.name]
+    results = {route.name: run_route(app, route, args.requests, counter) for route in routes}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+
+    print(f'{sum(seeded.values())} rows seeded, {args.requests} requests per route')
+    if baseline and (baseline['rows'], baseline['requests']) != (args.rows, args.requests):
+        print(f"Note: the baseline was recorded with --rows {baseline['rows']} --requests {baseline['requests']}")
+    print(f'{"route":<36}{"status":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}')
+    for name, result in results.items():
+        statuses = ','.join(str(status) for status in result['statuses'])
+        line = (f"{name:<36}{statuses:>10}{result['p50']:>10.1f}{result['p95']:>10.1f}"
+                f"{result['p99']:>10.1f}{result['queries']:>9.1f}")
+        if baseline and name in baseline['routes']:
+            line += f"   (baseline p95 {baseline['routes'][name]['p95']:.1f}, queries {baseline['routes'][name]['queries']:.1f})"
+        if name in regressions:
+            line += f'   REGRESSION: {regressions[name]}'
+        print(line)
+
+    if args.save_baseline and regressions:
+        print(f'Not saving a baseline: {len(regressions)} routes failed or regressed')
+    elif args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'rows': args.rows, 'requests': args.requests, 'routes': results}, f, indent=2)
+            f.write('\n')
+        print(f'Saved baseline to {args.save_baseline}')
+    if regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Times a due date scheduler run (scheduler.py) over a large number of open assignments and checks
+its result: every open assignment past its due date must end overdue with one 'overdue' reminder,
+the ones due within the lead time must have one 'due_soon' reminder, and the dashboard counters
+and trainee summaries must match the rows. A second run must find nothing left to do.
+
+--assignments open assessment assignments are spread over --trainees trainees; --overdue of them
+are past their due date and --due-soon due within REMINDER_LEAD_HOURS, the rest later. Runs on a
+scratch SQLite database; exits with status 1 on any violation.
+
+Usage:
+    python benchmarks/bench_scheduler.py [--assignments 1000000] [--trainees 50000]
+                                         [--overdue 0.3] [--due-soon 0.05] [--batch-size 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--assignments', type=int, default=1000000, help='open assignments seeded')
+    parser.add_argument('--trainees', type=int, default=50000, help='trainees they are spread over')
+    parser.add_argument('--overdue', type=float, default=0.3, help='fraction past their due date')
+    parser.add_argument('--due-soon', type=float, default=0.05, help='fraction due within the reminder lead time')
+    parser.add_argument('--batch-size', type=int, default=10000, help='SCHEDULER_BATCH_SIZE for the run')
+    parser.add_argument('--seed', type=int, default=42, help='random seed, for reproducible data')
+    return parser.parse_args()
+
+def seed_assignments(db, models, args, lead):
+    """Inserts the trainees, one assessment per trainee slot and the open assignments."""
+    from seed_data import BatchInserter
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    per_trainee = -(-args.assignments // args.trainees)
+    inserter = BatchInserter(db)
+    for user_id in range(1, args.trainees + 1):
+        inserter.add(models.User, {'id': user_id, 'username': f'trainee{user_id:06d}', 'email': f'trainee{user_id:06d}@example.com',
+                                   'password_hash': 'x', 'role': 'trainee'})
+    for assessment_id in range(1, per_trainee + 1):
+        inserter.add(models.Assessment, {'id': assessment_id, 'title': f'Assessment {assessment_id}'})
+    inserter.flush()
+
+    for assignment_id in range(1, args.assignments + 1):
+        draw = rng.random()
+        if draw < args.overdue:
+            due_date = now - timedelta(days=rng.uniform(0.01, 90))
+        elif draw < args.overdue + args.due_soon:
+            due_date = now + lead * rng.uniform(0.01, 0.99)
+        else:
+            due_date = now + lead + timedelta(days=rng.uniform(1, 90))
+        inserter.add(models.Assignment, {'id': assignment_id, 'user_id': (assignment_id - 1) % args.trainees + 1,
+                                         'assessment_id': (assignment_id - 1) // args.trainees + 1,
+                                         'assigned_date': now - timedelta(days=100), 'due_date': due_date,
+                                         'status': rng.choice(('not_started', 'in_progress'))})
+    inserter.flush()
+    db.session.commit()
+    return now
+
+def check(db, models, now, lead):
+    """Returns a list of violations found in the database after the run."""
+    from stats import dashboard_statistics, rebuild_statistics
+    Assignment, Reminder = models.Assignment, models.Reminder
+    violations = []
+
+    def count(model, *clauses):
+        return db.session.execute(db.select(db.func.count()).select_from(model).where(*clauses)).scalar()
+
+    still_open = count(Assignment, Assignment.status.in_(('not_started', 'in_progress')), Assignment.due_date < now)
+    if still_open:
+        violations.append(f'{still_open} open assignments are past their due date')
+    overdue = count(Assignment, Assignment.status == 'overdue')
+    overdue_reminders = count(Reminder, Reminder.kind == 'overdue')
+    if overdue_reminders != overdue:
+        violations.append(f'{overdue_reminders} overdue reminders for {overdue} overdue assignments')
+    due_soon = count(Assignment, Assignment.status != 'overdue', Assignment.due_date >= now, Assignment.due_date < now + lead)
+    due_soon_reminders = count(Reminder, Reminder.kind == 'due_soon')
+    if due_soon_reminders != due_soon:
+        violations.append(f'{due_soon_reminders} due soon reminders for {due_soon} assignments due soon')
+
+    counters = dashboard_statistics()
+    for name, value in rebuild_statistics().items():
+        if counters.get(name) != value:
+            violations.append(f'{name} counter is {counters.get(name)}, the rows say {value}')
+    db.session.rollback()
+
+    Summary = models.TraineeProgressSummary
+    actual = db.select(Assignment.user_id, db.func.count().label('overdue')).where(
+        Assignment.status == 'overdue').group_by(Assignment.user_id).subquery()
+    drifted = db.session.execute(
+        db.select(db.func.count()).select_from(Summary).join(actual, actual.c.user_id == Summary.user_id)
+        .where(Summary.overdue != actual.c.overdue)).scalar()
+    if drifted:
+        violations.append(f'{drifted} trainee summaries disagree with their assignments')
+    return violations, overdue
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='bench_scheduler_')
+
+    from app import create_app
+    from config import Config
+    import models
+    from models import db
+    from scheduler import run_due_dates
+    from stats import rebuild_statistics
+    from summaries import rebuild_trainee_summaries
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'scheduler.db')
+
+    app = create_app(BenchConfig)
+    app.logger.disabled = True
+    lead = timedelta(hours=app.config['REMINDER_LEAD_HOURS'])
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        now = seed_assignments(db, models, args, lead)
+        rebuild_statistics()
+        rebuild_trainee_summaries()
+        db.session.commit()
+        print(f'Seeded {args.assignments} open assignments for {args.trainees} trainees '
+              f'in {time.perf_counter() - started:.1f} s')
+
+        run = run_due_dates(args.batch_size, lead, now=now)
+        print(f'Run 1: {run.marked_overdue} marked overdue, {run.reminders_queued} reminders queued, '
+              f'{run.batches} batches in {run.duration:.2f} s')
+        rerun = run_due_dates(args.batch_size, lead, now=now)
+        print(f'Run 2: {rerun.marked_overdue} marked overdue, {rerun.reminders_queued} reminders queued, '
+              f'{rerun.batches} batches in {rerun.duration:.2f} s')
+
+        violations, overdue = check(db, models, now, lead)
+        if rerun.marked_overdue or rerun.reminders_queued:
+            violations.append('the second run still found work to do')
+    for violation in violations:
+        print(f'VIOLATION: {violation}')
+    if violations:
+        sys.exit(1)
+    print(f'OK: {overdue} overdue assignments, each with one reminder; counters and summaries match')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Measures worker start-up cost for the application factory.
+
+cold:      a fresh interpreter imports the app, calls create_app() and serves its first request
+           (a worker started without --preload).
+preforked: the parent imports the app and calls create_app() once, then forks workers that
+           only serve their first request (gunicorn --preload).
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COLD_START = (
+    'import time; started = time.perf_counter()\n'
+    'from app import create_app\n'
+    'app = create_app()\n'
+    'app.test_client().get("/dashboard")\n'
+    'print(time.perf_counter() - started)\n'
+)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    return parser.parse_args()
+
+def cold_start_seconds(env):
+    output = subprocess.run([sys.executable, '-c', COLD_START], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def preforked_start_seconds(app):
+    """Forks a child that serves one request; returns the child's time to first response."""
+    read_end, write_end = os.pipe()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        app.test_client().get('/dashboard')
+        os.write(write_end, str(time.perf_counter() - started).encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        elapsed = float(pipe.read())
+    os.waitpid(pid, 0)
+    return elapsed
+
+def report(label, samples):
+    print(f'{label:<10} median {statistics.median(samples) * 1000:8.1f} ms   '
+          f'min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms')
+
+def main():
+    args = parse_args()
+    env = dict(os.environ)
+    env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench_startup_'), 'bench.db')
+    os.environ['DATABASE_URL'] = env['DATABASE_URL']
+
+    cold = [cold_start_seconds(env) for _ in range(args.runs)]
+
+    from app import create_app
+    app = create_app()
+    preforked = [preforked_start_seconds(app) for _ in range(args.runs)]
+
+    report('cold', cold)
+    report('preforked', preforked)
+
+if __name__ == '__main__':
+    main()
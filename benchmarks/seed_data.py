@@ -0,0 +1,198 @@
+"""
+Fills an empty database with realistic synthetic data: staff and trainees, grouped courses,
+assessments with open-ended questions, and per-trainee assignments with Progress rows and
+answers in a mix of states. The total row count is configurable (roughly 1k to 10M);
+rows are generated lazily and bulk-inserted in batches, so memory stays flat.
+
+Every seeded user has the password 'password'. Usernames are admin0001, support0001,
+trainee000001, ...
+
+Usage:
+    DATABASE_URL=sqlite:////tmp/load.db python benchmarks/seed_data.py [--rows 100000] [--seed 42]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'password'
+INSERT_BATCH_SIZE = 10000
+
+# Rough rows generated per trainee (assignments, Progress rows and answers included); sizes the run
+ROWS_PER_TRAINEE = 40
+
+# Share of answers that are one of a few long pasted paragraphs rather than a sentence of their own
+BOILERPLATE_SHARE = 0.1
+BOILERPLATE_COUNT = 20
+
+WORDS = (
+    'access data privacy policy record audit consent retention breach incident report secure '
+    'password encryption backup classification owner request approval review risk control '
+    'compliance training phishing device network vendor contract customer employee health '
+    'financial export deletion logging monitoring purpose minimization storage transfer'
+).split()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='approximate total rows to generate')
+    parser.add_argument('--seed', type=int, default=42, help='random seed, for reproducible data')
+    return parser.parse_args()
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+class BatchInserter:
+    """Collects row dicts per model and bulk-inserts them INSERT_BATCH_SIZE at a time."""
+
+    def __init__(self, db):
+        self.db = db
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, model, row):
+        rows = self.pending.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= INSERT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        # Models are inserted in the order they were first added (parents first),
+        # so foreign keys always point at existing rows
+        for model, rows in self.pending.items():
+            if rows:
+                self.db.session.execute(self.db.insert(model), rows)
+                self.counts[model.__tablename__] = self.counts.get(model.__tablename__, 0) + len(rows)
+                rows.clear()
+
+def seed_database(rows=100000, seed=42):
+    """
+    Generates about `rows` rows into the current app's (empty) database and commits them.
+    Returns {table name: rows inserted}. Must run inside an app context.
+    """
+    import models
+    from models import db
+    from passwords import password_hashing
+    from answers import answer_body_row, compress_min_bytes
+    from stats import rebuild_statistics
+    from summaries import rebuild_trainee_summaries
+
+    if db.session.execute(db.select(db.func.count()).select_from(models.User)).scalar():
+        raise RuntimeError('The database already has users; seed an empty database.')
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = password_hashing.hash(PASSWORD) # One real hash, shared by every seeded user
+    trainees = max(10, rows // ROWS_PER_TRAINEE)
+    inserter = BatchInserter(db)
+
+    # Staff and trainees
+    user_id = 0
+    staff = [('admin', max(1, trainees // 200)), ('support', max(1, trainees // 100))]
+    for role, count in staff:
+        for n in range(1, count + 1):
+            user_id += 1
+            inserter.add(models.User, {'id': user_id, 'username': f'{role}{n:04d}', 'email': f'{role}{n:04d}@example.com',
+                                       'password_hash': password_hash, 'role': role})
+    trainee_ids = list(range(user_id + 1, user_id + trainees + 1))
+    for n, trainee_id in enumerate(trainee_ids, 1):
+        inserter.add(models.User, {'id': trainee_id, 'username': f'trainee{n:06d}', 'email': f'trainee{n:06d}@example.com',
+                                   'password_hash': password_hash, 'role': 'trainee'})
+    inserter.flush()
+
+    # Courses in groups, and assessments with their questions
+    course_count = max(5, trainees // 50)
+    groups = [f'{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()} {n}' for n in range(max(1, course_count // 5))]
+    for course_id in range(1, course_count + 1):
+        inserter.add(models.Course, {'id': course_id, 'title': f'Course {course_id}: {sentence(rng, 3)}',
+                                     'description': sentence(rng, 12), 'group_id': rng.choice(groups)})
+    inserter.flush()
+
+    assessment_count = max(5, trainees // 50)
+    questions_by_assessment = {}
+    question_id = 0
+    for assessment_id in range(1, assessment_count + 1):
+        inserter.add(models.Assessment, {'id': assessment_id, 'title': f'Assessment {assessment_id}: {sentence(rng, 3)}',
+                                         'description': sentence(rng, 12)})
+        question_ids = []
+        for _ in range(rng.randint(5, 15)):
+            question_id += 1
+            question_ids.append(question_id)
+            inserter.add(models.Question, {'id': question_id, 'assessment_id': assessment_id,
+                                           'question_text': sentence(rng, 10)[:-1] + '?', 'question_type': 'open_ended'})
+        questions_by_assessment[assessment_id] = question_ids
+    inserter.flush()
+
+    # Answer texts are stored once per distinct text, as the app does (see answers.py)
+    boilerplate = [' '.join(sentence(rng, rng.randint(10, 20)) for _ in range(rng.randint(10, 40)))
+                   for _ in range(BOILERPLATE_COUNT)]
+    body_ids = {}
+    threshold = compress_min_bytes()
+
+    def body_id(text):
+        row = answer_body_row(text, threshold)
+        if row['digest'] not in body_ids:
+            body_ids[row['digest']] = len(body_ids) + 1
+            inserter.add(models.AnswerBody, {'id': body_ids[row['digest']], **row})
+        return body_ids[row['digest']]
+
+    # Each trainee's assignments, half courses and half assessments, in a mix of states
+    assignment_id = 0
+    answer_id = 0
+    for trainee_id in trainee_ids:
+        count = rng.randint(4, 12)
+        items = ([('course_id', course_id) for course_id in rng.sample(range(1, course_count + 1), min(count // 2, course_count))] +
+                 [('assessment_id', assessment_id) for assessment_id in rng.sample(range(1, assessment_count + 1), min(count - count // 2, assessment_count))])
+        for column, item_id in items:
+            assignment_id += 1
+            assigned_date = now - timedelta(days=rng.uniform(1, 180))
+            due_date = assigned_date + timedelta(days=rng.randint(7, 90)) if rng.random() < 0.7 else None
+            status = rng.choices(('not_started', 'in_progress', 'completed'), weights=(25, 25, 50))[0]
+            progress_status = status
+            if status != 'completed' and due_date is not None and due_date < now:
+                status = 'overdue' # As the scheduler would have marked it
+            inserter.add(models.Assignment, {'id': assignment_id, 'user_id': trainee_id,
+                                             'course_id': None, 'assessment_id': None, column: item_id,
+                                             'assigned_date': assigned_date, 'due_date': due_date, 'status': status})
+            if progress_status == 'not_started':
+                continue
+            completion_date = min(now, assigned_date + timedelta(days=rng.uniform(0, 60))) if status == 'completed' else None
+            inserter.add(models.Progress, {'assignment_id': assignment_id, 'status': progress_status,
+                                           'completion_date': completion_date, 'last_updated': completion_date or now})
+            if column == 'assessment_id':
+                question_ids = questions_by_assessment[item_id]
+                answered = question_ids if status == 'completed' else question_ids[:rng.randint(0, len(question_ids))]
+                for question in answered:
+                    answer_id += 1
+                    text = rng.choice(boilerplate) if rng.random() < BOILERPLATE_SHARE else sentence(rng, rng.randint(5, 40))
+                    inserter.add(models.Answer, {'id': answer_id, 'question_id': question, 'user_id': trainee_id,
+                                                 'assignment_id': assignment_id, 'body_id': body_id(text),
+                                                 'submitted_date': completion_date or now})
+    inserter.flush()
+
+    # The dashboard counters and per-trainee summaries are derived from what was just inserted
+    rebuild_statistics()
+    rebuild_trainee_summaries()
+    db.session.commit()
+    return inserter.counts
+
+def main():
+    args = parse_args()
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        counts = seed_database(args.rows, args.seed)
+        elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f'{table:<12}{count:>12}')
+    print(f'{"total":<12}{sum(counts.values()):>12}  in {elapsed:.1f} s')
+
+if __name__ == '__main__':
+    main()
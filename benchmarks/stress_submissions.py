@@ -0,0 +1,180 @@
+"""
+Hammers complete_assessment with concurrent submissions of the same assessments and checks that
+nothing is duplicated or mixed: every assignment must end completed with exactly one Progress row
+and one Answer per question, every answer must be the text of the submission that won, and the
+dashboard counters and trainee summaries must match the rows.
+
+For each of --assignments open assessment assignments, --threads threads wait on a barrier and
+then submit at once. Half of them send one shared idempotency key (a double-click or a retried
+request), the others keys of their own (the same assessment open in other tabs). All of them post
+the version the page was rendered from. Answers are posted with the submit, as the page does
+without JavaScript, which is the most writes per request. Once all are done, a stale tab (the
+same page version, a new key) submits again and must be refused.
+Runs on a scratch SQLite database seeded by seed_data.py; exits with status 1 on any violation.
+
+Usage:
+    python benchmarks/stress_submissions.py [--assignments 50] [--threads 8] [--rows 5000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--assignments', type=int, default=50, help='assessments submitted concurrently')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent submissions per assessment')
+    parser.add_argument('--rows', type=int, default=5000, help='rows seeded before the run')
+    return parser.parse_args()
+
+outcomes_lock = threading.Lock()
+
+def record(outcomes, outcome):
+    with outcomes_lock:
+        outcomes[outcome] += 1
+
+def submit(app, assignment_id, user_id, question_ids, version, key, barrier, outcomes):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    data = {f'q_{question_id}-answer_text': f'Answer from {key}' for question_id in question_ids}
+    data['submission_key'] = key
+    data['version'] = version
+    if barrier:
+        barrier.wait()
+    try:
+        response = client.post(f'/complete_assessment/{assignment_id}', data=data)
+    except Exception as e:
+        record(outcomes, f'error: {type(e).__name__}')
+        return
+    with client.session_transaction() as session:
+        categories = [category for category, _ in session.get('_flashes', [])]
+    location = response.headers.get('Location', '')
+    if response.status_code == 302 and location.endswith('/trainee_assignments'):
+        record(outcomes, 'submitted' if 'success' in categories else 'refused (already submitted)')
+    elif response.status_code == 200 and 'warning' in categories:
+        record(outcomes, 'conflict (asked to review)') # The page is shown again with the posted answers
+    else:
+        record(outcomes, f'error: HTTP {response.status_code}')
+
+def check(db, models, targets):
+    """Returns a list of violations found in the database after the run."""
+    from answers import answer_text_column
+
+    Assignment, Progress, Answer = models.Assignment, models.Progress, models.Answer
+    violations = []
+    ids = [assignment_id for assignment_id, _, _, _ in targets]
+    progress_rows = Counter(db.session.execute(
+        db.select(Progress.assignment_id).where(Progress.assignment_id.in_(ids))).scalars())
+    answer_rows = Counter(db.session.execute(
+        db.select(Answer.assignment_id).where(Answer.assignment_id.in_(ids))).scalars())
+    statuses = dict(db.session.execute(db.select(Assignment.id, Assignment.status).where(Assignment.id.in_(ids))).all())
+    winners = dict(db.session.execute(
+        db.select(Assignment.id, Assignment.submission_key).where(Assignment.id.in_(ids))).all())
+    answer_texts = {}
+    for assignment_id, text in db.session.execute(
+            db.select(Answer.assignment_id, answer_text_column()).join(models.AnswerBody, Answer.body_id == models.AnswerBody.id)
+            .where(Answer.assignment_id.in_(ids))):
+        answer_texts.setdefault(assignment_id, set()).add(text)
+    for assignment_id, _, question_ids, _ in targets:
+        if statuses[assignment_id] != 'completed':
+            violations.append(f'assignment {assignment_id} is {statuses[assignment_id]}')
+        winner = winners[assignment_id] or ''
+        if winner.startswith('stale-'):
+            violations.append(f'assignment {assignment_id} was resubmitted from a stale tab')
+        if answer_texts.get(assignment_id, set()) - {f'Answer from {winner}'}:
+            violations.append(f'assignment {assignment_id} has answers not sent by its submission {winner!r}')
+        if progress_rows[assignment_id] != 1:
+            violations.append(f'assignment {assignment_id} has {progress_rows[assignment_id]} Progress rows')
+        if answer_rows[assignment_id] != len(question_ids):
+            violations.append(f'assignment {assignment_id} has {answer_rows[assignment_id]} answers '
+                              f'for {len(question_ids)} questions')
+
+    completed = db.session.execute(
+        db.select(db.func.count()).select_from(Assignment).where(Assignment.status == 'completed')).scalar()
+    counter = db.session.execute(
+        db.select(models.Statistic.value).where(models.Statistic.name == 'assignments_completed')).scalar()
+    if counter != completed:
+        violations.append(f'assignments_completed counter is {counter}, {completed} rows are completed')
+
+    Summary = models.TraineeProgressSummary
+    actual = db.select(Assignment.user_id, db.func.count().label('completed')).where(
+        Assignment.status == 'completed').group_by(Assignment.user_id).subquery()
+    drifted = db.session.execute(
+        db.select(db.func.count()).select_from(Summary).join(actual, actual.c.user_id == Summary.user_id)
+        .where(Summary.completed != actual.c.completed)).scalar()
+    if drifted:
+        violations.append(f'{drifted} trainee summaries disagree with their assignments')
+    return violations
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='stress_submissions_')
+
+    from app import create_app
+    from config import Config
+    import models
+    from models import db
+    from seed_data import seed_database
+    from bench_routes import MomentStandIn
+
+    class StressConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'stress.db')
+        WTF_CSRF_ENABLED = False
+
+    app = create_app(StressConfig)
+    app.jinja_env.globals.setdefault('moment', MomentStandIn) # See bench_routes.py
+    with app.app_context():
+        db.create_all()
+        seed_database(args.rows)
+        open_assignments = db.session.execute(
+            db.select(models.Assignment.id, models.Assignment.user_id, models.Assignment.assessment_id, models.Assignment.version)
+            .where(models.Assignment.assessment_id.isnot(None), models.Assignment.status != 'completed')
+            .order_by(models.Assignment.id).limit(args.assignments)
+        ).all()
+        targets = [(assignment_id, user_id, db.session.execute(
+            db.select(models.Question.id).where(models.Question.assessment_id == assessment_id)).scalars().all(), version)
+            for assignment_id, user_id, assessment_id, version in open_assignments]
+
+    outcomes, stale_outcomes = Counter(), Counter()
+    started = time.perf_counter()
+    for assignment_id, user_id, question_ids, version in targets:
+        barrier = threading.Barrier(args.threads)
+        keys = [f'shared-{assignment_id}' if n % 2 == 0 else f'tab-{assignment_id}-{n}' for n in range(args.threads)]
+        threads = [threading.Thread(target=submit, args=(app, assignment_id, user_id, question_ids, version, key, barrier, outcomes))
+                   for key in keys]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    for assignment_id, user_id, question_ids, version in targets:
+        submit(app, assignment_id, user_id, question_ids, version, f'stale-{assignment_id}', None, stale_outcomes)
+
+    with app.app_context():
+        violations = check(db, models, targets)
+
+    print(f'{len(targets)} assessments x {args.threads} concurrent submissions '
+          f'({len(targets) * args.threads} requests) in {elapsed:.2f} s')
+    for outcome, count in sorted(outcomes.items()):
+        print(f'  {outcome:<28}{count:>8}')
+    print(f'then {len(targets)} submissions from stale tabs:')
+    for outcome, count in sorted(stale_outcomes.items()):
+        print(f'  {outcome:<28}{count:>8}')
+    if stale_outcomes['submitted']:
+        violations.append(f'{stale_outcomes["submitted"]} stale-tab submissions were accepted')
+    for violation in violations:
+        print(f'VIOLATION: {violation}')
+    errors = sum(count for outcome, count in (outcomes + stale_outcomes).items() if outcome.startswith('error'))
+    if violations or errors:
+        sys.exit(1)
+    print('OK: one Progress row and one answer per question, all from the winning submission, for every assessment')
+
+if __name__ == '__main__':
+    main()
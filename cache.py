@@ -0,0 +1,196 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, get_flashed_messages, make_response, request, session
+from flask_login import current_user
+from markupsafe import Markup
+
+from models import db, Assessment, Assignment, TraineeProgressSummary
+
+try:
+    import redis
+except ImportError: # Only needed for CACHE_BACKEND = 'redis'
+    redis = None
+
+# --- Response and template fragment caching ---
+# What a trainee's pages show changes only when one of their assignments, Progress rows or answers
+# is written, and each such write refreshes their TraineeProgressSummary row (see summaries.py).
+# Its refreshed_at column is therefore the modification stamp of everything about that trainee:
+#   - @cached_view pages derive an ETag from the viewer, the URL and that stamp (for
+#     view_trainee_details, also when the questions of the trainee's assessments changed). A matching
+#     If-None-Match is answered with 304 before the view runs; otherwise the rendered body is
+#     reused from the cache when present, and sent with ETag/Last-Modified.
+#   - {% call cache_fragment(name, key, stamp) %} caches a piece of a template and re-renders it
+#     when the stamp differs. view_trainee_details caches each completed assessment's answers this
+#     way, keyed by trainee, assignment and assigned date and stamped with the assignment's version
+#     and Assessment.questions_changed_at, so they are loaded again only when resubmitted or when
+#     the assessment's questions change.
+# The backend is an in-process LRU by default, or any Redis-compatible server (CACHE_REDIS_URL),
+# which lets all worker processes share entries.
+
+class LRUBackend:
+    """A thread-safe in-process LRU of {key: value} whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=2048, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisBackend:
+    """Stores pickled values on a Redis-compatible server, expiring them after `ttl` seconds."""
+
+    def __init__(self, url, ttl=300, prefix='dat:'):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND = 'redis' requires the redis package.")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def delete_many(self, keys):
+        keys = [self.prefix + key for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+class Cache:
+    """The configured backend shared by the response and fragment caches."""
+
+    def __init__(self):
+        self.backend = LRUBackend()
+        self.enabled = True
+        self.version = '1'
+
+    def configure(self, app):
+        """Applies the CACHE_* settings from the app config and starts empty."""
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+        self.version = app.config.get('CACHE_VERSION', '1')
+        ttl = app.config.get('CACHE_TTL', 300)
+        if app.config.get('CACHE_BACKEND', 'memory') == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'], ttl=ttl)
+        else:
+            self.backend = LRUBackend(app.config.get('CACHE_SIZE', 2048), ttl=ttl)
+            self.backend.clear()
+
+    def get(self, key):
+        return self.backend.get(key) if self.enabled else None
+
+    def set(self, key, value):
+        if self.enabled:
+            self.backend.set(key, value)
+
+    def delete_many(self, keys):
+        self.backend.delete_many(keys)
+
+cache = Cache()
+
+def trainee_stamp(user_id):
+    """When anything shown about the trainee last changed (None if they have no assignments)."""
+    return db.session.execute(
+        db.select(TraineeProgressSummary.refreshed_at).where(TraineeProgressSummary.user_id == user_id)
+    ).scalar()
+
+def trainee_details_stamp(user_id):
+    """trainee_stamp(), or when a question of one of the trainee's assessments last changed if later. One query."""
+    refreshed_at = db.select(TraineeProgressSummary.refreshed_at).where(
+        TraineeProgressSummary.user_id == user_id).scalar_subquery()
+    questions_changed_at = db.select(db.func.max(Assessment.questions_changed_at)).join(
+        Assignment, Assignment.assessment_id == Assessment.id).where(Assignment.user_id == user_id).scalar_subquery()
+    stamps = db.session.execute(db.select(refreshed_at, questions_changed_at)).one()
+    return max((stamp for stamp in stamps if stamp is not None), default=None)
+
+def make_etag(*parts):
+    return hashlib.sha1(repr((cache.version,) + parts).encode()).hexdigest()
+
+def cached_view(stamp):
+    """
+    Makes a GET view conditional and caches its rendered body. `stamp(**view_args)` returns the
+    modification time of what the page shows; place this under the access control decorators.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Pages carrying pending flash messages are always rendered afresh
+            if request.method != 'GET' or '_flashes' in session:
+                return f(*args, **kwargs)
+            modified = stamp(**kwargs)
+            etag = make_etag(request.full_path, current_user.id, current_user.role, modified)
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                body = cache.get(f'response:{etag}')
+                if body is None:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200 or get_flashed_messages():
+                        return response
+                    cache.set(f'response:{etag}', response.get_data())
+                else:
+                    response = current_app.response_class(body, mimetype='text/html')
+            response.set_etag(etag)
+            if modified is not None:
+                response.last_modified = modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True # Revalidate on every use
+            response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
+
+def fragment_key(name, key):
+    return f'fragment:{name}:{key}'
+
+def cache_fragment(name, key, stamp=None, caller=None):
+    """
+    Jinja helper: {% call cache_fragment('assignment-answers', key, stamp) %}...{% endcall %}
+    renders the block once and reuses it while the stored stamp matches.
+    """
+    cache_key = fragment_key(name, key)
+    entry = cache.get(cache_key)
+    if entry is not None and entry[0] == stamp:
+        return Markup(entry[1])
+    html = caller()
+    cache.set(cache_key, (stamp, str(html)))
+    return Markup(html)
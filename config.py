@@ -9,3 +9,92 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
                               'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Engine tuning profile (see database.py): 'production' (WAL, PRAGMAs, pool sizes) or 'basic'
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE') or 'production'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB') or 64 * 1024)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+
+    # Optional read replica for the reporting pages (see routing.py); after writing, a user's
+    # requests stay on the primary for REPLICA_STICKY_SECONDS to read their own writes
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS') or 10)
+
+    # Response and template fragment cache (see cache.py): 'memory' (per-process LRU) or 'redis',
+    # which works with any Redis-compatible server at CACHE_REDIS_URL. Bump CACHE_VERSION when
+    # deploying template changes so clients' ETags no longer match. Cached trainee pages follow
+    # writes to the trainee's assignments and answers, but edits to course or assessment titles or
+    # to the trainee's username or email show only once CACHE_TTL has expired their entries.
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or 'redis://localhost:6379/0'
+    CACHE_SIZE = int(os.environ.get('CACHE_SIZE') or 2048)
+    CACHE_TTL = int(os.environ.get('CACHE_TTL') or 300)
+    CACHE_VERSION = os.environ.get('CACHE_VERSION') or '1'
+
+    # Access event ingestion (see access_events.py). With ACCESS_EVENT_API_TOKEN set, senders must
+    # pass it as a bearer token; otherwise a logged-in support or admin session is required.
+    ACCESS_EVENT_API_TOKEN = os.environ.get('ACCESS_EVENT_API_TOKEN')
+    ACCESS_EVENT_MAX_BATCH = int(os.environ.get('ACCESS_EVENT_MAX_BATCH') or 10000) # Lines per request
+    ACCESS_EVENT_FLUSH_SIZE = int(os.environ.get('ACCESS_EVENT_FLUSH_SIZE') or 5000)
+    ACCESS_EVENT_FLUSH_INTERVAL_MS = int(os.environ.get('ACCESS_EVENT_FLUSH_INTERVAL_MS') or 50)
+    ACCESS_EVENT_MAX_PENDING = int(os.environ.get('ACCESS_EVENT_MAX_PENDING') or 100000)
+    ACCESS_EVENT_ACK_TIMEOUT = int(os.environ.get('ACCESS_EVENT_ACK_TIMEOUT') or 10)
+
+    # Days covered by the access report API when no start date is given
+    ACCESS_REPORT_DEFAULT_DAYS = int(os.environ.get('ACCESS_REPORT_DEFAULT_DAYS') or 90)
+
+    # Archival (see archive.py): `flask archive` moves completed assignments, their answers and access
+    # events older than ARCHIVE_AFTER_DAYS into one SQLite file per month under ARCHIVE_DIR, which
+    # `flask rebuild-access-rollups` also reads
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'archive')
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 365)
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE') or 1000)
+
+    # Due date scheduler (see scheduler.py): assignments marked overdue / reminders queued per batch,
+    # how long before the due date a 'due_soon' reminder is queued, and how often it runs in the web
+    # processes, in whichever one holds the scheduler lease (0: only with `flask run-scheduler`, e.g. from cron).
+    # The trainee summaries and dashboard count an assignment overdue once a run has marked it; the
+    # progress overview's "Overdue Only" filter also matches open assignments already past due
+    SCHEDULER_BATCH_SIZE = int(os.environ.get('SCHEDULER_BATCH_SIZE') or 10000)
+    REMINDER_LEAD_HOURS = int(os.environ.get('REMINDER_LEAD_HOURS') or 24)
+    SCHEDULER_INTERVAL_SECONDS = int(os.environ.get('SCHEDULER_INTERVAL_SECONDS') or 0)
+
+    # Answer bodies at least this long (UTF-8 bytes) are stored zlib-compressed on SQLite (see answers.py)
+    ANSWER_COMPRESS_MIN_BYTES = int(os.environ.get('ANSWER_COMPRESS_MIN_BYTES') or 1024)
+
+    # Idle time after typing before complete_assessment autosaves an answer (static/js/autosave.js)
+    ANSWER_AUTOSAVE_DELAY_MS = int(os.environ.get('ANSWER_AUTOSAVE_DELAY_MS') or 1000)
+
+    # Default number of matches returned by the typeahead lookup API (at most lookup.MAX_RESULTS)
+    LOOKUP_RESULTS = int(os.environ.get('LOOKUP_RESULTS') or 20)
+
+    # Number of trainees shown per page on the progress overview
+    TRAINEES_PER_PAGE = int(os.environ.get('TRAINEES_PER_PAGE') or 50)
+
+    # Bulk assignments that could create at least this many rows run on the background worker
+    BULK_ASSIGN_BACKGROUND_THRESHOLD = int(os.environ.get('BULK_ASSIGN_BACKGROUND_THRESHOLD') or 50000)
+
+    # Number of results per page on the question/answer search pages
+    SEARCH_RESULTS_PER_PAGE = int(os.environ.get('SEARCH_RESULTS_PER_PAGE') or 20)
+
+    # Per-request SQL/timing instrumentation (Server-Timing header, JSON log line, /metrics);
+    # the log lines are written at INFO, so a level above that silences them
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '').lower() in ('1', 'true', 'yes')
+    REQUEST_LOG_LEVEL = os.environ.get('REQUEST_LOG_LEVEL') or 'INFO'
+
+    # Logged-in user identities cached in each process (see identity.py); the TTL bounds how
+    # long another process can serve a changed role or password
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE') or 10000)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 60)
+
+    # Password hashing (see passwords.py). The method string carries the cost parameters;
+    # stored hashes made with another method are upgraded on the user's next login.
+    PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER') or 'werkzeug'
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2) # 0 hashes in the request thread
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING') or 32)
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT') or 30)
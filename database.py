@@ -0,0 +1,100 @@
+import zlib
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+
+# --- Engine profiles ---
+# DATABASE_PROFILE selects how engines are tuned:
+#   'basic'      - SQLAlchemy defaults (rollback journal, no busy timeout).
+#   'production' - for SQLite, WAL journaling with synchronous=NORMAL, memory-mapped I/O, a larger
+#                  page cache and a busy timeout, applied with PRAGMAs on every new connection, so
+#                  readers no longer block writers and concurrent commits wait instead of failing
+#                  with "database is locked". Pool sizes suited to a threaded worker are set for
+#                  SQLite files and PostgreSQL alike.
+
+PROFILES = ('basic', 'production')
+
+# Dialects with INSERT ... ON CONFLICT support
+UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+def sqlite_pragmas(config):
+    """The PRAGMAs applied to each new SQLite connection under the configured profile."""
+    if config.get('DATABASE_PROFILE', 'production') != 'production':
+        return {}
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': config.get('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        'cache_size': -config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024), # Negative values are KiB
+        'temp_store': 'MEMORY',
+    }
+
+def engine_options(database_uri, config):
+    """SQLALCHEMY_ENGINE_OPTIONS for one database URI under the configured profile."""
+    if config.get('DATABASE_PROFILE', 'production') != 'production':
+        return {}
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {} # In-memory databases use a single static connection
+        return {
+            'pool_size': config.get('DB_POOL_SIZE', 10),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        }
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_pre_ping': True,
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+    }
+
+def apply_profile(app):
+    """Fills in SQLALCHEMY_ENGINE_OPTIONS from the profile; call before db.init_app(app)."""
+    if app.config.get('DATABASE_PROFILE', 'production') not in PROFILES:
+        raise ValueError(f"Unknown DATABASE_PROFILE {app.config['DATABASE_PROFILE']!r}; expected one of {PROFILES}")
+    options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}) # Explicit options win
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    # Binds given as bare URIs get the options suited to their own backend
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    app.config['SQLALCHEMY_BINDS'] = {
+        key: {'url': bind, **engine_options(bind, app.config)} if isinstance(bind, str) else bind
+        for key, bind in binds.items()
+    }
+
+def inflate_text(blob):
+    """Decompresses zlib-compressed UTF-8 text (see AnswerBody); None stays None."""
+    return zlib.decompress(blob).decode('utf-8') if blob is not None else None
+
+def install_functions(engine):
+    """
+    Registers inflate_text() as an SQL function on every new connection of a SQLite engine, so
+    the answer search index and exports can read compressed answer bodies.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _register_sqlite_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function('inflate_text', 1, inflate_text, deterministic=True)
+
+def install_pragmas(engine, pragmas):
+    """Runs the PRAGMAs on every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
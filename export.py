@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+from datetime import datetime, time
+
+from models import db, User, Course, Assessment, Question, Assignment, Progress, Answer, AnswerBody
+from queries import assignment_filter_clauses
+from answers import answer_text_column
+
+# --- Streaming exports ---
+# Rows are selected as plain columns (no ORM identities kept around) and fetched with
+# yield_per, which streams from a server-side cursor where the driver supports it.
+# The encoders below turn them into chunks of CSV or NDJSON text as they arrive, so memory
+# stays flat and the first bytes go out before the query has finished.
+
+EXPORT_BATCH_SIZE = 1000 # Rows fetched and written per chunk
+
+PROGRESS_COLUMNS = [
+    Assignment.id.label('assignment_id'),
+    User.username.label('username'),
+    db.case((Assignment.course_id.isnot(None), 'Course'), else_='Assessment').label('item_type'),
+    db.func.coalesce(Course.title, Assessment.title).label('title'),
+    Course.group_id.label('group_id'),
+    Assignment.status.label('status'),
+    Assignment.assigned_date.label('assigned_date'),
+    Assignment.due_date.label('due_date'),
+    Progress.completion_date.label('completion_date'),
+]
+
+def answer_columns():
+    """The answer export columns; the answer text expression depends on the database (see answers.py)."""
+    return [
+        Answer.id.label('answer_id'),
+        User.username.label('username'),
+        Answer.assignment_id.label('assignment_id'),
+        Assessment.title.label('assessment'),
+        Question.question_text.label('question_text'),
+        answer_text_column().label('answer_text'),
+        Answer.submitted_date.label('submitted_date'),
+    ]
+
+def date_range_clauses(column, start_date=None, end_date=None):
+    """Clauses limiting a DateTime column to [start_date, end_date], both whole days inclusive."""
+    clauses = []
+    if start_date:
+        clauses.append(column >= datetime.combine(start_date, time.min))
+    if end_date:
+        clauses.append(column <= datetime.combine(end_date, time.max))
+    return clauses
+
+def progress_export_query(start_date=None, end_date=None, **filters):
+    """One row per assignment, filtered on assigned_date and the progress overview filters."""
+    return (db.select(*PROGRESS_COLUMNS)
+            .join(User, Assignment.user_id == User.id)
+            .outerjoin(Course, Assignment.course_id == Course.id)
+            .outerjoin(Assessment, Assignment.assessment_id == Assessment.id)
+            .outerjoin(Progress, Progress.assignment_id == Assignment.id)
+            .where(*date_range_clauses(Assignment.assigned_date, start_date, end_date),
+                   *assignment_filter_clauses(**filters))
+            .order_by(Assignment.id))
+
+def answer_export_query(start_date=None, end_date=None, **filters):
+    """One row per answer, filtered on submitted_date and its assignment's progress overview filters."""
+    return (db.select(*answer_columns())
+            .join(AnswerBody, Answer.body_id == AnswerBody.id)
+            .join(Assignment, Answer.assignment_id == Assignment.id)
+            .join(User, Answer.user_id == User.id)
+            .join(Question, Answer.question_id == Question.id)
+            .outerjoin(Assessment, Question.assessment_id == Assessment.id)
+            .where(*date_range_clauses(Answer.submitted_date, start_date, end_date),
+                   *assignment_filter_clauses(**filters))
+            .order_by(Answer.id))
+
+def stream_rows(stmt):
+    """Yields the rows of `stmt` as dicts, EXPORT_BATCH_SIZE at a time from the database."""
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.mappings().partitions():
+        yield partition
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def encode_csv(stmt):
+    """Yields CSV text chunks for the rows of `stmt`; the header goes out before the query runs."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow([column.name for column in stmt.selected_columns])
+    yield flush()
+    for partition in stream_rows(stmt):
+        writer.writerows(row.values() for row in partition)
+        yield flush()
+
+def encode_ndjson(stmt):
+    """Yields newline-delimited JSON chunks, one object per row of `stmt`."""
+    for partition in stream_rows(stmt):
+        yield ''.join(json.dumps({key: _json_value(value) for key, value in row.items()}) + '\n'
+                      for row in partition)
+
+EXPORT_FORMATS = {
+    'csv': (encode_csv, 'text/csv'),
+    'ndjson': (encode_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,26 @@
+import os
+import weakref
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import LoginManager
+from routing import RoutingSession
+
+# Extensions are created unbound here and attached to an app in app.create_app(),
+# so models and helpers can import them without importing the app.
+db = SQLAlchemy(session_options={'class_': RoutingSession}) # Replica-aware, see routing.py
+login_manager = LoginManager()
+login_manager.login_view = 'main.login' # Redirect to login page if not authenticated
+
+# --- Fork safety ---
+# Pooled connections opened in a parent process (e.g. gunicorn --preload) must never be
+# used by its forked workers. create_app() registers its engines here, and each child
+# drops the inherited pool without closing the parent's connections.
+_engines = weakref.WeakSet()
+
+def register_engines(engines):
+    _engines.update(engines)
+
+def _dispose_engines_after_fork():
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_engines_after_fork)
@@ -1,8 +1,9 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, TextAreaField, SelectField, SelectMultipleField
-from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length
-from wtforms.widgets import ListWidget, CheckboxInput
+from wtforms import StringField, PasswordField, SubmitField, TextAreaField, SelectField, SelectMultipleField, BooleanField, DateField, IntegerField, HiddenField
+from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length, Optional, NumberRange
+from wtforms.widgets import ListWidget, CheckboxInput, HiddenInput
 from models import User, Course, Assessment, Question
+from lookup import MAX_RESULTS, find_items
 
 class RegistrationForm(FlaskForm):
     """
@@ -75,30 +76,58 @@ class AssignItemsForm(FlaskForm):
     """
     Form for assigning courses/assessments to trainees.
     """
-    # Dynamically populated choices in the route
-    trainees = MultiCheckboxField('Select Trainees', coerce=int, validators=[DataRequired()])
-    courses = SelectField('Select Course (Optional)', coerce=int, choices=[(0, '--- Select a Course ---')])
-    assessments = SelectField('Select Assessment (Optional)', coerce=int, choices=[(0, '--- Select an Assessment ---')])
+    # The pickers are filled from the lookup API (lookup.py) rather than with every row, so the
+    # submitted ids are checked by validate() and only the selected ones become choices
+    trainees = MultiCheckboxField('Select Trainees', coerce=int, choices=[], validate_choice=False)
+    all_trainees = BooleanField('Assign to All Trainees')
+    courses = SelectField('Select Course (Optional)', coerce=int, choices=[(0, '--- Select a Course ---')],
+                          validate_choice=False)
+    course_group = StringField('Or Assign a Whole Course Group (Optional)', validators=[Optional(), Length(max=64)])
+    assessments = SelectField('Select Assessment (Optional)', coerce=int, choices=[(0, '--- Select an Assessment ---')],
+                              validate_choice=False)
     submit = SubmitField('Assign')
 
-    def validate(self):
-        """Custom validation to ensure either a course or an assessment is selected."""
-        if not super().validate():
+    def validate(self, extra_validators=None):
+        """Custom validation to ensure exactly one item and at least one trainee are selected."""
+        if not super().validate(extra_validators=extra_validators):
             return False
-        
+
+        # One query checks every submitted id; the ones found are kept as choices for re-rendering
+        found = find_items(self.trainees.data or (), self.courses.data, self.assessments.data)
+        self.trainees.choices = [(user_id, found['users'][user_id]) for user_id in self.trainees.data or ()
+                                 if user_id in found['users']]
+        for field, kind in ((self.courses, 'courses'), (self.assessments, 'assessments')):
+            field.choices = field.choices[:1] + list(found[kind].items())
+        missing_trainees = sorted(set(self.trainees.data or ()) - set(found['users']))
+        if missing_trainees:
+            self.trainees.errors.append(f"Unknown trainees: {', '.join(map(str, missing_trainees))}.")
+            return False
+        if self.courses.data and self.courses.data not in found['courses']:
+            self.courses.errors.append('That course does not exist.')
+            return False
+        if self.assessments.data and self.assessments.data not in found['assessments']:
+            self.assessments.errors.append('That assessment does not exist.')
+            return False
+
+        if not (self.trainees.data or self.all_trainees.data):
+            self.trainees.errors.append('Please select at least one trainee, or assign to all trainees.')
+            return False
+
         course_selected = self.courses.data and self.courses.data != 0
+        group_selected = bool(self.course_group.data)
         assessment_selected = self.assessments.data and self.assessments.data != 0
+        selected_count = sum(1 for selected in (course_selected, group_selected, assessment_selected) if selected)
 
-        if not (course_selected or assessment_selected):
-            self.courses.errors.append('Please select either a course or an assessment.')
-            self.assessments.errors.append('Please select either a course or an assessment.')
+        if selected_count == 0:
+            self.courses.errors.append('Please select either a course, a course group or an assessment.')
+            self.assessments.errors.append('Please select either a course, a course group or an assessment.')
             return False
-        
-        if (course_selected and assessment_selected):
-            self.courses.errors.append('You can only assign a course OR an assessment at a time, not both.')
-            self.assessments.errors.append('You can only assign a course OR an assessment at a time, not both.')
+
+        if selected_count > 1:
+            self.courses.errors.append('You can only assign a course, a course group OR an assessment at a time.')
+            self.assessments.errors.append('You can only assign a course, a course group OR an assessment at a time.')
             return False
-        
+
         return True
 
 class AnswerForm(FlaskForm):
@@ -108,9 +137,98 @@ class AnswerForm(FlaskForm):
     answer_text = TextAreaField('Your Answer', validators=[DataRequired()])
     submit = SubmitField('Submit Answer')
 
+class SubmitAssessmentForm(FlaskForm):
+    """
+    Final submit of complete_assessment. Answers are autosaved one at a time, so this form
+    carries just the CSRF token for the whole page, the submission's idempotency key and the
+    assignment version the page was rendered from (kept current by autosave).
+    """
+    submission_key = HiddenField(validators=[Optional(), Length(max=64)])
+    version = IntegerField(widget=HiddenInput(), validators=[Optional()])
+    submit = SubmitField('Submit Assessment')
+
+class AutosaveAnswerForm(FlaskForm):
+    """
+    One autosaved answer, sent as JSON ({"answer_text": ..., "csrf_token": ...}).
+    A blank answer clears the saved one.
+    """
+    answer_text = TextAreaField('Your Answer')
+
+    def validate_answer_text(self, answer_text):
+        """JSON can carry numbers or lists where text is expected."""
+        if answer_text.data is not None and not isinstance(answer_text.data, str):
+            raise ValidationError('The answer must be text.')
+
 class SearchQuestionsForm(FlaskForm):
     """
     Form for searching open-ended questions.
     """
+    class Meta:
+        csrf = False # Read-only search submitted via the query string so results can be paginated
+
     search_query = StringField('Search Question Text', validators=[DataRequired()])
     submit = SubmitField('Search')
+
+class ProgressFilterForm(FlaskForm):
+    """
+    GET form for filtering the trainee progress overview.
+    """
+    class Meta:
+        csrf = False # Read-only filters submitted via the query string
+
+    status = SelectField('Status', choices=[('', 'Any Status'), ('not_started', 'Not Started'),
+                                            ('in_progress', 'In Progress'), ('completed', 'Completed'),
+                                            ('overdue', 'Overdue')],
+                         validators=[Optional()])
+    item_type = SelectField('Item Type', choices=[('', 'Any Type'), ('course', 'Course'), ('assessment', 'Assessment')],
+                            validators=[Optional()])
+    group_id = StringField('Course Group', validators=[Optional(), Length(max=64)])
+    overdue = BooleanField('Overdue Only')
+    submit = SubmitField('Filter')
+
+class SearchAnswersForm(FlaskForm):
+    """
+    Form for support staff to search trainees' answers.
+    """
+    class Meta:
+        csrf = False # Read-only search submitted via the query string so results can be paginated
+
+    search_query = StringField('Search Answer Text', validators=[DataRequired()])
+    submit = SubmitField('Search')
+
+class ExportFilterForm(ProgressFilterForm):
+    """
+    GET form for the streaming progress/answer exports: the progress overview filters plus a date range.
+    """
+    start_date = DateField('From', validators=[Optional()])
+    end_date = DateField('To', validators=[Optional()])
+    format = SelectField('Format', choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], default='csv')
+
+class LookupForm(FlaskForm):
+    """
+    Query string of the typeahead lookup API.
+    """
+    class Meta:
+        csrf = False # Read-only lookups submitted via the query string
+
+    q = StringField('Starts With', validators=[Optional(), Length(max=128)])
+    limit = IntegerField('Results', validators=[Optional(), NumberRange(min=1, max=MAX_RESULTS)])
+    role = SelectField('Role', choices=[('', 'Any Role'), ('trainee', 'Trainee'), ('support', 'Support'), ('admin', 'Admin')],
+                       validators=[Optional()])
+
+class AccessReportForm(FlaskForm):
+    """
+    GET form for the access report API: what to count, over which days, and how to break it down.
+    """
+    class Meta:
+        csrf = False # Read-only report parameters submitted via the query string
+
+    data_item = StringField('Data Item', validators=[Optional(), Length(max=128)])
+    user_id = IntegerField('User ID', validators=[Optional()])
+    purpose = StringField('Purpose', validators=[Optional(), Length(max=128)])
+    start_date = DateField('From', validators=[Optional()])
+    end_date = DateField('To', validators=[Optional()])
+    granularity = SelectField('Per', choices=[('day', 'Day'), ('hour', 'Hour')], default='day')
+    group_by = SelectMultipleField('Break Down By', choices=[('user_id', 'User'), ('data_item', 'Data Item'),
+                                                             ('purpose', 'Purpose')],
+                                   validators=[Optional()])
@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+
+# --- Cached user identity for Flask-Login ---
+# Every authenticated request asks Flask-Login's user_loader for the current user. Instead of a
+# primary-key query each time, models.load_user keeps the id, username and role of recently seen
+# users in a bounded LRU cache. Entries are dropped when an update or delete of the User row is
+# committed in this process (see the User and Session events in models.py) and expire after a
+# TTL, which bounds how long another worker process can keep serving a stale role.
+
+class SessionUser(UserMixin):
+    """
+    The cached identity of a logged-in user: just enough for the role checks and templates.
+    Query the User model by `id` when the full row is needed.
+    """
+
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    def __repr__(self):
+        return f'<SessionUser {self.username} ({self.role})>'
+
+class IdentityCache:
+    """A thread-safe LRU of {user id: SessionUser} whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        """Applies IDENTITY_CACHE_SIZE and IDENTITY_CACHE_TTL from the app config and starts empty."""
+        self.maxsize = app.config.get('IDENTITY_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('IDENTITY_CACHE_TTL', self.ttl)
+        self.clear()
+
+    def get(self, user_id):
+        """Returns the cached SessionUser, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return identity
+
+    def put(self, user):
+        """Caches the identity of a User row and returns it."""
+        identity = SessionUser(user.id, user.username, user.role)
+        if self.maxsize <= 0:
+            return identity
+        with self._lock:
+            self._entries[user.id] = (identity, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+identity_cache = IdentityCache()
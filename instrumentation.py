@@ -0,0 +1,129 @@
+import bisect
+import json
+import threading
+import time
+from collections import defaultdict
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# --- Opt-in per-request SQL and timing instrumentation ---
+# Enabled with INSTRUMENTATION_ENABLED. For every request it records the number of SQL
+# statements, the time spent in them, the wall time and the response size, then:
+#   - adds a Server-Timing header (visible in browser dev tools),
+#   - logs one JSON line on the 'instrumentation' child of app.logger, at INFO; that logger's
+#     level is set from REQUEST_LOG_LEVEL, as the root logger's default (WARNING) would drop it,
+#   - aggregates per-endpoint counters and a latency histogram for /metrics (Prometheus text).
+# Metrics are per process; scrape every worker (or sum them) when running several.
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class EndpointMetrics:
+    """Running totals for one endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.response_bytes = 0
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, queries, sql_seconds, wall_seconds, response_bytes):
+        self.requests += 1
+        self.queries += queries
+        self.sql_seconds += sql_seconds
+        self.wall_seconds += wall_seconds
+        self.response_bytes += response_bytes
+        index = bisect.bisect_left(LATENCY_BUCKETS, wall_seconds)
+        if index < len(LATENCY_BUCKETS):
+            self.bucket_counts[index] += 1
+
+_metrics = defaultdict(EndpointMetrics)
+_metrics_lock = threading.Lock()
+_logger = None # Set by init_app()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'request_started' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if started and has_request_context() and 'request_started' in g:
+        g.sql_seconds += time.perf_counter() - started.pop()
+        g.sql_queries += 1
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+
+def _finish_request(response):
+    if 'request_started' not in g:
+        return response
+    wall_seconds = time.perf_counter() - g.request_started
+    response_bytes = response.calculate_content_length() or 0 # Streamed responses count as 0
+    endpoint = request.endpoint or 'unmatched'
+
+    response.headers['Server-Timing'] = (
+        f'sql;dur={g.sql_seconds * 1000:.2f};desc="{g.sql_queries} queries", '
+        f'total;dur={wall_seconds * 1000:.2f}'
+    )
+    _logger.info(json.dumps({
+        'endpoint': endpoint,
+        'method': request.method,
+        'status': response.status_code,
+        'queries': g.sql_queries,
+        'sql_ms': round(g.sql_seconds * 1000, 2),
+        'wall_ms': round(wall_seconds * 1000, 2),
+        'response_bytes': response_bytes
+    }))
+    with _metrics_lock:
+        _metrics[endpoint].observe(g.sql_queries, g.sql_seconds, wall_seconds, response_bytes)
+    return response
+
+def init_app(app):
+    """Installs the request hooks and SQL listeners if INSTRUMENTATION_ENABLED is set."""
+    global _logger
+    if not app.config.get('INSTRUMENTATION_ENABLED'):
+        return
+    _logger = app.logger.getChild('instrumentation')
+    _logger.setLevel(app.config.get('REQUEST_LOG_LEVEL', 'INFO'))
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+def render_metrics():
+    """Returns the per-endpoint metrics in the Prometheus text exposition format."""
+    with _metrics_lock:
+        snapshot = {endpoint: (m.requests, m.queries, m.sql_seconds, m.wall_seconds,
+                               m.response_bytes, list(m.bucket_counts))
+                    for endpoint, m in sorted(_metrics.items())}
+
+    lines = [
+        '# HELP dat_request_duration_seconds Request wall time.',
+        '# TYPE dat_request_duration_seconds histogram',
+    ]
+    for endpoint, (requests, _, _, wall_seconds, _, bucket_counts) in snapshot.items():
+        cumulative = 0
+        for upper, count in zip(LATENCY_BUCKETS, bucket_counts):
+            cumulative += count
+            lines.append(f'dat_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{upper}"}} {cumulative}')
+        lines.append(f'dat_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {requests}')
+        lines.append(f'dat_request_duration_seconds_sum{{endpoint="{endpoint}"}} {wall_seconds}')
+        lines.append(f'dat_request_duration_seconds_count{{endpoint="{endpoint}"}} {requests}')
+
+    counters = (
+        ('dat_request_sql_queries_total', 'SQL statements issued while serving requests.', 1),
+        ('dat_request_sql_seconds_total', 'Time spent in SQL statements while serving requests.', 2),
+        ('dat_response_bytes_total', 'Response body bytes sent (streamed responses excluded).', 4),
+    )
+    for name, help_text, position in counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for endpoint, values in snapshot.items():
+            lines.append(f'{name}{{endpoint="{endpoint}"}} {values[position]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,61 @@
+from models import db, User, Course, Assessment
+
+# --- Typeahead lookups ---
+# assign_items does not list every trainee, course and assessment; its pickers call these prefix
+# searches (/api/lookup/<kind>) instead, and AssignItemsForm checks the ids it gets back with
+# find_items(). Matching is case-insensitive: the prefix is compared as a range on lower(name)
+# (lower(name) >= 'ab' AND lower(name) < 'ac'), which the ix_*_lower expression indexes answer on
+# every backend, where LIKE/ILIKE would scan the table on some of them.
+
+LOOKUPS = {
+    'users': (User, User.username),
+    'courses': (Course, Course.title),
+    'assessments': (Assessment, Assessment.title),
+}
+
+MAX_RESULTS = 100 # Upper bound for the limit a caller may ask for
+
+def prefix_condition(column, prefix):
+    """Case-insensitive `column` starts with `prefix`, as an index-friendly range."""
+    lowered = db.func.lower(column)
+    prefix = prefix.lower()
+    if prefix[-1] == chr(0x10FFFF):
+        return lowered >= prefix
+    return db.and_(lowered >= prefix, lowered < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+def lookup(kind, prefix='', limit=20, role=None):
+    """
+    Up to `limit` {'id', 'label'} dicts of `kind` ('users', 'courses' or 'assessments') whose
+    name starts with `prefix`, in name order. Users can be restricted to one `role`.
+    """
+    model, name = LOOKUPS[kind]
+    stmt = db.select(model.id, name)
+    if prefix:
+        stmt = stmt.where(prefix_condition(name, prefix))
+    if role is not None and model is User:
+        stmt = stmt.where(User.role == role)
+    stmt = stmt.order_by(db.func.lower(name), model.id).limit(min(limit, MAX_RESULTS))
+    return [{'id': item_id, 'label': label} for item_id, label in db.session.execute(stmt)]
+
+def find_items(user_ids=(), course_id=None, assessment_id=None, role='trainee'):
+    """
+    Checks submitted ids in one UNION ALL query. Returns {kind: {id: label}} holding only the ids
+    that exist (users only if they have `role`), so missing ones are simply absent.
+    """
+    selects = []
+    if user_ids:
+        selects.append(db.select(db.literal('users', db.String), User.id, User.username)
+                       .where(User.id.in_(user_ids), User.role == role))
+    if course_id:
+        selects.append(db.select(db.literal('courses', db.String), Course.id, Course.title)
+                       .where(Course.id == course_id))
+    if assessment_id:
+        selects.append(db.select(db.literal('assessments', db.String), Assessment.id, Assessment.title)
+                       .where(Assessment.id == assessment_id))
+
+    found = {kind: {} for kind in LOOKUPS}
+    if selects:
+        stmt = selects[0] if len(selects) == 1 else db.union_all(*selects)
+        for kind, item_id, label in db.session.execute(stmt):
+            found[kind][item_id] = label
+    return found
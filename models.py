@@ -1,12 +1,24 @@
 from datetime import datetime
-from app import db, login_manager
-from werkzeug.security import generate_password_hash, check_password_hash
+from extensions import db, login_manager
+from database import inflate_text
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from identity import identity_cache
+from passwords import password_hashing
 
 # User loader function for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """Returns the cached identity (id, username, role) of a logged-in user; queries only on a cache miss."""
+    identity = identity_cache.get(int(user_id))
+    if identity is None:
+        user = db.session.get(User, int(user_id))
+        if user is None:
+            return None
+        identity = identity_cache.put(user)
+    return identity
 
 class User(db.Model, UserMixin):
     """
@@ -19,21 +31,51 @@ class User(db.Model, UserMixin):
     password_hash = db.Column(db.String(128))
     role = db.Column(db.String(20), default='trainee', nullable=False) # 'trainee', 'support', 'admin'
 
+    # Case-insensitive prefix lookups (lookup.py)
+    __table_args__ = (
+        db.Index('ix_user_username_lower', db.func.lower(username)),
+    )
+
     # Relationships
     assignments = db.relationship('Assignment', backref='assignee', lazy='dynamic')
     answers = db.relationship('Answer', backref='responder', lazy='dynamic')
 
     def set_password(self, password):
-        """Hashes the password and stores it."""
-        self.password_hash = generate_password_hash(password)
+        """Hashes the password (on the password hashing pool) and stores it."""
+        self.password_hash = password_hashing.hash(password)
 
     def check_password(self, password):
         """Checks if the provided password matches the stored hash."""
-        return check_password_hash(self.password_hash, password)
+        return password_hashing.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True if the stored hash was made with other hashing parameters than the configured ones."""
+        return password_hashing.needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username} ({self.role})>'
 
+# A changed role or password must not keep being served from the identity cache. Identities are
+# dropped once the change is committed: dropped at flush, a concurrent request could load the old
+# row again and cache it for the whole TTL
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _queue_identity_invalidation(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        identity_cache.invalidate(target.id)
+    else:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_cached_identities(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        identity_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_identity_invalidations(session):
+    session.info.pop('changed_user_ids', None)
+
 class Course(db.Model):
     """
     Represents a course that can be assigned to trainees.
@@ -41,7 +83,12 @@ class Course(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(128), nullable=False)
     description = db.Column(db.Text)
-    group_id = db.Column(db.String(64), nullable=True) # For grouping courses (e.g., 'Cybersecurity Basics')
+    group_id = db.Column(db.String(64), nullable=True, index=True) # For grouping courses (e.g., 'Cybersecurity Basics')
+
+    # Case-insensitive prefix lookups (lookup.py)
+    __table_args__ = (
+        db.Index('ix_course_title_lower', db.func.lower(title)),
+    )
 
     # Relationships
     assignments = db.relationship('Assignment', backref='course_assigned', lazy='dynamic')
@@ -56,6 +103,13 @@ class Assessment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(128), nullable=False)
     description = db.Column(db.Text)
+    # When a question was last added, edited or removed through the ORM (stamps cached answer views)
+    questions_changed_at = db.Column(db.DateTime, nullable=True)
+
+    # Case-insensitive prefix lookups (lookup.py)
+    __table_args__ = (
+        db.Index('ix_assessment_title_lower', db.func.lower(title)),
+    )
 
     # Relationships
     questions = db.relationship('Question', backref='assessment_parent', lazy='dynamic')
@@ -70,7 +124,7 @@ class Question(db.Model):
     Currently supports 'open_ended' type.
     """
     id = db.Column(db.Integer, primary_key=True)
-    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'), nullable=False)
+    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'), nullable=False, index=True)
     question_text = db.Column(db.Text, nullable=False)
     question_type = db.Column(db.String(20), default='open_ended', nullable=False) # e.g., 'open_ended'
 
@@ -80,17 +134,37 @@ class Question(db.Model):
     def __repr__(self):
         return f'<Question {self.id} for Assessment {self.assessment_id}>'
 
+# Answers fragments cached by view_trainee_details must show question changes (see cache.py)
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_update')
+@event.listens_for(Question, 'after_delete')
+def _stamp_question_change(mapper, connection, target):
+    connection.execute(db.update(Assessment).where(Assessment.id == target.assessment_id)
+                       .values(questions_changed_at=datetime.utcnow()))
+
+# Assignment statuses the due date scheduler can still mark overdue
+OPEN_STATUSES = ('not_started', 'in_progress')
+
 class Assignment(db.Model):
     """
     Represents an assignment of a course or assessment to a specific user.
     """
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=True)
     assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'), nullable=True)
     assigned_date = db.Column(db.DateTime, default=datetime.utcnow)
     due_date = db.Column(db.DateTime, nullable=True)
-    status = db.Column(db.String(20), default='not_started', nullable=False) # 'not_started', 'in_progress', 'completed'
+    # 'not_started', 'in_progress', 'completed', or 'overdue' once the scheduler (scheduler.py) finds
+    # it open past its due date
+    status = db.Column(db.String(20), default='not_started', nullable=False)
+    # Bumped by every ORM update, which only applies if the row still has the version it was read
+    # with (compare-and-swap); a concurrent change makes the flush raise StaleDataError
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    # Idempotency key of the submission that last completed the assessment (see answers.py)
+    submission_key = db.Column(db.String(64), nullable=True)
+
+    __mapper_args__ = {'version_id_col': version}
 
     # Ensure only one of course_id or assessment_id is set
     __table_args__ = (
@@ -99,6 +173,13 @@ class Assignment(db.Model):
             '(course_id IS NULL AND assessment_id IS NOT NULL)',
             name='check_course_or_assessment'
         ),
+        # Drives the status/overdue filters on the progress overview and the scheduler's due date scans
+        db.Index('ix_assignment_status_due_date', 'status', 'due_date'),
+        # A trainee holds each course or assessment at most once, even when bulk runs race (assignments.py)
+        db.Index('uq_assignment_user_course', 'user_id', 'course_id', unique=True,
+                 sqlite_where=db.text('course_id IS NOT NULL'), postgresql_where=db.text('course_id IS NOT NULL')),
+        db.Index('uq_assignment_user_assessment', 'user_id', 'assessment_id', unique=True,
+                 sqlite_where=db.text('assessment_id IS NOT NULL'), postgresql_where=db.text('assessment_id IS NOT NULL')),
     )
 
     # Relationships
@@ -116,7 +197,7 @@ class Progress(db.Model):
     For now, it's tied to the overall assignment status.
     """
     id = db.Column(db.Integer, primary_key=True)
-    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False, unique=True, index=True) # One Progress row per assignment
     status = db.Column(db.String(20), default='not_started', nullable=False) # 'not_started', 'in_progress', 'completed'
     completion_date = db.Column(db.DateTime, nullable=True)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -124,6 +205,35 @@ class Progress(db.Model):
     def __repr__(self):
         return f'<Progress for Assignment {self.assignment_id}: {self.status}>'
 
+class AnswerBody(db.Model):
+    """
+    The text of one or more answers, stored once per distinct content (see answers.py).
+    Long texts are zlib-compressed into `compressed` (then `text` is NULL) on databases that do not
+    compress large values themselves; everything else is kept in `text`.
+    """
+    __tablename__ = 'answer_body'
+    id = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.String(64), nullable=False) # SHA-256 of the UTF-8 text, hex
+    size = db.Column(db.Integer, nullable=False) # Length of the UTF-8 text in bytes, before compression
+    text = db.Column(db.Text, nullable=True)
+    compressed = db.Column(db.LargeBinary, nullable=True)
+
+    __table_args__ = (
+        db.Index('uq_answer_body_digest', 'digest', unique=True),
+    )
+
+    @property
+    def content(self):
+        """The answer text, decompressed on each access."""
+        return self.text if self.compressed is None else inflate_text(self.compressed)
+
+    def __str__(self):
+        # Templates can be handed the body itself, so only displayed answers get decompressed
+        return self.content
+
+    def __repr__(self):
+        return f'<AnswerBody {self.id} ({self.size} bytes)>'
+
 class Answer(db.Model):
     """
     Stores a trainee's answer to an open-ended question.
@@ -132,8 +242,171 @@ class Answer(db.Model):
     question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False) # Link to the specific assignment
-    answer_text = db.Column(db.Text, nullable=False)
+    # Identical answers share one body; the index also maps search matches (per body) back to answers
+    body_id = db.Column(db.Integer, db.ForeignKey('answer_body.id'), nullable=False, index=True)
     submitted_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    body = db.relationship('AnswerBody', lazy='joined', innerjoin=True)
+
+    @property
+    def answer_text(self):
+        return self.body.content
+
+    # One answer per question per assignment. assignment_id leads so that
+    # "all answers for this assignment" lookups can use the same index.
+    __table_args__ = (
+        db.Index('uq_answer_assignment_question_user', 'assignment_id', 'question_id', 'user_id', unique=True),
+    )
+
     def __repr__(self):
         return f'<Answer by User {self.user_id} to Question {self.question_id}>'
+
+class Statistic(db.Model):
+    """
+    A named running counter (e.g. 'users', 'assignments_completed') for the admin dashboard.
+    Kept up to date incrementally by stats.py, so reading it never scans the counted table.
+    """
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<Statistic {self.name}={self.value}>'
+
+class TraineeProgressSummary(db.Model):
+    """
+    One narrow row per trainee with their assignment totals ("X of Y complete, Z overdue").
+    Refreshed by summaries.py whenever the trainee's assignments change.
+    Trainees without assignments have no row.
+    """
+    __tablename__ = 'trainee_progress_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total = db.Column(db.Integer, default=0, nullable=False)
+    not_started = db.Column(db.Integer, default=0, nullable=False)
+    in_progress = db.Column(db.Integer, default=0, nullable=False)
+    completed = db.Column(db.Integer, default=0, nullable=False)
+    overdue = db.Column(db.Integer, default=0, nullable=False)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<TraineeProgressSummary for User {self.user_id}: {self.completed}/{self.total}>'
+
+class Reminder(db.Model):
+    """
+    A reminder queued for a trainee by the scheduler: 'due_soon' when an open assignment's due date
+    is near, 'overdue' when it has passed. At most one of each kind per assignment; `sent_at` is
+    set once it has been delivered.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False) # 'due_soon', 'overdue'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('uq_reminder_assignment_kind', 'assignment_id', 'kind', unique=True),
+        # Unsent reminders, oldest first
+        db.Index('ix_reminder_sent_at_created_at', 'sent_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<Reminder {self.kind} for Assignment {self.assignment_id}>'
+
+class SchedulerRun(db.Model):
+    """
+    Metrics of one scheduler run (see scheduler.py): how many assignments it marked overdue and
+    how many reminders it queued, in how many batches and how long. `error` is set if it failed.
+    """
+    __tablename__ = 'scheduler_run'
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    marked_overdue = db.Column(db.Integer, default=0, nullable=False)
+    reminders_queued = db.Column(db.Integer, default=0, nullable=False)
+    batches = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+
+    @property
+    def duration(self):
+        """Seconds the run took, or None while it is running."""
+        return (self.finished_at - self.started_at).total_seconds() if self.finished_at else None
+
+    def __repr__(self):
+        return f'<SchedulerRun {self.started_at}: {self.marked_overdue} overdue, {self.reminders_queued} reminders>'
+
+class SchedulerLease(db.Model):
+    """
+    Which process runs the in-process due date scheduler (see scheduler.py): `holder` (host:pid)
+    owns the lease called `name` until `expires_at`.
+    """
+    __tablename__ = 'scheduler_lease'
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(128), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} held by {self.holder} until {self.expires_at}>'
+
+class AccessEvent(db.Model):
+    """
+    One record of who accessed what data, when and for what purpose. Append-only: rows are
+    written in bulk by access_events.py and never updated. `event_id` is chosen by the sender
+    (or generated on receipt), so a batch retried after a lost acknowledgement is stored once.
+    `user_id` is deliberately not a foreign key, so the log survives user deletion and a bad id
+    cannot fail a whole batch.
+    """
+    __tablename__ = 'access_event'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    event_id = db.Column(db.String(64), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    data_item = db.Column(db.String(128), nullable=False)
+    purpose = db.Column(db.String(128), nullable=False)
+    occurred_at = db.Column(db.DateTime, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Searches filter by accessor or data item over a date range
+    __table_args__ = (
+        db.Index('ix_access_event_user_id_occurred_at', 'user_id', 'occurred_at'),
+        db.Index('ix_access_event_data_item_occurred_at', 'data_item', 'occurred_at'),
+    )
+
+    def __repr__(self):
+        return f'<AccessEvent {self.event_id}: User {self.user_id} -> {self.data_item}>'
+
+class AccessRollupHourly(db.Model):
+    """
+    Number of access events per hour, accessor, data item and purpose. Incremented by rollups.py
+    in the transaction that stores the events, so reports never scan AccessEvent.
+    """
+    __tablename__ = 'access_rollup_hourly'
+    data_item = db.Column(db.String(128), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True) # Start of the hour (UTC)
+    user_id = db.Column(db.Integer, primary_key=True)
+    purpose = db.Column(db.String(128), primary_key=True)
+    accesses = db.Column(db.BigInteger, default=0, nullable=False)
+
+    # The primary key serves per-data-item reports; this one per-user reports
+    __table_args__ = (
+        db.Index('ix_access_rollup_hourly_user_id_bucket_start', 'user_id', 'bucket_start'),
+    )
+
+    def __repr__(self):
+        return f'<AccessRollupHourly {self.bucket_start} User {self.user_id} -> {self.data_item}: {self.accesses}>'
+
+class AccessRollupDaily(db.Model):
+    """
+    Number of access events per day, accessor, data item and purpose; see AccessRollupHourly.
+    """
+    __tablename__ = 'access_rollup_daily'
+    data_item = db.Column(db.String(128), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True) # Midnight (UTC) of the day
+    user_id = db.Column(db.Integer, primary_key=True)
+    purpose = db.Column(db.String(128), primary_key=True)
+    accesses = db.Column(db.BigInteger, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_access_rollup_daily_user_id_bucket_start', 'user_id', 'bucket_start'),
+    )
+
+    def __repr__(self):
+        return f'<AccessRollupDaily {self.bucket_start} User {self.user_id} -> {self.data_item}: {self.accesses}>'
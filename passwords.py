@@ -0,0 +1,121 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from functools import cached_property
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# --- Password hashing backend ---
+# Hashing is deliberately CPU-expensive. To keep a login burst from starving the web workers,
+# hashes are computed on a small process pool (PASSWORD_HASH_WORKERS; 0 hashes in-process)
+# and at most PASSWORD_HASH_MAX_PENDING hashes may be queued or running at once per process;
+# beyond that PasswordHashingBusy is raised so the request can fail fast. A hash still running
+# when its request gives up (PASSWORD_HASH_TIMEOUT) keeps its slot until it finishes.
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many password hashes are already queued, or one took too long."""
+
+class WerkzeugHasher:
+    """
+    Hashes with werkzeug.security. `method` carries the cost parameters,
+    e.g. 'pbkdf2:sha256:600000' or 'scrypt:32768:8:1'.
+    """
+
+    def __init__(self, method='pbkdf2:sha256:600000'):
+        self.method = method
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def verify(self, password_hash, password):
+        return check_password_hash(password_hash, password)
+
+    @cached_property
+    def prefix(self):
+        # What the configured method expands to, e.g. 'pbkdf2:sha256' -> 'pbkdf2:sha256:600000'
+        return generate_password_hash('', method=self.method).split('$', 1)[0]
+
+    def needs_rehash(self, password_hash):
+        """True if the hash was made with a different method or cost than the configured one."""
+        return password_hash.split('$', 1)[0] != self.prefix
+
+# Backends selectable with PASSWORD_HASHER
+HASHERS = {
+    'werkzeug': WerkzeugHasher,
+}
+
+class PasswordHashing:
+    """The configured hasher plus the bounded pool its work runs on."""
+
+    def __init__(self):
+        self.hasher = WerkzeugHasher()
+        self.workers = 0
+        self.max_pending = 32
+        self.timeout = 30
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def configure(self, app):
+        """Applies the PASSWORD_HASH* settings from the app config."""
+        hasher_class = HASHERS[app.config.get('PASSWORD_HASHER', 'werkzeug')]
+        self.hasher = hasher_class(app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'))
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', 32)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 30)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.shutdown()
+
+    def _get_pool(self):
+        # Created lazily, so each forked web worker starts its own pool
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _forget_pool_after_fork(self):
+        # A pool inherited from the parent process is unusable in a forked child
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _run(self, func, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise PasswordHashingBusy('Too many password hashes are already pending.')
+        if self.workers <= 0:
+            try:
+                return func(*args)
+            finally:
+                slots.release()
+        try:
+            future = self._get_pool().submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # Released when the hash is done, not when this request stops waiting for it
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            future.cancel() # Frees the slot at once if the hash has not started yet
+            raise PasswordHashingBusy('Password hashing timed out.') from None
+
+    def hash(self, password):
+        return self._run(self.hasher.hash, password)
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(self.hasher.verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return self.hasher.needs_rehash(password_hash)
+
+password_hashing = PasswordHashing()
+os.register_at_fork(after_in_child=password_hashing._forget_pool_after_fork)
@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy.orm import joinedload
+
+from models import db, User, Course, Question, Assignment, TraineeProgressSummary, OPEN_STATUSES
+from answers import load_answers
+
+# --- Read helpers shared by the reporting views ---
+
+def summarize_assignment(assignment):
+    """
+    Flattens an Assignment into the dict the progress templates expect.
+    Uses the already-loaded course/assessment backrefs, so no extra query is issued
+    when the assignment was fetched with assignment_items_loaded().
+    """
+    item_title = 'N/A'
+    item_type = ''
+    if assignment.course_id:
+        item = assignment.course_assigned
+        item_title = item.title if item else 'Deleted Course'
+        item_type = 'Course'
+    elif assignment.assessment_id:
+        item = assignment.assessment_assigned
+        item_title = item.title if item else 'Deleted Assessment'
+        item_type = 'Assessment'
+
+    return {
+        'assignment_id': assignment.id,
+        'item_type': item_type,
+        'title': item_title,
+        'status': assignment.status,
+        'assigned_date': assignment.assigned_date.strftime('%Y-%m-%d'),
+        'due_date': assignment.due_date.strftime('%Y-%m-%d') if assignment.due_date else 'N/A'
+    }
+
+def load_questions_and_answers(assignment):
+    """
+    The questions of a completed assessment assignment with the trainee's answers, as the
+    [{'question_text', 'answer_text', 'submitted_date'}, ...] view_trainee_details shows. Two
+    queries; answer texts are AnswerBody rows, decompressed only when the template prints them.
+    """
+    questions = Question.query.filter_by(assessment_id=assignment.assessment_id).order_by(Question.id).all()
+    answers = load_answers(assignment.id, assignment.user_id)
+    questions_and_answers = []
+    for question in questions:
+        answer = answers.get(question.id)
+        questions_and_answers.append({
+            'question_text': question.question_text,
+            'answer_text': answer.body if answer else 'No answer submitted yet.',
+            'submitted_date': answer.submitted_date.strftime('%Y-%m-%d %H:%M') if answer else 'N/A'
+        })
+    return questions_and_answers
+
+def assignment_items_loaded():
+    """Loader options that fetch the assigned course/assessment in the same query as the assignment."""
+    return (joinedload(Assignment.course_assigned), joinedload(Assignment.assessment_assigned))
+
+def assignment_filter_clauses(status=None, item_type=None, group_id=None, overdue=False):
+    """
+    Builds the WHERE clauses for the progress overview filters.
+    status and overdue are served by ix_assignment_status_due_date, group_id by ix_course_group_id.
+    `overdue` matches assignments past their due date whether or not the scheduler has marked
+    them yet, so it combines with any status filter.
+    """
+    clauses = []
+    if status:
+        clauses.append(Assignment.status == status)
+    if item_type == 'course':
+        clauses.append(Assignment.course_id.isnot(None))
+    elif item_type == 'assessment':
+        clauses.append(Assignment.assessment_id.isnot(None))
+    if group_id:
+        clauses.append(Assignment.course_id.in_(db.select(Course.id).where(Course.group_id == group_id)))
+    if overdue:
+        clauses.append(db.or_(Assignment.status == 'overdue',
+                              db.and_(Assignment.status.in_(OPEN_STATUSES), Assignment.due_date < datetime.utcnow())))
+    return clauses
+
+def summary_counts(summary):
+    """The template-facing totals of a TraineeProgressSummary (all zero for trainees without one)."""
+    return {
+        'total': summary.total if summary else 0,
+        'completed': summary.completed if summary else 0,
+        'overdue': summary.overdue if summary else 0,
+        'refreshed_at': summary.refreshed_at if summary else None
+    }
+
+def load_trainee_progress(after=None, limit=None, include_assignments=None, **filters):
+    """
+    Returns (trainee_data, next_cursor) where trainee_data is
+    [{'user': trainee, 'summary': {...}, 'assignments': [summary, ...]}, ...] ordered by username.
+
+    Pages are keyset-paginated on User.username: pass the returned next_cursor back as `after`
+    to get the following page. Each trainee's totals come from their TraineeProgressSummary row,
+    joined into the page query. When any filter is set, only trainees with at least one matching
+    assignment are listed, and their matching assignments are summarized as well
+    (include_assignments overrides this). Issues one query, or two when assignments are included.
+    """
+    clauses = assignment_filter_clauses(**filters)
+    if include_assignments is None:
+        include_assignments = bool(clauses)
+
+    trainee_query = (db.select(User, TraineeProgressSummary)
+                     .outerjoin(TraineeProgressSummary, TraineeProgressSummary.user_id == User.id)
+                     .where(User.role == 'trainee'))
+    if after:
+        trainee_query = trainee_query.where(User.username > after)
+    if clauses:
+        trainee_query = trainee_query.where(
+            db.select(Assignment.id).where(Assignment.user_id == User.id, *clauses).exists()
+        )
+    trainee_query = trainee_query.order_by(User.username)
+    if limit:
+        # Fetch one extra row to know whether another page follows
+        trainee_query = trainee_query.limit(limit + 1)
+    rows = db.session.execute(trainee_query).all()
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0].username
+
+    summaries_by_user = defaultdict(list)
+    if include_assignments and rows:
+        assignments = (Assignment.query
+                       .filter(Assignment.user_id.in_([trainee.id for trainee, _ in rows]), *clauses)
+                       .options(*assignment_items_loaded())
+                       .order_by(Assignment.user_id, Assignment.id)
+                       .all())
+        for assignment in assignments:
+            summaries_by_user[assignment.user_id].append(summarize_assignment(assignment))
+
+    trainee_data = [{
+        'user': trainee,
+        'summary': summary_counts(summary),
+        'assignments': summaries_by_user.get(trainee.id, [])
+    } for trainee, summary in rows]
+    return trainee_data, next_cursor
@@ -0,0 +1,179 @@
+import click
+from collections import Counter
+from datetime import datetime
+from flask.cli import with_appcontext
+
+from models import db, AccessEvent, AccessRollupHourly, AccessRollupDaily
+from database import UPSERT_DIALECTS
+from archive import archived_access_events
+
+try:
+    import numpy as np
+except ImportError: # Only used to speed up rebuild_rollups()
+    np = None
+
+# --- Access event rollups ---
+# Reports count accesses per hour or day by accessor, data item and purpose. Those counts are kept
+# in AccessRollupHourly/AccessRollupDaily and incremented by add_to_rollups() in the transaction
+# that stores the events (access_events.insert_events), so they never drift from the raw log.
+# rebuild_rollups() recomputes a date range from the raw events, live and archived (archive.py):
+# the cold path for backfills and repairs, vectorized with NumPy when it is installed.
+
+ROLLUPS = {
+    'hour': AccessRollupHourly,
+    'day': AccessRollupDaily,
+}
+
+# Order of the parts of a rollup key
+KEY_COLUMNS = ('bucket_start', 'user_id', 'data_item', 'purpose')
+
+REBUILD_BATCH_SIZE = 100000 # Events fetched and aggregated per chunk by rebuild_rollups()
+
+def hour_start(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def count_hourly(rows):
+    """Counts event row dicts per hourly rollup key."""
+    return Counter((hour_start(row['occurred_at']), row['user_id'], row['data_item'], row['purpose'])
+                   for row in rows)
+
+def daily_from_hourly(hourly):
+    """Sums hourly counts into daily ones."""
+    daily = Counter()
+    for (hour, *rest), accesses in hourly.items():
+        daily[(hour.replace(hour=0), *rest)] += accesses
+    return daily
+
+def add_to_rollups(hourly, connection):
+    """Adds {hourly rollup key: accesses} to the hourly and daily rollups on `connection`. Does not commit."""
+    counts = {'hour': hourly, 'day': daily_from_hourly(hourly)}
+    insert = UPSERT_DIALECTS.get(connection.dialect.name)
+    for granularity, counter in counts.items():
+        if not counter:
+            continue
+        model = ROLLUPS[granularity]
+        params = [dict(zip(KEY_COLUMNS, key), accesses=accesses) for key, accesses in counter.items()]
+        if insert is not None:
+            stmt = insert(model)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[column.name for column in model.__table__.primary_key],
+                set_={'accesses': model.accesses + stmt.excluded.accesses}
+            )
+            connection.execute(stmt, params)
+            continue
+
+        for values in params:
+            key_clauses = [getattr(model, name) == values[name] for name in KEY_COLUMNS]
+            updated = connection.execute(db.update(model).where(*key_clauses)
+                                         .values(accesses=model.accesses + values['accesses'])).rowcount
+            if not updated:
+                connection.execute(db.insert(model).values(**values))
+
+def _count_chunk_python(rows, hourly):
+    for occurred_at, user_id, data_item, purpose in rows:
+        hourly[(hour_start(occurred_at), user_id, data_item, purpose)] += 1
+
+def _codes(values):
+    """Numbers the distinct values in order of appearance: (codes array, [value per code])."""
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.int64, count=len(values))
+    return codes, list(index)
+
+def _count_chunk_numpy(rows, hourly):
+    # Pack (hour, user, data item, purpose) into one int64 per event, count the distinct
+    # integers with np.unique, then unpack only the distinct keys
+    occurred_at, *columns = zip(*rows)
+    hours = np.fromiter((t.toordinal() * 24 + t.hour for t in occurred_at), dtype=np.int64, count=len(rows))
+    first_hour = int(hours.min())
+    encoded = [_codes(column) for column in columns]
+    radix = int(hours.max()) - first_hour + 1
+    for _, values in encoded:
+        radix *= len(values)
+    if radix >= 2 ** 63:
+        return _count_chunk_python(rows, hourly) # Too many distinct values to pack
+    keys = hours - first_hour
+    for codes, values in encoded:
+        keys = keys * len(values) + codes
+    dictionaries = [values for _, values in encoded]
+
+    keys, counts = np.unique(keys, return_counts=True)
+    unpacked = []
+    for values in reversed(dictionaries):
+        keys, codes = np.divmod(keys, len(values))
+        unpacked.append(codes.tolist())
+    users, data_items, purposes = dictionaries
+    purpose_codes, item_codes, user_codes = unpacked
+    for hour, user, item, purpose, accesses in zip((keys + first_hour).tolist(), user_codes, item_codes,
+                                                    purpose_codes, counts.tolist()):
+        bucket = datetime.fromordinal(hour // 24).replace(hour=hour % 24)
+        hourly[(bucket, users[user], data_items[item], purposes[purpose])] += accesses
+
+def rebuild_rollups(start=None, end=None, use_numpy=None):
+    """
+    Recomputes the hourly and daily rollups of the days from `start` up to (not including) `end`
+    from the raw events, including those `flask archive` moved to the archive files; None means
+    unbounded. Uses NumPy when installed unless use_numpy is False.
+    Returns the number of events counted. Does not commit; events committed by the ingestion
+    writer while this runs may be missed or counted twice, so pause ingestion for exact results.
+    """
+    if use_numpy and np is None:
+        raise RuntimeError('NumPy is not installed.')
+    count_chunk = _count_chunk_numpy if (np is not None and use_numpy is not False) else _count_chunk_python
+    if start is not None:
+        start = datetime(start.year, start.month, start.day)
+    if end is not None:
+        end = datetime(end.year, end.month, end.day)
+
+    for model in ROLLUPS.values():
+        delete = db.delete(model)
+        if start is not None:
+            delete = delete.where(model.bucket_start >= start)
+        if end is not None:
+            delete = delete.where(model.bucket_start < end)
+        db.session.execute(delete)
+
+    events = db.select(AccessEvent.occurred_at, AccessEvent.user_id, AccessEvent.data_item, AccessEvent.purpose)
+    if start is not None:
+        events = events.where(AccessEvent.occurred_at >= start)
+    if end is not None:
+        events = events.where(AccessEvent.occurred_at < end)
+    hourly = Counter()
+    result = db.session.execute(events.execution_options(yield_per=REBUILD_BATCH_SIZE))
+    for rows in result.partitions():
+        count_chunk(rows, hourly)
+    for rows in archived_access_events(start, end, REBUILD_BATCH_SIZE):
+        count_chunk(rows, hourly)
+
+    add_to_rollups(hourly, db.session.connection())
+    return sum(hourly.values())
+
+def access_report(granularity, start, end, group_by=('user_id',), **filters):
+    """
+    Accesses per hour or day (`granularity`) in [start, end), broken down by the `group_by`
+    dimensions and restricted by `filters` (user_id, data_item, purpose; None means any).
+    Reads only the rollup table. Returns dicts ordered by bucket, then by the group_by values.
+    """
+    model = ROLLUPS[granularity]
+    group_columns = [getattr(model, name) for name in group_by]
+    stmt = (db.select(model.bucket_start, *group_columns, db.func.sum(model.accesses).label('accesses'))
+            .where(model.bucket_start >= start, model.bucket_start < end))
+    for name, value in filters.items():
+        if value is not None:
+            stmt = stmt.where(getattr(model, name) == value)
+    stmt = stmt.group_by(model.bucket_start, *group_columns).order_by(model.bucket_start, *group_columns)
+    return [{
+        'bucket_start': row.bucket_start.isoformat(),
+        **{name: row._mapping[name] for name in group_by},
+        'accesses': int(row.accesses)
+    } for row in db.session.execute(stmt)]
+
+@click.command('rebuild-access-rollups')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day to rebuild (default: all).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Day after the last one to rebuild.')
+@click.option('--numpy/--no-numpy', 'use_numpy', default=None, help='Force or disable vectorized counting.')
+@with_appcontext
+def rebuild_access_rollups_command(start, end, use_numpy):
+    """Recompute the hourly/daily access rollups from the raw access events, live and archived."""
+    counted = rebuild_rollups(start, end, use_numpy=use_numpy)
+    db.session.commit()
+    click.echo(f'Rolled up {counted} access events.')
@@ -0,0 +1,85 @@
+import sqlite3
+import time
+import click
+from functools import wraps
+from flask import current_app, g, has_request_context, session
+from flask.cli import with_appcontext
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+
+# --- Read/write routing ---
+# With DATABASE_REPLICA_URL set, the engine of the 'replica' bind serves the reads of views marked
+# @read_replica (the reporting pages). Everything else, writes and anything executed while the
+# session flushes always use the primary. After a commit that wrote rows, the user's own requests
+# stick to the primary for REPLICA_STICKY_SECONDS, so they see their own writes even if the
+# replica lags behind.
+
+REPLICA_BIND = 'replica'
+STICKY_KEY = '_primary_until' # Flask session key holding the end of the stickiness window
+
+def configure_replica(app):
+    """Adds the replica bind from DATABASE_REPLICA_URL; call before db.init_app(app)."""
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = replica_url
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+def reads_from_replica():
+    """True if reads in the current request may go to the replica."""
+    if not has_request_context() or not g.get('read_replica'):
+        return False
+    return session.get(STICKY_KEY, 0) < time.time()
+
+def read_replica(f):
+    """Marks a read-only view whose queries may be served by the replica."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+class RoutingSession(Session):
+    """db.session class sending the reads of @read_replica views to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, UpdateBase)
+                and REPLICA_BIND in self._db.engines and reads_from_replica()):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# Note which transactions wrote, whether through a flush or an insert/update/delete statement
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_flush(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _remember_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_to_primary(db_session):
+    if db_session.info.pop('wrote', False) and has_request_context():
+        session[STICKY_KEY] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_write(db_session, previous_transaction):
+    db_session.info.pop('wrote', None)
+
+@click.command('sync-replica')
+@with_appcontext
+def sync_replica_command():
+    """Copies a SQLite primary onto a SQLite replica (local testing of the read/write split)."""
+    from extensions import db
+
+    if REPLICA_BIND not in db.engines:
+        raise click.ClickException('DATABASE_REPLICA_URL is not set.')
+    primary, replica = db.engines[None], db.engines[REPLICA_BIND]
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise click.ClickException('Only SQLite pairs can be synced; use the database\'s own replication otherwise.')
+    replica.dispose()
+    with sqlite3.connect(primary.url.database) as source, sqlite3.connect(replica.url.database) as target:
+        source.backup(target)
+    click.echo(f'Copied {primary.url.database} to {replica.url.database}.')
@@ -0,0 +1,241 @@
+import os
+import socket
+import threading
+import click
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Assignment, Reminder, SchedulerRun, SchedulerLease, OPEN_STATUSES
+from answers import upsert_statement
+from stats import adjust_counters, status_counter
+from summaries import refresh_trainee_summaries
+
+# --- Due date scheduler ---
+# Assignment.due_date is acted on here, with set-based statements rather than per-row ORM writes.
+# Each run walks the ix_assignment_status_due_date index once per open status:
+#   - open assignments past their due date get status 'overdue' (UPDATE ... WHERE id IN batch AND
+#     status = <the status they were read with>, so an assignment a trainee submitted meanwhile is
+#     left alone) and an 'overdue' reminder is queued for each. The UPDATE bumps Assignment.version
+#     like any ORM write, so a submit that read the assignment before it was marked fails its
+#     compare-and-swap instead of overwriting the status behind the counters' back;
+#     answers.submit_assessment then submits the overdue assignment again;
+#   - open assignments due within REMINDER_LEAD_HOURS get a 'due_soon' reminder.
+# Marked rows leave the scanned index range, so every overdue batch costs the same however many
+# have been done. Reminders are inserted with INSERT ... SELECT guarded by NOT EXISTS (and the
+# uq_reminder_assignment_kind index), so reruns and concurrent runs queue each one only once.
+# Every batch commits on its own, with the dashboard counters and trainee summaries adjusted in
+# the same transaction, and each run is recorded as a SchedulerRun row.
+#
+# Runs with `flask run-scheduler` (from cron), or every SCHEDULER_INTERVAL_SECONDS on a thread in
+# each web process when that is set. Only the process holding the SchedulerLease row runs then: each
+# thread takes or renews it before a run, for two intervals, so another worker (on any host) takes
+# over once the holder has missed a run. A run that outlasts the lease may overlap the next
+# holder's; that is safe (see above), just wasted work. Use one of the two, not both.
+
+def queue_reminders(kind, assignment_clauses, now):
+    """
+    Queues a `kind` reminder for every assignment matching the clauses that has none yet.
+    Returns the number of reminders queued. Does not commit.
+    """
+    already_queued = db.select(Reminder.id).where(
+        Reminder.assignment_id == Assignment.id, Reminder.kind == kind
+    ).exists()
+    candidates = db.select(Assignment.id, Assignment.user_id, db.literal(kind), db.literal(now, db.DateTime)).where(
+        *assignment_clauses, ~already_queued
+    )
+    stmt = upsert_statement(Reminder)
+    if stmt is not None:
+        # A concurrent run may queue the same reminder between the NOT EXISTS check and the insert
+        stmt = stmt.from_select(['assignment_id', 'user_id', 'kind', 'created_at'], candidates).on_conflict_do_nothing()
+    else:
+        stmt = db.insert(Reminder).from_select(['assignment_id', 'user_id', 'kind', 'created_at'], candidates)
+    return db.session.execute(stmt).rowcount
+
+def mark_overdue_batch(status, now, limit):
+    """
+    Marks up to `limit` assignments with `status` that were due before `now` overdue, queues their
+    reminders and commits. Returns (assignments read, assignments marked, reminders queued).
+    """
+    rows = db.session.execute(
+        db.select(Assignment.id, Assignment.user_id, Assignment.due_date)
+        .where(Assignment.status == status, Assignment.due_date < now)
+        .order_by(Assignment.due_date)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return 0, 0, 0
+
+    # The due date range keeps the (status, due_date) index scans below to this batch; given only
+    # `status = ? AND id IN (...)`, SQLite walks every row with the status
+    in_batch = [Assignment.id.in_([row[0] for row in rows]), Assignment.due_date.between(rows[0][2], rows[-1][2])]
+    marked = db.session.execute(
+        db.update(Assignment)
+        .where(Assignment.status == status, *in_batch)
+        .values(status='overdue', version=Assignment.version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    queued = queue_reminders('overdue', [Assignment.status == 'overdue', *in_batch], now)
+
+    # The UPDATE bypasses the ORM flush hooks, so keep the counters and summaries in step here
+    adjust_counters({status_counter(status): -marked, status_counter('overdue'): marked})
+    user_ids = sorted({row[1] for row in rows})
+    refresh_trainee_summaries(user_ids)
+    db.session.commit()
+    return len(rows), marked, queued
+
+def queue_due_soon_batch(status, now, until, after, limit):
+    """
+    Queues 'due_soon' reminders for up to `limit` assignments with `status` due in [now, until),
+    in (due_date, id) order after the `after` key, and commits. Returns (last key or None when
+    done, reminders queued).
+    """
+    stmt = (db.select(Assignment.id, Assignment.due_date)
+            .where(Assignment.status == status, Assignment.due_date >= now, Assignment.due_date < until))
+    if after is not None:
+        due_date, assignment_id = after
+        stmt = stmt.where(db.or_(Assignment.due_date > due_date,
+                                 db.and_(Assignment.due_date == due_date, Assignment.id > assignment_id)))
+    rows = db.session.execute(stmt.order_by(Assignment.due_date, Assignment.id).limit(limit)).all()
+    if not rows:
+        return None, 0
+
+    queued = queue_reminders('due_soon', [Assignment.status == status, Assignment.id.in_([row[0] for row in rows]),
+                                          Assignment.due_date.between(rows[0][1], rows[-1][1])], now)
+    db.session.commit()
+    return (rows[-1][1], rows[-1][0]), queued
+
+def run_due_dates(batch_size=10000, reminder_lead=timedelta(hours=24), now=None):
+    """
+    Marks every open assignment past its due date overdue and queues the overdue and due soon
+    reminders, in batches of `batch_size`. Records and returns the SchedulerRun.
+    """
+    now = now or datetime.utcnow()
+    run = SchedulerRun(started_at=datetime.utcnow())
+    db.session.add(run)
+    db.session.commit()
+
+    marked_overdue = reminders_queued = batches = 0
+    try:
+        for status in OPEN_STATUSES:
+            while True:
+                read, marked, queued = mark_overdue_batch(status, now, batch_size)
+                if not read:
+                    break
+                batches += 1
+                marked_overdue += marked
+                reminders_queued += queued
+
+        for status in OPEN_STATUSES:
+            after = None
+            while True:
+                after, queued = queue_due_soon_batch(status, now, now + reminder_lead, after, batch_size)
+                if after is None:
+                    break
+                batches += 1
+                reminders_queued += queued
+    except Exception as e:
+        db.session.rollback()
+        run.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        run.finished_at = datetime.utcnow()
+        run.marked_overdue = marked_overdue
+        run.reminders_queued = reminders_queued
+        run.batches = batches
+        db.session.commit()
+    return run
+
+# The lease row the in-process schedulers compete for
+LEASE_NAME = 'due-dates'
+
+def acquire_lease(holder, now, duration):
+    """
+    Takes the scheduler lease for `holder` until `now` + `duration` if it is free, expired or
+    already held by `holder`, and commits. Returns True if `holder` now holds it.
+    """
+    until = now + duration
+    # A conditional UPDATE is atomic: of two processes taking an expired lease, only one matches
+    taken = db.session.execute(
+        db.update(SchedulerLease)
+        .where(SchedulerLease.name == LEASE_NAME,
+               db.or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now))
+        .values(holder=holder, expires_at=until)
+    ).rowcount
+    if not taken:
+        # No row yet (first run): the first insert wins
+        values = {'name': LEASE_NAME, 'holder': holder, 'expires_at': until}
+        stmt = upsert_statement(SchedulerLease)
+        if stmt is not None:
+            taken = db.session.execute(stmt.values(**values).on_conflict_do_nothing()).rowcount
+        else:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(SchedulerLease).values(**values))
+                taken = 1
+            except IntegrityError:
+                taken = 0
+    db.session.commit()
+    return taken == 1
+
+def run_configured(app):
+    """run_due_dates() with the SCHEDULER_* settings of `app`, logging the run's metrics."""
+    run = run_due_dates(app.config['SCHEDULER_BATCH_SIZE'], timedelta(hours=app.config['REMINDER_LEAD_HOURS']))
+    app.logger.info('Scheduler run %s: %d marked overdue, %d reminders queued, %d batches in %.2f s',
+                    run.id, run.marked_overdue, run.reminders_queued, run.batches, run.duration)
+    return run
+
+class DueDateScheduler:
+    """
+    The optional in-process thread that calls run_due_dates() every SCHEDULER_INTERVAL_SECONDS,
+    while this process holds the scheduler lease.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.interval = 0
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def configure(self, app):
+        """Applies SCHEDULER_INTERVAL_SECONDS; 0 leaves scheduling to `flask run-scheduler`."""
+        self.app = app
+        self.interval = app.config.get('SCHEDULER_INTERVAL_SECONDS', 0)
+        if self.interval > 0:
+            app.before_request(self.ensure_started)
+
+    def ensure_started(self):
+        # Started lazily on the first request, so each forked web worker runs its own thread
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='due-date-scheduler', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        holder = f'{socket.gethostname()}:{os.getpid()}'
+        lease = timedelta(seconds=2 * self.interval)
+        stopped = threading.Event() # Never set; daemon threads end with the process
+        while not stopped.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    if acquire_lease(holder, datetime.utcnow(), lease):
+                        run_configured(self.app)
+                except Exception:
+                    self.app.logger.exception('Scheduler run failed')
+
+due_date_scheduler = DueDateScheduler()
+# A thread started in the parent does not survive a fork; the child starts its own
+os.register_at_fork(after_in_child=due_date_scheduler._reset)
+
+@click.command('run-scheduler')
+@with_appcontext
+def run_scheduler_command():
+    """Mark open assignments past their due date overdue and queue due date reminders."""
+    run = run_configured(current_app)
+    click.echo(f'Marked {run.marked_overdue} assignments overdue and queued {run.reminders_queued} reminders '
+               f'in {run.batches} batches ({run.duration:.2f} s).')
@@ -0,0 +1,166 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.orm import aliased
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from models import db, Assignment, Progress, Answer, Reminder
+from answers import store_answer_bodies
+from search import install_search_indexes
+from stats import rebuild_statistics
+from summaries import rebuild_trainee_summaries
+
+# --- Schema upgrades for existing databases ---
+# db.create_all() only creates missing tables; it never adds columns or indexes to a table
+# that already exists. upgrade_database() fills that gap for app.db files created before
+# the columns and indexes in models.py were declared.
+
+def delete_duplicates(model, columns):
+    """
+    Deletes rows that share the same values for `columns`, keeping the newest (highest id) row.
+    Returns the number of rows removed.
+    """
+    newest_ids = db.select(db.func.max(model.id)).group_by(*columns)
+    result = db.session.execute(db.delete(model).where(model.id.not_in(newest_ids)))
+    return result.rowcount
+
+def untouched(assignment):
+    """Clause: `assignment` (the model or an alias) was never started, so nothing refers to it but reminders."""
+    return db.and_(assignment.status == 'not_started',
+                   ~db.select(Progress.id).where(Progress.assignment_id == assignment.id).exists(),
+                   ~db.select(Answer.id).where(Answer.assignment_id == assignment.id).exists())
+
+def delete_duplicate_assignments():
+    """
+    Deletes never-started assignments of an item the trainee holds another assignment of, which
+    is either older or has been worked on, with their reminders. Returns the number of rows
+    removed. Duplicates that have both been worked on are left alone, and block the unique indexes.
+    """
+    removed = 0
+    for item_column in ('course_id', 'assessment_id'):
+        other = aliased(Assignment)
+        item, other_item = getattr(Assignment, item_column), getattr(other, item_column)
+        kept_instead = db.select(other.id).where(
+            other.user_id == Assignment.user_id, other_item == item, other.id != Assignment.id,
+            db.or_(other.id < Assignment.id, ~untouched(other))
+        ).exists()
+        duplicate_ids = db.session.execute(
+            db.select(Assignment.id).where(item.isnot(None), untouched(Assignment), kept_instead)).scalars().all()
+        if duplicate_ids:
+            db.session.execute(db.delete(Reminder).where(Reminder.assignment_id.in_(duplicate_ids)))
+            removed += db.session.execute(db.delete(Assignment).where(Assignment.id.in_(duplicate_ids))).rowcount
+    return removed
+
+def column_ddl(column, dialect):
+    """The column definition for ALTER TABLE ... ADD COLUMN."""
+    if column.nullable or column.server_default is not None:
+        return CreateColumn(column).compile(dialect=dialect)
+    # The rows already there have no value yet: the column is added nullable and filled in by a
+    # data migration (see move_answer_texts)
+    return f'{dialect.identifier_preparer.format_column(column)} {column.type.compile(dialect=dialect)}'
+
+def add_missing_columns():
+    """
+    Adds the columns declared in models.py that existing tables lack, with ALTER TABLE ... ADD COLUMN.
+    New NOT NULL columns without a server default are added nullable, for a data migration to fill.
+    Returns the names ('table.column') of the columns added.
+    """
+    added = []
+    with db.engine.begin() as connection:
+        inspector = db.inspect(connection)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    connection.execute(db.text(
+                        f'ALTER TABLE {connection.dialect.identifier_preparer.format_table(table)} '
+                        f'ADD COLUMN {column_ddl(column, connection.dialect)}'
+                    ))
+                    added.append(f'{table.name}.{column.name}')
+    return added
+
+def move_answer_texts(batch_size=1000):
+    """
+    Moves the texts of databases created before answer bodies (the answer.answer_text column) into
+    shared AnswerBody rows, then drops the column and its old search index. Commits every batch,
+    so an interrupted run continues where it stopped. Returns the number of answers moved.
+    """
+    with db.engine.connect() as connection:
+        columns = {column['name'] for column in db.inspect(connection).get_columns('answer')}
+    if 'answer_text' not in columns:
+        return 0
+
+    with db.engine.begin() as connection:
+        if connection.dialect.name == 'sqlite':
+            for trigger in ('answer_fts_ai', 'answer_fts_ad', 'answer_fts_au'):
+                connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+            connection.exec_driver_sql('DROP TABLE IF EXISTS answer_fts')
+        elif connection.dialect.name == 'postgresql':
+            connection.exec_driver_sql('DROP INDEX IF EXISTS ix_answer_answer_text_tsv')
+
+    moved = 0
+    answer_text = db.column('answer_text')
+    while True:
+        rows = db.session.execute(
+            db.select(Answer.id, answer_text).select_from(Answer)
+            .where(Answer.body_id.is_(None)).order_by(Answer.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        body_ids = store_answer_bodies(text for _, text in rows)
+        db.session.execute(db.update(Answer), [{'id': answer_id, 'body_id': body_ids[text]} for answer_id, text in rows])
+        db.session.commit()
+        moved += len(rows)
+
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql('ALTER TABLE answer DROP COLUMN answer_text')
+    return moved
+
+def upgrade_database():
+    """
+    Creates any missing tables, columns and indexes declared in models.py, moves answer texts
+    into shared bodies, and recomputes the dashboard counters and trainee progress summaries.
+    Duplicate Answer/Progress rows and never-started duplicate assignments that would violate the
+    unique indexes are removed first. Returns a dict of {table name: duplicate rows removed}.
+    """
+    db.create_all()
+    add_missing_columns()
+
+    removed = {
+        'answer': delete_duplicates(Answer, (Answer.assignment_id, Answer.question_id, Answer.user_id)),
+        'progress': delete_duplicates(Progress, (Progress.assignment_id,)),
+        'assignment': delete_duplicate_assignments(),
+    }
+    db.session.commit()
+    move_answer_texts()
+    rebuild_statistics()
+    rebuild_trainee_summaries()
+    db.session.commit()
+
+    # IF NOT EXISTS rather than checkfirst: reflection does not see expression indexes on SQLite
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+        install_search_indexes(connection)
+    return removed
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the database tables, indexes and search indexes."""
+    db.create_all()
+    with db.engine.begin() as connection:
+        install_search_indexes(connection)
+    click.echo('Initialized the database.')
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Add missing tables and indexes to an existing database."""
+    removed = upgrade_database()
+    for table, count in removed.items():
+        if count:
+            click.echo(f'Removed {count} duplicate {table} rows.')
+    click.echo('Database schema is up to date.')
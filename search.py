@@ -0,0 +1,176 @@
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+
+from models import db, Question, Answer, AnswerBody
+
+# --- Full-text search over question and answer text ---
+# SQLite: an external-content FTS5 table per searchable column, kept in sync with its source
+#         table by triggers, so bulk inserts/upserts are indexed too. Ranked with bm25().
+# PostgreSQL: a GIN index on to_tsvector(...) of the column, ranked with ts_rank().
+# Other databases fall back to an unranked ILIKE scan.
+# Answers are indexed per AnswerBody (so shared text is indexed once) and matches are joined back
+# to the answers using them. On SQLite the FTS table reads bodies through a view that decompresses
+# them with inflate_text(), which snippet() only calls for the rows of the page being shown.
+
+# Highlight delimiters; replaced with <mark> tags after the rest of the text is HTML-escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+class SearchIndex:
+    """
+    Describes one searchable text column. Results are rows of `result_model` whose `result_key`
+    column holds the id of the matching `model` row (by default, the matching rows themselves).
+    `sqlite_value` is an SQL expression computing the indexed text on SQLite, with {row}
+    standing for the row prefix (e.g. 'new.'); the FTS table then reads it from a view.
+    `related` names the many-to-one relationships of the result model that the results page
+    shows; they are joined into the search query instead of loaded once per result.
+    """
+
+    def __init__(self, model, column, snippet_tokens=None, result_model=None, result_key='id', sqlite_value=None,
+                 related=()):
+        self.model = model
+        self.table = model.__tablename__
+        self.column = column
+        self.fts_table = f'{self.table}_fts'
+        self.snippet_tokens = snippet_tokens # None highlights the whole text
+        self.result_model = result_model or model
+        self.result_key = result_key
+        self.sqlite_value = sqlite_value
+        self.content_view = f'{self.table}_fts_content' if sqlite_value else None
+        self.related = related
+
+    def value(self, row=''):
+        return self.sqlite_value.format(row=row) if self.sqlite_value else f'{row}{self.column}'
+
+    def sqlite_ddl(self):
+        t, c, fts = self.table, self.column, self.fts_table
+        statements = []
+        content = t
+        if self.content_view:
+            statements.append(f"CREATE VIEW IF NOT EXISTS {self.content_view} AS "
+                              f"SELECT id, {self.value()} AS {c} FROM {t}")
+            content = self.content_view
+        watched = '' if self.sqlite_value else f' OF {c}'
+        return statements + [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{c}, content='{content}', content_rowid='id', tokenize='porter unicode61')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {t} BEGIN "
+            f"INSERT INTO {fts}(rowid, {c}) VALUES (new.id, {self.value('new.')}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {t} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {c}) VALUES ('delete', old.id, {self.value('old.')}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE{watched} ON {t} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {c}) VALUES ('delete', old.id, {self.value('old.')}); "
+            f"INSERT INTO {fts}(rowid, {c}) VALUES (new.id, {self.value('new.')}); END",
+        ]
+
+    def postgresql_ddl(self):
+        return [f"CREATE INDEX IF NOT EXISTS ix_{self.table}_{self.column}_tsv ON {self.table} "
+                f"USING GIN (to_tsvector('english', {self.column}))"]
+
+SEARCH_INDEXES = {
+    'questions': SearchIndex(Question, 'question_text', related=('assessment_parent',)),
+    'answers': SearchIndex(AnswerBody, 'text', snippet_tokens=32, result_model=Answer, result_key='body_id',
+                           sqlite_value='coalesce({row}text, inflate_text({row}compressed))',
+                           related=('responder', 'question_parent')),
+}
+
+def install_search_index(connection, index):
+    """
+    Creates the FTS table and triggers (SQLite) or GIN index (PostgreSQL) for one SearchIndex
+    if missing. A newly created SQLite FTS table is rebuilt from its source table, so rows
+    written before search was installed are indexed too.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (index.fts_table,)
+        ).first()
+        for statement in index.sqlite_ddl():
+            connection.exec_driver_sql(statement)
+        if not exists:
+            connection.exec_driver_sql(f"INSERT INTO {index.fts_table}({index.fts_table}) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        for statement in index.postgresql_ddl():
+            connection.exec_driver_sql(statement)
+
+def install_search_indexes(connection):
+    """Installs every missing search index on `connection`; used by init-db and upgrade-db for existing tables."""
+    for index in SEARCH_INDEXES.values():
+        install_search_index(connection, index)
+
+def _search_index_ddl_listeners(index):
+    def after_create(target, connection, **kw):
+        install_search_index(connection, index)
+
+    def after_drop(target, connection, **kw):
+        if connection.dialect.name == 'sqlite':
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS {index.fts_table}')
+            if index.content_view:
+                connection.exec_driver_sql(f'DROP VIEW IF EXISTS {index.content_view}')
+    return after_create, after_drop
+
+# Install alongside the source tables on db.create_all(); drop with them on db.drop_all()
+for _index in SEARCH_INDEXES.values():
+    _after_create, _after_drop = _search_index_ddl_listeners(_index)
+    event.listen(_index.model.__table__, 'after_create', _after_create)
+    event.listen(_index.model.__table__, 'after_drop', _after_drop)
+
+def fts_query(terms):
+    """Turns free text into a safe FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r'\w+', terms)
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def render_highlight(text):
+    """HTML-escapes search output and turns the highlight delimiters into <mark> tags."""
+    escaped = str(escape(text or ''))
+    return Markup(escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+def search(kind, terms, page=1, per_page=20, filters=()):
+    """
+    Full-text searches one of SEARCH_INDEXES, best matches first.
+    `filters` are extra WHERE clauses on the result model.
+    Returns (results, has_next) where results is a list of (result instance, highlighted Markup).
+    """
+    index = SEARCH_INDEXES[kind]
+    model = index.result_model
+    key = getattr(model, index.result_key)
+    column = getattr(index.model, index.column)
+    page = max(page, 1)
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        match = fts_query(terms)
+        if match is None:
+            return [], False
+        fts = db.table(index.fts_table, db.column('rowid'))
+        if index.snippet_tokens:
+            highlighted = db.func.snippet(db.literal_column(index.fts_table), 0, MARK_START, MARK_END,
+                                          '...', index.snippet_tokens)
+        else:
+            highlighted = db.func.highlight(db.literal_column(index.fts_table), 0, MARK_START, MARK_END)
+        stmt = (db.select(model, highlighted)
+                .join(fts, fts.c.rowid == key)
+                .where(db.literal_column(index.fts_table).op('MATCH')(match), *filters)
+                .order_by(db.func.bm25(db.literal_column(index.fts_table))))
+    elif dialect == 'postgresql':
+        vector = db.func.to_tsvector('english', column)
+        query = db.func.plainto_tsquery('english', terms)
+        highlighted = db.func.ts_headline('english', column, query, f'StartSel={MARK_START}, StopSel={MARK_END}')
+        stmt = (db.select(model, highlighted)
+                .where(vector.op('@@')(query), *filters)
+                .order_by(db.func.ts_rank(vector, query).desc()))
+    else:
+        stmt = db.select(model, column).where(column.ilike(f'%{terms}%'), *filters).order_by(model.id)
+    if dialect != 'sqlite' and index.model is not model:
+        stmt = stmt.join(index.model, key == index.model.id)
+    stmt = stmt.options(*(joinedload(getattr(model, name)) for name in index.related))
+
+    # Fetch one extra row to know whether another page follows
+    rows = db.session.execute(stmt.limit(per_page + 1).offset((page - 1) * per_page)).all()
+    results = [(instance, render_highlight(text)) for instance, text in rows[:per_page]]
+    return results, len(rows) > per_page
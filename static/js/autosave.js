@@ -0,0 +1,93 @@
+// Autosave for complete_assessment: each answer is PUT to the form's data-autosave-url (with the
+// question id in place of the trailing 0) once typing pauses for data-autosave-delay ms, or when the
+// textarea loses focus. On submit, pending saves are flushed first; if they all succeed the answers
+// are left out of the final POST, otherwise the form is submitted with every answer as a fallback.
+// Each save answers with the assignment's version, which is copied into the form's version field:
+// the submit is refused if the assignment has moved past the version this page last saw.
+(function () {
+    const form = document.querySelector('form[data-autosave-url]');
+    if (!form) {
+        return;
+    }
+    const urlTemplate = form.dataset.autosaveUrl;
+    const delay = parseInt(form.dataset.autosaveDelay, 10) || 1000;
+    const csrfInput = form.querySelector('input[name="csrf_token"]');
+    const versionInput = form.querySelector('input[name="version"]');
+    const fields = Array.from(form.querySelectorAll('textarea[data-question-id]'));
+    const state = new Map(); // question id -> {timer, saved text, in-flight request}
+
+    function showStatus(questionId, message) {
+        const status = form.querySelector(`[data-autosave-status="${questionId}"]`);
+        if (status) {
+            status.textContent = message;
+        }
+    }
+
+    function save(field) {
+        const questionId = field.dataset.questionId;
+        const entry = state.get(questionId);
+        clearTimeout(entry.timer);
+        entry.timer = null;
+        const text = field.value;
+        if (text === entry.saved) {
+            return entry.request || Promise.resolve(true);
+        }
+        // Saves of one question run one after another, so an older text never lands last
+        const previous = entry.request || Promise.resolve(true);
+        entry.request = previous.then(function () {
+            showStatus(questionId, 'Saving...');
+            return fetch(urlTemplate.replace(/0$/, questionId), {
+                method: 'PUT',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({answer_text: text, csrf_token: csrfInput ? csrfInput.value : ''}),
+                credentials: 'same-origin'
+            });
+        }).then(function (response) {
+            if (response.ok) {
+                return response.json().then(function (result) {
+                    // Saves of different questions can finish out of order; versions only grow
+                    if (versionInput && result.version > (parseInt(versionInput.value, 10) || 0)) {
+                        versionInput.value = result.version;
+                    }
+                    entry.saved = text;
+                    showStatus(questionId, text.trim() ? 'Saved' : '');
+                    return true;
+                });
+            }
+            showStatus(questionId, response.status === 401
+                ? 'Not saved: your session has expired. Log in again in another tab, then keep typing.'
+                : 'Not saved; it will be sent when you submit.');
+            return false;
+        }).catch(function () {
+            showStatus(questionId, 'Not saved (offline?); it will be sent when you submit.');
+            return false;
+        });
+        return entry.request;
+    }
+
+    fields.forEach(function (field) {
+        state.set(field.dataset.questionId, {timer: null, saved: field.value, request: null});
+        field.addEventListener('input', function () {
+            const entry = state.get(field.dataset.questionId);
+            clearTimeout(entry.timer);
+            entry.timer = setTimeout(function () { save(field); }, delay);
+        });
+        field.addEventListener('blur', function () { save(field); });
+    });
+
+    let submitting = false;
+    form.addEventListener('submit', function (event) {
+        if (submitting) {
+            return;
+        }
+        event.preventDefault();
+        Promise.all(fields.map(save)).then(function (results) {
+            submitting = true;
+            if (results.every(Boolean)) {
+                // Everything is saved: post only the CSRF token (disabled fields are not sent)
+                fields.forEach(function (field) { field.disabled = true; });
+            }
+            form.requestSubmit ? form.requestSubmit() : form.submit();
+        });
+    });
+})();
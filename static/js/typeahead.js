@@ -0,0 +1,84 @@
+// Typeahead pickers for assign_items. Each input[data-typeahead-url] queries the lookup API
+// (?q=<typed prefix>) a moment after typing pauses. For a select field (courses, assessments) the
+// matches replace its options; for the trainees checkbox list they are offered in a list, and
+// clicking one adds it as a checked checkbox.
+(function () {
+    const DELAY_MS = 250;
+
+    function search(input, onResults) {
+        let timer = null;
+        let latest = 0;
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                const url = new URL(input.dataset.typeaheadUrl, window.location.href);
+                url.searchParams.set('q', input.value.trim());
+                const request = ++latest;
+                fetch(url, {credentials: 'same-origin'})
+                    .then(function (response) { return response.ok ? response.json() : {results: []}; })
+                    .then(function (data) {
+                        if (request === latest) { // Ignore answers to older keystrokes
+                            onResults(data.results);
+                        }
+                    });
+            }, DELAY_MS);
+        });
+    }
+
+    function fillSelect(select, results) {
+        const placeholder = select.options[0];
+        const selected = select.selectedIndex > 0 ? select.options[select.selectedIndex] : null;
+        select.replaceChildren(placeholder);
+        if (selected && !results.some(function (item) { return String(item.id) === selected.value; })) {
+            select.appendChild(selected); // Keep the current choice selectable
+        }
+        results.forEach(function (item) {
+            select.appendChild(new Option(item.label, item.id, false, selected !== null && String(item.id) === selected.value));
+        });
+    }
+
+    function offerCheckboxes(input, list, container, results) {
+        list.replaceChildren();
+        results.forEach(function (item) {
+            if (container.querySelector(`input[value="${item.id}"]`)) {
+                return;
+            }
+            const option = document.createElement('li');
+            option.textContent = item.label;
+            option.tabIndex = 0;
+            option.className = 'px-3 py-1 cursor-pointer hover:bg-gray-100';
+            option.addEventListener('click', function () {
+                const label = document.createElement('label');
+                label.className = 'mr-4';
+                const checkbox = document.createElement('input');
+                checkbox.type = 'checkbox';
+                checkbox.name = input.dataset.typeaheadTarget;
+                checkbox.value = item.id;
+                checkbox.checked = true;
+                label.append(checkbox, ' ' + item.label);
+                container.appendChild(label);
+                option.remove();
+            });
+            option.addEventListener('keydown', function (event) {
+                if (event.key === 'Enter') {
+                    event.preventDefault();
+                    option.click();
+                }
+            });
+            list.appendChild(option);
+        });
+        list.classList.toggle('hidden', list.children.length === 0);
+    }
+
+    document.querySelectorAll('input[data-typeahead-url]').forEach(function (input) {
+        const target = input.dataset.typeaheadTarget;
+        const select = document.querySelector(`select[name="${target}"]`);
+        if (select) {
+            search(input, function (results) { fillSelect(select, results); });
+            return;
+        }
+        const list = document.querySelector(`[data-typeahead-results="${target}"]`);
+        const container = document.getElementById(`${target}-selected`);
+        search(input, function (results) { offerCheckboxes(input, list, container, results); });
+    });
+})();
@@ -0,0 +1,107 @@
+import click
+from collections import Counter
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect
+
+from models import db, User, Course, Assessment, Assignment, Statistic
+from answers import upsert_statement
+
+# --- Incrementally maintained dashboard counters ---
+# Row counts live in the Statistic table. ORM inserts/deletes (and Assignment status changes)
+# are counted in the session's after_flush hook and applied in the same transaction, so the
+# counters commit or roll back together with the rows they count. Set-based writes that bypass
+# the ORM (see assignments.py) call adjust_counters() themselves.
+
+COUNTED_MODELS = {
+    User: 'users',
+    Course: 'courses',
+    Assessment: 'assessments',
+    Assignment: 'assignments',
+}
+
+ASSIGNMENT_STATUSES = ('not_started', 'in_progress', 'completed', 'overdue')
+
+def status_counter(status):
+    return f'assignments_{status}'
+
+def adjust_counters(deltas, connection=None):
+    """
+    Adds {counter name: delta} to the Statistic table, creating missing counters.
+    Runs on `connection` if given (inside a flush), otherwise on db.session. Does not commit.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    execute = connection.execute if connection is not None else db.session.execute
+    stmt = upsert_statement(Statistic)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_update(index_elements=['name'],
+                                          set_={'value': Statistic.value + stmt.excluded.value})
+        execute(stmt, [{'name': name, 'value': delta} for name, delta in deltas.items()])
+        return
+
+    for name, delta in deltas.items():
+        updated = execute(db.update(Statistic).where(Statistic.name == name)
+                          .values(value=Statistic.value + delta)).rowcount
+        if not updated:
+            execute(db.insert(Statistic).values(name=name, value=delta))
+
+def flush_deltas(session):
+    """Counter changes implied by the objects about to be written by the current flush."""
+    deltas = Counter()
+    for obj in session.new:
+        name = COUNTED_MODELS.get(type(obj))
+        if name:
+            deltas[name] += 1
+        if isinstance(obj, Assignment):
+            deltas[status_counter(obj.status or 'not_started')] += 1
+    for obj in session.deleted:
+        name = COUNTED_MODELS.get(type(obj))
+        if name:
+            deltas[name] -= 1
+        if isinstance(obj, Assignment):
+            deltas[status_counter(obj.status)] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Assignment):
+            history = inspect(obj).attrs.status.history
+            if history.deleted and history.added:
+                deltas[status_counter(history.deleted[0])] -= 1
+                deltas[status_counter(history.added[0])] += 1
+    return deltas
+
+@event.listens_for(db.session, 'after_flush')
+def _count_flushed_rows(session, flush_context):
+    adjust_counters(flush_deltas(session), connection=session.connection())
+
+def rebuild_statistics():
+    """Recomputes every counter from scratch (full scans). Does not commit."""
+    counts = {name: db.session.execute(db.select(db.func.count()).select_from(model)).scalar()
+              for model, name in COUNTED_MODELS.items()}
+    for status in ASSIGNMENT_STATUSES:
+        counts[status_counter(status)] = 0
+    for status, count in db.session.execute(
+            db.select(Assignment.status, db.func.count()).group_by(Assignment.status)):
+        counts[status_counter(status)] = count
+
+    db.session.execute(db.delete(Statistic))
+    db.session.execute(db.insert(Statistic), [{'name': name, 'value': value} for name, value in counts.items()])
+    return counts
+
+def dashboard_statistics():
+    """
+    Returns the admin dashboard counters as a dict, all from the Statistic table. Overdue
+    assignments have their own status (set by scheduler.py), so they are counted like the others.
+    """
+    stats = {name: 0 for name in COUNTED_MODELS.values()}
+    stats.update({status_counter(status): 0 for status in ASSIGNMENT_STATUSES})
+    stats.update(dict(db.session.execute(db.select(Statistic.name, Statistic.value)).all()))
+    return stats
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Recompute the admin dashboard counters from the database."""
+    counts = rebuild_statistics()
+    db.session.commit()
+    for name, value in sorted(counts.items()):
+        click.echo(f'{name}: {value}')
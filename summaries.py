@@ -0,0 +1,109 @@
+import click
+from datetime import datetime
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect
+
+from models import db, Assignment, Progress, Answer, TraineeProgressSummary
+from database import UPSERT_DIALECTS
+
+# --- Per-trainee progress summaries ---
+# Each trainee's TraineeProgressSummary row is recomputed from their assignments (a handful of
+# rows on the ix_assignment_user_id index) whenever any of them is written. ORM writes are picked
+# up by the session's after_flush hook, in the same transaction; set-based writes that bypass
+# the ORM (see assignments.py) call refresh_trainee_summaries() themselves. Answer writes refresh
+# the summary too, so refreshed_at stamps any change to what is shown about the trainee (cache.py);
+# autosaved answers only touch refreshed_at (touch_trainee_summaries).
+# Rows are upserted (INSERT ... SELECT ... ON CONFLICT DO UPDATE), so two transactions refreshing
+# the same trainee at once (a bulk assign or scheduler batch during that trainee's submit) wait
+# for each other instead of both inserting the row.
+
+SUMMARY_COLUMNS = ['user_id', 'total', 'not_started', 'in_progress', 'completed', 'overdue', 'refreshed_at']
+
+def refresh_trainee_summaries(user_ids, connection=None):
+    """
+    Recomputes the summary rows of the given trainees.
+    `user_ids` is a list of ids or a SELECT of user ids. Runs on `connection` if given
+    (inside a flush), otherwise on db.session. Does not commit.
+    """
+    execute = connection.execute if connection is not None else db.session.execute
+    dialect = (connection or db.session.get_bind()).dialect.name
+    now = datetime.utcnow()
+
+    def status_count(condition):
+        return db.func.sum(db.case((condition, 1), else_=0))
+
+    totals = db.select(
+        Assignment.user_id,
+        db.func.count(),
+        status_count(Assignment.status == 'not_started'),
+        status_count(Assignment.status == 'in_progress'),
+        status_count(Assignment.status == 'completed'),
+        status_count(Assignment.status == 'overdue'),
+        db.literal(now, db.DateTime)
+    ).group_by(Assignment.user_id)
+    if user_ids is not None:
+        totals = totals.where(Assignment.user_id.in_(user_ids))
+
+    delete = db.delete(TraineeProgressSummary)
+    if user_ids is not None:
+        delete = delete.where(TraineeProgressSummary.user_id.in_(user_ids))
+    insert = UPSERT_DIALECTS.get(dialect)
+    if insert is None:
+        execute(delete)
+        execute(db.insert(TraineeProgressSummary).from_select(SUMMARY_COLUMNS, totals))
+        return
+
+    # Only trainees left without assignments lose their row; the others are updated in place
+    has_assignments = db.select(Assignment.id).where(Assignment.user_id == TraineeProgressSummary.user_id).exists()
+    execute(delete.where(~has_assignments))
+    upsert = insert(TraineeProgressSummary).from_select(SUMMARY_COLUMNS, totals)
+    execute(upsert.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={column: upsert.excluded[column] for column in SUMMARY_COLUMNS[1:]}
+    ))
+
+def touch_trainee_summaries(user_ids):
+    """
+    Moves the trainees' refreshed_at forward without recounting, for writes that change what is
+    shown about them but not their assignment counts (an autosaved answer). Does not commit.
+    """
+    db.session.execute(db.update(TraineeProgressSummary)
+                       .where(TraineeProgressSummary.user_id.in_(user_ids))
+                       .values(refreshed_at=datetime.utcnow()))
+
+def rebuild_trainee_summaries():
+    """Recomputes every trainee's summary from scratch. Does not commit."""
+    refresh_trainee_summaries(None)
+
+def flushed_trainee_ids(session):
+    """Ids of trainees whose assignments (or their Progress rows or answers) are written by the current flush."""
+    user_ids = set()
+    assignment_ids = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Assignment):
+            user_ids.add(obj.user_id)
+            user_ids.update(inspect(obj).attrs.user_id.history.deleted)
+        elif isinstance(obj, Progress):
+            assignment_ids.add(obj.assignment_id)
+        elif isinstance(obj, Answer):
+            user_ids.add(obj.user_id)
+    if assignment_ids:
+        user_ids.update(session.connection().execute(
+            db.select(Assignment.user_id).where(Assignment.id.in_(assignment_ids))
+        ).scalars())
+    user_ids.discard(None)
+    return user_ids
+
+@event.listens_for(db.session, 'after_flush')
+def _refresh_flushed_summaries(session, flush_context):
+    user_ids = flushed_trainee_ids(session)
+    if user_ids:
+        refresh_trainee_summaries(sorted(user_ids), connection=session.connection())
+
+@click.command('rebuild-progress-summary')
+@with_appcontext
+def rebuild_progress_summary_command():
+    """Recompute every trainee's progress summary from their assignments."""
+    rebuild_trainee_summaries()
+    db.session.commit()
+    click.echo(f'Rebuilt {TraineeProgressSummary.query.count()} trainee progress summaries.')
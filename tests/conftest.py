@@ -0,0 +1,44 @@
+"""
+Shared fixtures: an app on a scratch SQLite file with one support user (id 1), and a test
+client logged in as a given user.
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from models import db, User
+
+class MomentStandIn:
+    # base.html calls a `moment` template global the app does not provide (see benchmarks/bench_routes.py)
+    def format(self, pattern):
+        return str(datetime.utcnow().year)
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        TRAINEES_PER_PAGE = 100
+
+    app = create_app(TestConfig)
+    app.jinja_env.globals.setdefault('moment', MomentStandIn)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='support', email='support@example.com', password_hash='x', role='support'))
+        db.session.commit()
+    return app
+
+def logged_in_client(app, user_id):
+    """A test client whose session is logged in as `user_id`."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,86 @@
+"""
+Tests for access event ingestion (POST /api/access-events and access_events.AccessEventWriter):
+per-line validation, deduplication on event_id, acknowledgement once rows are committed, and
+backpressure (503) as opposed to write failures (500).
+"""
+import json
+import threading
+
+import pytest
+
+import access_events
+from access_events import access_event_writer, IngestionBusy
+from conftest import logged_in_client
+from models import db, AccessEvent, AccessRollupDaily
+
+def ndjson(*events):
+    return '\n'.join(event if isinstance(event, str) else json.dumps(event) for event in events)
+
+def event(event_id, user_id=7):
+    return {'event_id': event_id, 'user_id': user_id, 'data_item': 'patient-42', 'purpose': 'treatment',
+            'occurred_at': '2024-03-01T10:00:00+00:00'}
+
+def post(client, body):
+    return client.post('/api/access-events', data=body, content_type='application/x-ndjson')
+
+def stored(app):
+    with app.app_context():
+        events = db.session.execute(db.select(AccessEvent.event_id).order_by(AccessEvent.event_id)).scalars().all()
+        accesses = db.session.execute(db.select(db.func.sum(AccessRollupDaily.accesses))).scalar() or 0
+        return events, accesses
+
+def test_invalid_lines_are_rejected_one_by_one(app):
+    response = post(logged_in_client(app, 1), ndjson(
+        event('e1'), 'not json', {'user_id': 7}, event('e2', user_id=2**31), '', event('e3', user_id='8')))
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['accepted'] == 2
+    assert [error['line'] for error in body['rejected']] == [2, 3, 4]
+    assert stored(app) == (['e1', 'e3'], 2)
+
+def test_retried_events_are_stored_and_counted_once(app):
+    client = logged_in_client(app, 1)
+    assert post(client, ndjson(event('e1'), event('e2'))).get_json()['accepted'] == 2
+    # A retry of the whole batch, and a duplicate within one batch
+    assert post(client, ndjson(event('e1'), event('e2'), event('e3'), event('e3'))).status_code == 200
+    assert stored(app) == (['e1', 'e2', 'e3'], 3)
+
+def test_writer_acknowledges_each_batch_once_committed(app):
+    received_at = access_events.parse_timestamp('2024-03-01T10:00:05')
+    batches = [access_events.parse_events([ndjson(event(f'{n}-{i}')) for i in range(n)], received_at)[0]
+               for n in (1, 2, 3)]
+    futures = [access_event_writer.submit(rows) for rows in batches]
+    assert [future.result(timeout=5) for future in futures] == [1, 2, 3]
+    assert len(stored(app)[0]) == 6
+
+def test_full_queue_is_refused_with_503(app, monkeypatch):
+    monkeypatch.setattr(access_event_writer, 'max_pending', 2)
+    with pytest.raises(IngestionBusy):
+        access_event_writer.submit(access_events.parse_events([ndjson(event(n)) for n in 'abc'], None)[0])
+    response = post(logged_in_client(app, 1), ndjson(event('e1'), event('e2'), event('e3')))
+    assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+    assert stored(app) == ([], 0)
+
+def test_unacknowledged_write_is_refused_with_503(app, monkeypatch):
+    release = threading.Event()
+    insert_events = access_events.insert_events
+    monkeypatch.setattr(access_events, 'insert_events', lambda rows: release.wait(5) and insert_events(rows))
+    monkeypatch.setattr(access_event_writer, 'ack_timeout', 0.05)
+    client = logged_in_client(app, 1)
+    response = post(client, ndjson(event('e1')))
+    release.set()
+    assert response.status_code == 503
+
+    # The sender retries; the late first write and the retry store the event once
+    monkeypatch.setattr(access_event_writer, 'ack_timeout', 5)
+    assert post(client, ndjson(event('e1'))).status_code == 200
+    assert stored(app) == (['e1'], 1)
+
+def test_failed_write_is_a_server_error_not_a_retry_hint(app, monkeypatch):
+    def broken_insert(rows):
+        raise RuntimeError('bug in the writer')
+    monkeypatch.setattr(access_events, 'insert_events', broken_insert)
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    response = post(logged_in_client(app, 1), ndjson(event('e1')))
+    assert response.status_code == 500
+    assert 'Retry-After' not in response.headers
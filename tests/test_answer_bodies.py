@@ -0,0 +1,109 @@
+"""
+Tests for shared answer bodies (answers.store_answer_bodies and prune_answer_bodies): identical
+texts are stored once, long texts are compressed on SQLite, and a body is deleted only once no
+live answer uses it, including when assignments are archived.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, User, Assessment, Question, Assignment, Progress, Answer, AnswerBody
+from answers import store_answer_bodies, upsert_answers, save_answer, answer_text_column
+from archive import archive_assignment_batch, load_archived_assignments
+
+@pytest.fixture
+def assignments(app):
+    """Two trainees' assignments of an assessment with two questions; returns their ids."""
+    with app.app_context():
+        trainees = [User(username=f'trainee{n}', email=f'trainee{n}@example.com', password_hash='x', role='trainee')
+                    for n in (1, 2)]
+        assessment = Assessment(title='Privacy basics')
+        db.session.add_all([*trainees, assessment])
+        db.session.flush()
+        db.session.add_all([Question(assessment_id=assessment.id, question_text=f'Question {n}') for n in (1, 2)])
+        pair = [Assignment(user_id=trainee.id, assessment_id=assessment.id, status='in_progress') for trainee in trainees]
+        db.session.add_all(pair)
+        db.session.commit()
+        return [assignment.id for assignment in pair]
+
+def question_ids():
+    return db.session.execute(db.select(Question.id).order_by(Question.id)).scalars().all()
+
+def body_texts():
+    """The text of every stored body, read back through SQL as the search index and exports do."""
+    return sorted(db.session.execute(db.select(answer_text_column())).scalars())
+
+def answer(assignment_id, answer_texts):
+    """upsert_answers() for the assignment's trainee."""
+    upsert_answers(assignment_id, db.session.get(Assignment, assignment_id).user_id, answer_texts)
+
+def answer_texts(assignment_id):
+    answers = Answer.query.filter_by(assignment_id=assignment_id).order_by(Answer.question_id).all()
+    return [answer.answer_text for answer in answers]
+
+def test_identical_texts_share_one_body(app, assignments):
+    with app.app_context():
+        first, second = question_ids()
+        answer(assignments[0], {first: 'I agree.', second: 'I agree.'})
+        answer(assignments[1], {first: 'I agree.', second: 'Something else'})
+        db.session.commit()
+
+        assert AnswerBody.query.count() == 2
+        assert len({answer.body_id for answer in Answer.query if answer.answer_text == 'I agree.'}) == 1
+        ids = store_answer_bodies(['I agree.', 'Something else', 'I agree.'])
+        assert set(ids) == {'I agree.', 'Something else'} and AnswerBody.query.count() == 2
+
+def test_bodies_from_the_threshold_up_are_compressed_and_read_back(app, assignments):
+    app.config['ANSWER_COMPRESS_MIN_BYTES'] = 100
+    short, at_threshold, long = 'a' * 99, 'b' * 100, 'Einwilligung erteilt. ' * 50
+    with app.app_context():
+        first, second = question_ids()
+        answer(assignments[0], {first: short, second: at_threshold})
+        answer(assignments[1], {first: long})
+        db.session.commit()
+
+        stored = {body.size: body for body in AnswerBody.query}
+        assert stored[99].text == short and stored[99].compressed is None
+        for text in (at_threshold, long):
+            body = stored[len(text.encode('utf-8'))]
+            assert body.text is None and body.compressed is not None
+            assert body.content == text
+        assert body_texts() == sorted([short, at_threshold, long])
+        assert answer_texts(assignments[0]) == [short, at_threshold]
+
+def test_overwriting_or_clearing_answers_prunes_only_unused_bodies(app, assignments):
+    with app.app_context():
+        first, second = question_ids()
+        answer(assignments[0], {first: 'Shared', second: 'Only here'})
+        answer(assignments[1], {first: 'Shared'})
+        db.session.commit()
+
+        answer(assignments[0], {first: 'Rewritten', second: 'Rewritten'})
+        db.session.commit()
+        assert body_texts() == ['Rewritten', 'Shared'] # 'Only here' is gone, 'Shared' is still used
+
+        save_answer(db.session.get(Assignment, assignments[1]), first, '') # Clears the last use of 'Shared'
+        assert body_texts() == ['Rewritten']
+        assert answer_texts(assignments[0]) == ['Rewritten', 'Rewritten']
+
+def test_archiving_keeps_bodies_live_answers_still_use(app, assignments, tmp_path):
+    app.config['ARCHIVE_DIR'] = str(tmp_path / 'archive')
+    with app.app_context():
+        first, second = question_ids()
+        answer(assignments[0], {first: 'Shared', second: 'Archived only'})
+        answer(assignments[1], {first: 'Shared'})
+        archived = db.session.get(Assignment, assignments[0])
+        archived.status = 'completed'
+        archived_user_id = archived.user_id
+        db.session.add(Progress(assignment_id=archived.id, status='completed',
+                                completion_date=datetime.utcnow() - timedelta(days=400)))
+        db.session.commit()
+
+        last_id, archived_count, answer_count = archive_assignment_batch(datetime.utcnow() - timedelta(days=365), 0, 100)
+        assert (last_id, archived_count, answer_count) == (assignments[0], 1, 2)
+        assert db.session.get(Assignment, assignments[0]) is None
+        assert body_texts() == ['Shared']
+        assert answer_texts(assignments[1]) == ['Shared']
+
+        [restored] = load_archived_assignments(archived_user_id)
+        assert [qa['answer_text'] for qa in restored['questions_and_answers']] == ['Shared', 'Archived only']
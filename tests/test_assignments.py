@@ -0,0 +1,74 @@
+"""
+Tests for bulk assignment (assignments.create_assignments): one assignment per trainee and item,
+enforced by the partial unique indexes, and the duplicate cleanup upgrade_database runs before
+creating them.
+"""
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, Course, Assessment, Assignment, Progress, Reminder
+from assignments import create_assignments
+from schema import upgrade_database
+
+@pytest.fixture
+def items(app):
+    """Two trainees, a course and an assessment; returns (trainee ids, course id, assessment id)."""
+    with app.app_context():
+        trainees = [User(username=f'trainee{n}', email=f'trainee{n}@example.com', password_hash='x', role='trainee')
+                    for n in (1, 2)]
+        course = Course(title='Security awareness')
+        assessment = Assessment(title='Privacy basics')
+        db.session.add_all([*trainees, course, assessment])
+        db.session.commit()
+        return [trainee.id for trainee in trainees], course.id, assessment.id
+
+def test_repeated_run_creates_each_assignment_once(app, items):
+    trainee_ids, course_id, assessment_id = items
+    with app.app_context():
+        assert create_assignments(trainee_ids, course_id=course_id) == 2
+        assert create_assignments(trainee_ids, course_id=course_id) == 0
+        assert create_assignments(trainee_ids, assessment_id=assessment_id) == 2
+        assert Assignment.query.count() == 4
+
+def test_unique_index_refuses_second_assignment_of_an_item(app, items):
+    trainee_ids, course_id, assessment_id = items
+    with app.app_context():
+        create_assignments(trainee_ids, assessment_id=assessment_id)
+        db.session.add(Assignment(user_id=trainee_ids[0], assessment_id=assessment_id))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+        # The indexes are partial: course assignments of the same trainee do not collide on NULL assessment_id
+        db.session.add(Assignment(user_id=trainee_ids[0], course_id=course_id))
+        db.session.commit()
+
+def test_upgrade_removes_untouched_duplicate_assignments(app, items):
+    trainee_ids, _, assessment_id = items
+    trainee, other_trainee = trainee_ids
+    with app.app_context():
+        db.session.execute(db.text('DROP INDEX uq_assignment_user_assessment')) # A database from before the index
+        # trainee: the older copy was never started, the newer one was
+        untouched_older = Assignment(user_id=trainee, assessment_id=assessment_id)
+        db.session.add(untouched_older)
+        db.session.flush()
+        started_newer = Assignment(user_id=trainee, assessment_id=assessment_id, status='in_progress')
+        # other trainee: two untouched copies, the newer with a reminder
+        kept_older = Assignment(user_id=other_trainee, assessment_id=assessment_id)
+        db.session.add_all([started_newer, kept_older])
+        db.session.flush()
+        reminded_newer = Assignment(user_id=other_trainee, assessment_id=assessment_id)
+        db.session.add(reminded_newer)
+        db.session.flush()
+        db.session.add_all([Progress(assignment_id=started_newer.id, status='in_progress'),
+                            Reminder(assignment_id=reminded_newer.id, user_id=other_trainee, kind='due_soon')])
+        db.session.commit()
+        kept_ids = {started_newer.id, kept_older.id}
+
+        removed = upgrade_database()
+
+        assert removed['assignment'] == 2
+        assert {assignment.id for assignment in Assignment.query} == kept_ids
+        assert Reminder.query.count() == 0
+        db.session.add(Assignment(user_id=trainee, assessment_id=assessment_id))
+        with pytest.raises(IntegrityError): # The index is back
+            db.session.commit()
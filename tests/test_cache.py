@@ -0,0 +1,62 @@
+"""
+Tests for the answers fragments view_trainee_details caches (cache.cache_fragment): a cached
+fragment must never be served for another trainee's assignment or an outdated question set.
+"""
+from conftest import logged_in_client
+from models import db, User, Assessment, Question, Assignment
+from answers import submit_assessment
+
+def completed_assignment(username, texts, assignment_id=None, assessment_id=None):
+    """
+    A trainee who completed a one-question assessment (a new one unless `assessment_id` is given),
+    answering `texts`; returns (trainee id, assessment id).
+    """
+    trainee = User(username=username, email=f'{username}@example.com', password_hash='x', role='trainee')
+    db.session.add(trainee)
+    if assessment_id is None:
+        assessment = Assessment(title='Weekly review')
+        db.session.add(assessment)
+        db.session.flush()
+        db.session.add(Question(assessment_id=assessment.id, question_text='What did you learn?'))
+        assessment_id = assessment.id
+    db.session.flush()
+    question = Question.query.filter_by(assessment_id=assessment_id).one()
+    assignment = Assignment(id=assignment_id, user_id=trainee.id, assessment_id=assessment_id)
+    db.session.add(assignment)
+    db.session.flush()
+    submit_assessment(assignment, {question.id: texts})
+    return trainee.id, assessment_id
+
+def details_page(app, trainee_id):
+    response = logged_in_client(app, 1).get(f'/view_trainee_details/{trainee_id}')
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+def test_reused_assignment_id_is_not_served_the_previous_trainees_answers(app):
+    with app.app_context():
+        first_trainee, assessment_id = completed_assignment('first', 'Answer of the first trainee', assignment_id=5)
+    assert 'Answer of the first trainee' in details_page(app, first_trainee)
+
+    with app.app_context():
+        # As after `flask archive` removed it: SQLite may hand id 5 to the next assignment
+        db.session.execute(db.text('DELETE FROM answer WHERE assignment_id = 5'))
+        db.session.execute(db.text('DELETE FROM progress WHERE assignment_id = 5'))
+        db.session.execute(db.text('DELETE FROM assignment WHERE id = 5'))
+        db.session.commit()
+        second_trainee, _ = completed_assignment('second', 'Answer of the second trainee', assignment_id=5,
+                                                 assessment_id=assessment_id)
+    page = details_page(app, second_trainee)
+    assert 'Answer of the second trainee' in page and 'Answer of the first trainee' not in page
+
+def test_question_changes_refresh_the_cached_answers(app):
+    with app.app_context():
+        trainee_id, assessment_id = completed_assignment('trainee', 'My answer')
+    assert 'What did you learn?' in details_page(app, trainee_id)
+
+    with app.app_context():
+        question = Question.query.filter_by(assessment_id=assessment_id).one()
+        question.question_text = 'What did you learn this week?'
+        db.session.add(Question(assessment_id=assessment_id, question_text='Anything unclear?'))
+        db.session.commit()
+    page = details_page(app, trainee_id)
+    assert 'What did you learn this week?' in page and 'Anything unclear?' in page
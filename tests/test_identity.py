@@ -0,0 +1,41 @@
+"""
+Tests for the identity cache behind Flask-Login's user_loader (identity.py, models.load_user): a
+committed change to a user must take effect on their next request.
+"""
+from identity import identity_cache
+from models import db, User, load_user
+
+def test_role_change_is_not_undone_by_a_request_during_the_commit(app):
+    with app.app_context():
+        user = User(username='admin2', email='admin2@example.com', password_hash='x', role='admin')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        assert load_user(str(user_id)).role == 'admin' # Now cached
+
+        user.role = 'trainee'
+        db.session.flush()
+        with app.app_context():
+            # A concurrent request (its own session) reads the committed row, still an admin, and caches it again
+            assert load_user(str(user_id)).role == 'admin'
+        db.session.commit()
+
+        assert identity_cache.get(user_id) is None
+        assert load_user(str(user_id)).role == 'trainee'
+
+def test_rolled_back_change_keeps_the_cached_identity(app):
+    with app.app_context():
+        assert load_user('1').role == 'support'
+        db.session.get(User, 1).role = 'admin'
+        db.session.flush()
+        db.session.rollback()
+        assert identity_cache.get(1).role == 'support'
+        db.session.commit() # Nothing queued from the rolled back change
+        assert identity_cache.get(1).role == 'support'
+
+def test_deleted_user_is_logged_out(app):
+    with app.app_context():
+        assert load_user('1') is not None
+        db.session.delete(db.session.get(User, 1))
+        db.session.commit()
+        assert load_user('1') is None
@@ -0,0 +1,74 @@
+"""
+Tests for the progress overview (queries.load_trainee_progress): the number of SQL statements
+per request must not grow with the number of trainees shown, and the filters must match.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from conftest import logged_in_client
+from models import db, User, Course, Assessment, Assignment
+from queries import load_trainee_progress
+
+def add_trainees(app, first, count):
+    """
+    Adds `count` trainees, each with an overdue course and an open assessment assignment. Every
+    trainee gets a course and assessment of their own, so per-row loads cannot hit the identity map.
+    """
+    with app.app_context():
+        for n in range(first, first + count):
+            trainee = User(username=f'trainee{n:04d}', email=f'trainee{n:04d}@example.com', password_hash='x', role='trainee')
+            course = Course(title=f'Course {n}', group_id='g1')
+            assessment = Assessment(title=f'Assessment {n}')
+            db.session.add_all([trainee, course, assessment])
+            db.session.flush()
+            db.session.add_all([
+                Assignment(user_id=trainee.id, course_id=course.id, due_date=datetime.utcnow() - timedelta(days=1)),
+                Assignment(user_id=trainee.id, assessment_id=assessment.id, status='in_progress'),
+            ])
+        db.session.commit()
+
+def count_statements(app, client, path):
+    """Number of SQL statements executed while serving GET `path`."""
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200
+    return len(statements)
+
+@pytest.mark.parametrize('path', [
+    '/view_all_trainee_progress',
+    '/view_all_trainee_progress?status=in_progress',
+    '/view_all_trainee_progress?item_type=course',
+])
+def test_progress_overview_query_count_is_independent_of_trainee_count(app, path):
+    client = logged_in_client(app, 1)
+    client.get(path) # Fills the identity cache, so both counts below are taken warm
+
+    add_trainees(app, 0, 5)
+    with_5 = count_statements(app, client, path)
+    add_trainees(app, 5, 45)
+    with_50 = count_statements(app, client, path)
+    assert with_5 == with_50
+
+def test_overdue_filter_matches_past_due_assignments_the_scheduler_has_not_marked(app):
+    add_trainees(app, 0, 2) # Each has a not-started course assignment a day past due
+    with app.app_context():
+        marked = Assignment.query.filter(Assignment.course_id.isnot(None)).first()
+        marked.status = 'overdue' # As a scheduler run would have
+        db.session.commit()
+        unmarked_user_id = User.query.filter(User.role == 'trainee', User.id != marked.user_id).one().id
+
+        trainees, _ = load_trainee_progress(overdue=True)
+        assert len(trainees) == 2
+        trainees, _ = load_trainee_progress(status='not_started', overdue=True)
+        assert [entry['user'].id for entry in trainees] == [unmarked_user_id]
+        trainees, _ = load_trainee_progress(status='in_progress', overdue=True)
+        assert trainees == [] # The in-progress assessments have no due date
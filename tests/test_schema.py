@@ -0,0 +1,21 @@
+"""
+Tests for the database CLI commands in schema.py.
+"""
+from models import db
+from search import SEARCH_INDEXES
+
+def sqlite_tables():
+    return set(db.session.execute(db.text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars())
+
+def test_init_db_installs_search_indexes_on_existing_tables(app):
+    with app.app_context():
+        # Tables created before search existed: create_all skips them, so its DDL hooks do not run
+        db.session.execute(db.text('DROP TABLE question_fts'))
+        db.session.commit()
+        assert 'question_fts' not in sqlite_tables()
+
+    result = app.test_cli_runner().invoke(args=['init-db'])
+
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert {index.fts_table for index in SEARCH_INDEXES.values()} <= sqlite_tables()
@@ -0,0 +1,157 @@
+"""
+Tests for assessment submission (answers.submit_assessment and complete_assessment): the
+compare-and-swap on Assignment.version, stale pages, idempotent retries and the scheduler's
+overdue mark.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import logged_in_client
+from models import db, User, Assessment, Question, Assignment, Progress
+from answers import load_answers, save_answer, submit_assessment, is_retry, marked_overdue_since, AssignmentChanged
+from scheduler import run_due_dates
+
+@pytest.fixture
+def assignment(app):
+    """A trainee's open assessment assignment with two questions, due in an hour; returns its id."""
+    with app.app_context():
+        trainee = User(username='trainee', email='trainee@example.com', password_hash='x', role='trainee')
+        assessment = Assessment(title='Privacy basics')
+        db.session.add_all([trainee, assessment])
+        db.session.flush()
+        db.session.add_all([Question(assessment_id=assessment.id, question_text=f'Question {n}') for n in (1, 2)])
+        assignment = Assignment(user_id=trainee.id, assessment_id=assessment.id,
+                                due_date=datetime.utcnow() + timedelta(hours=1))
+        db.session.add(assignment)
+        db.session.commit()
+        return assignment.id
+
+def question_ids(assignment):
+    return [question.id for question in Question.query.filter_by(assessment_id=assignment.assessment_id)]
+
+def answer_texts(assignment):
+    return {question_id: answer.answer_text for question_id, answer in load_answers(assignment.id, assignment.user_id).items()}
+
+def submission(assignment, text, key, version):
+    """complete_assessment form data submitting `text` for every question, as the page does without JavaScript."""
+    data = {f'q_{question_id}-answer_text': text for question_id in question_ids(assignment)}
+    data.update(submission_key=key, version=version)
+    return data
+
+def test_stale_expected_version_is_refused_and_writes_nothing(app, assignment):
+    with app.app_context():
+        current = db.session.get(Assignment, assignment)
+        rendered_version = current.version
+        first, second = question_ids(current)
+        save_answer(current, first, 'Saved from another tab') # not_started -> in_progress bumps the version
+
+        current = db.session.get(Assignment, assignment)
+        with pytest.raises(AssignmentChanged):
+            submit_assessment(current, {first: 'Stale', second: 'Stale'}, 'stale-key', expected_version=rendered_version)
+
+        current = db.session.get(Assignment, assignment)
+        assert current.status == 'in_progress'
+        assert current.submission_key is None
+        assert answer_texts(current) == {first: 'Saved from another tab'}
+        assert Progress.query.filter_by(assignment_id=assignment, status='completed').count() == 0
+
+def test_retry_with_the_same_submission_key_succeeds_without_writing(app, assignment):
+    with app.app_context():
+        current = db.session.get(Assignment, assignment)
+        user_id, version = current.user_id, current.version
+        data = submission(current, 'First answer', 'key-1', version)
+    client = logged_in_client(app, user_id)
+
+    response = client.post(f'/complete_assessment/{assignment}', data=data)
+    assert response.status_code == 302 and response.headers['Location'].endswith('/trainee_assignments')
+    with app.app_context():
+        completed = db.session.get(Assignment, assignment)
+        completed_version = completed.version
+        assert is_retry(completed, 'key-1') and not is_retry(completed, 'key-2')
+
+    retry = dict(data)
+    retry.update({name: 'Changed on retry' for name in data if name.startswith('q_')})
+    response = client.post(f'/complete_assessment/{assignment}', data=retry)
+    assert response.status_code == 302 and response.headers['Location'].endswith('/trainee_assignments')
+    with client.session_transaction() as session:
+        assert ('success', 'Assessment submitted successfully!') in session['_flashes']
+    with app.app_context():
+        completed = db.session.get(Assignment, assignment)
+        assert completed.version == completed_version
+        assert set(answer_texts(completed).values()) == {'First answer'}
+        assert Progress.query.filter_by(assignment_id=assignment).count() == 1
+
+def test_stale_page_without_javascript_is_shown_again_with_the_posted_answers(app, assignment):
+    with app.app_context():
+        current = db.session.get(Assignment, assignment)
+        user_id, rendered_version = current.user_id, current.version
+        first, second = question_ids(current)
+        save_answer(current, first, 'Saved from another tab')
+        data = submission(db.session.get(Assignment, assignment), 'Typed in the stale tab', 'stale-key', rendered_version)
+    client = logged_in_client(app, user_id)
+
+    response = client.post(f'/complete_assessment/{assignment}', data=data)
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert 'changed in another window' in page
+    assert 'Typed in the stale tab' in page and 'Saved from another tab' not in page
+    with app.app_context():
+        current = db.session.get(Assignment, assignment)
+        assert current.status == 'in_progress'
+        assert f'name="version" type="hidden" value="{current.version}"' in page
+
+        data['version'] = current.version # Submitting the reviewed page goes through
+        data[f'q_{second}-answer_text'] = 'Reviewed'
+    response = client.post(f'/complete_assessment/{assignment}', data=data)
+    assert response.headers['Location'].endswith('/trainee_assignments')
+    with app.app_context():
+        current = db.session.get(Assignment, assignment)
+        assert current.status == 'completed'
+        assert answer_texts(current) == {first: 'Typed in the stale tab', second: 'Reviewed'}
+
+def test_submit_after_the_scheduler_marked_the_assignment_overdue_completes(app, assignment):
+    with app.app_context():
+        current = db.session.get(Assignment, assignment)
+        rendered_version = current.version
+        first, second = question_ids(current)
+
+        run = run_due_dates(now=datetime.utcnow() + timedelta(hours=2))
+        assert run.marked_overdue == 1
+        current = db.session.get(Assignment, assignment)
+        assert current.status == 'overdue' and marked_overdue_since(current, rendered_version)
+
+        submit_assessment(current, {first: 'Late', second: 'Late'}, 'late-key', expected_version=rendered_version)
+        current = db.session.get(Assignment, assignment)
+        assert (current.status, current.submission_key) == ('completed', 'late-key')
+        assert set(answer_texts(current).values()) == {'Late'}
+
+def test_submit_racing_the_scheduler_is_retried_once_marked_overdue(app, assignment):
+    with app.app_context():
+        current = db.session.get(Assignment, assignment) # Read before the scheduler marks it
+        first, second = question_ids(current)
+        with app.app_context():
+            assert run_due_dates(now=datetime.utcnow() + timedelta(hours=2)).marked_overdue == 1
+
+        submit_assessment(current, {first: 'Late', second: 'Late'}, 'late-key')
+        current = db.session.get(Assignment, assignment)
+        assert (current.status, current.submission_key) == ('completed', 'late-key')
+        assert Progress.query.filter_by(assignment_id=assignment).count() == 1
+
+def test_racing_submits_complete_once_with_one_progress_row(app, assignment):
+    with app.app_context():
+        # Both requests read the assignment before either writes; each app context has its own session
+        loser = db.session.get(Assignment, assignment)
+        first, second = question_ids(loser)
+        with app.app_context():
+            winner = db.session.get(Assignment, assignment)
+            assert winner is not loser
+            submit_assessment(winner, {first: 'Winner', second: 'Winner'}, 'winner-key')
+
+        with pytest.raises(AssignmentChanged):
+            submit_assessment(loser, {first: 'Loser', second: 'Loser'}, 'loser-key')
+
+        current = db.session.get(Assignment, assignment)
+        assert (current.status, current.submission_key) == ('completed', 'winner-key')
+        assert set(answer_texts(current).values()) == {'Winner'}
+        assert Progress.query.filter_by(assignment_id=assignment).count() == 1